@@ -14,6 +14,10 @@ python manage.py makemigrations
 # Apply database migrations
 python manage.py migrate
 
+# Bring the daily clinic rollups up to date (the first run backfills every day).
+# Between deploys it runs from cron; see healthcare/rollups.py for the schedule.
+python manage.py rollup_daily_stats
+
 # Create default groups
 python manage.py create_groups
 
@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     Patient, Visit, LabTest, Prescription, Medication, Appointment, MedicalRecord,
     MedicalHistory, Allergy, PatientMedication, StaffProfile, Shift, PayrollEntry, PerformanceReview,
-    MedicationAdministration, Immunization
+    MedicationAdministration, Immunization, VisitStageEvent, StageHourlyStats
 )
 
 # Custom admin site configuration
@@ -198,4 +198,18 @@ class ImmunizationAdmin(admin.ModelAdmin):
     )
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('patient__user', 'administered_by')
\ No newline at end of file
+        return super().get_queryset(request).select_related('patient__user', 'administered_by')
+
+
+@admin.register(VisitStageEvent)
+class VisitStageEventAdmin(admin.ModelAdmin):
+    list_display = ['visit', 'from_stage', 'to_stage', 'occurred_at', 'seconds_in_stage', 'moved_by']
+    list_filter = ['to_stage', 'occurred_at']
+    date_hierarchy = 'occurred_at'
+
+
+@admin.register(StageHourlyStats)
+class StageHourlyStatsAdmin(admin.ModelAdmin):
+    list_display = ['stage', 'hour', 'entered', 'exited', 'timed_exits', 'seconds_in_stage']
+    list_filter = ['stage']
+    date_hierarchy = 'hour'
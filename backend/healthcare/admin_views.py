@@ -6,22 +6,29 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.db import transaction
 from django.db.models import Count, Sum, Q
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import secrets
 import string
 from django.contrib.auth.hashers import make_password
 
 from .models import (
-    Patient, Visit, LabTest, Prescription, Medication, Appointment, MedicalRecord,
-    MedicalHistory, Allergy, PatientMedication, StaffProfile, Shift, PayrollEntry, PerformanceReview
+    Patient, Prescription, Medication, Appointment, MedicalRecord,
+    MedicalHistory, Allergy, PatientMedication, StaffProfile, Shift, PayrollEntry, PerformanceReview,
+    IdentifierSequence
 )
 from .serializers import (
-    PatientSerializer, VisitSerializer, LabTestSerializer, PrescriptionSerializer, 
+    PatientSerializer, LabTestSerializer, PrescriptionSerializer, 
     MedicationSerializer, AppointmentSerializer, MedicalRecordSerializer,
     MedicalHistorySerializer, AllergySerializer, PatientMedicationSerializer,
     StaffProfileSerializer, ShiftSerializer, PayrollEntrySerializer, PerformanceReviewSerializer
 )
+from .search import search_patient_ids
+from .stats import (
+    cached_stats, overview_stats, report_stats, recent_patients, recent_staff, RECENT_ACTIVITY_WIDGETS
+)
+from .rollups import daily_report, DAILY_REPORT_MAX_DAYS
 
 User = get_user_model()
 
@@ -33,59 +40,12 @@ class AdminDashboardViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def overview_stats(self, request):
         """Get comprehensive dashboard statistics"""
-        today = timezone.now().date()
-        this_month = timezone.now().replace(day=1).date()
-        
         stats = {
-            # Patient Statistics
-            'patients': {
-                'total': Patient.objects.count(),
-                'new_this_month': Patient.objects.filter(created_at__date__gte=this_month).count(),
-                'active_visits': Visit.objects.filter(stage__in=['waiting_room', 'questioning', 'laboratory_test', 'results_by_doctor']).count(),
-                'completed_today': Visit.objects.filter(stage='discharged', discharge_time__date=today).count(),
-            },
-            
-            # Staff Statistics
-            'staff': {
-                'total': StaffProfile.objects.count(),
-                'active': StaffProfile.objects.filter(employment_status='active').count(),
-                'on_duty_today': Shift.objects.filter(
-                    start_time__date=today,
-                    status__in=['scheduled', 'in_progress']
-                ).count(),
-                'departments': dict(StaffProfile.objects.values('department').annotate(count=Count('department')).values_list('department', 'count')),
-            },
-            
-            # Medical Statistics
-            'medical': {
-                'pending_lab_tests': LabTest.objects.filter(status='requested').count(),
-                'prescriptions_today': Prescription.objects.filter(created_at__date=today).count(),
-                'appointments_today': Appointment.objects.filter(appointment_date__date=today).count(),
-                'medication_inventory': Medication.objects.filter(is_active=True).count(),
-            },
-            
-            # Financial Statistics
-            'financial': {
-                'monthly_payroll': PayrollEntry.objects.filter(
-                    pay_period_start__gte=this_month
-                ).aggregate(total=Sum('net_pay'))['total'] or 0,
-                'staff_hours_this_month': Shift.objects.filter(
-                    start_time__date__gte=this_month,
-                    status='completed'
-                ).count(),
-            },
-            
+            **cached_stats('overview', overview_stats),
+
             # Recent Activity
             'recent_activity': {
-                'new_patients': PatientSerializer(
-                    Patient.objects.order_by('-created_at')[:5], many=True
-                ).data,
-                'recent_visits': VisitSerializer(
-                    Visit.objects.order_by('-check_in_time')[:5], many=True
-                ).data,
-                'recent_staff': StaffProfileSerializer(
-                    StaffProfile.objects.order_by('-hire_date')[:5], many=True
-                ).data,
+                name: build() for name, (build, queries) in RECENT_ACTIVITY_WIDGETS.items()
             }
         }
         
@@ -99,12 +59,7 @@ class AdminDashboardViewSet(viewsets.ViewSet):
         # Apply filters
         search = request.query_params.get('search', '')
         if search:
-            patients = patients.filter(
-                Q(user__first_name__icontains=search) |
-                Q(user__last_name__icontains=search) |
-                Q(patient_id__icontains=search) |
-                Q(phone__icontains=search)
-            )
+            patients = patients.filter(pk__in=search_patient_ids(search))
         
         priority = request.query_params.get('priority', '')
         if priority:
@@ -164,24 +119,20 @@ class AdminDashboardViewSet(viewsets.ViewSet):
                 'license_number': request.data.get('license_number', '')
             }
             
-            user = User.objects.create(**user_data)
+            with transaction.atomic():
+                user = User.objects.create(**user_data)
             
-            # Generate employee ID
-            last_staff = StaffProfile.objects.order_by('-id').first()
-            if last_staff:
-                last_id = int(last_staff.employee_id.split('-')[1])
-                employee_id = f"EMP-{str(last_id + 1).zfill(4)}"
-            else:
-                employee_id = "EMP-0001"
+                # Generate employee ID
+                employee_id = IdentifierSequence.next_identifier('employee', width=4)
             
-            # Create staff profile
-            staff_profile = StaffProfile.objects.create(
-                user=user,
-                employee_id=employee_id,
-                hire_date=request.data.get('hire_date', timezone.now().date()),
-                hourly_rate=request.data.get('hourly_rate', '25.00'),
-                department=request.data['department']
-            )
+                # Create staff profile
+                staff_profile = StaffProfile.objects.create(
+                    user=user,
+                    employee_id=employee_id,
+                    hire_date=request.data.get('hire_date', timezone.now().date()),
+                    hourly_rate=request.data.get('hourly_rate', '25.00'),
+                    department=request.data['department']
+                )
             
             return Response({
                 'success': True,
@@ -490,42 +441,40 @@ class AdminDashboardViewSet(viewsets.ViewSet):
 def admin_reports(request):
     """Generate comprehensive admin reports"""
     report_type = request.query_params.get('type', 'overview')
-    
+
+    if report_type == 'daily':
+        # Per-day rollups over ?start=&end= (YYYY-MM-DD, default the last 30 days)
+        today = timezone.localdate()
+        try:
+            end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params else today
+            start = (
+                date.fromisoformat(request.query_params['start']) if 'start' in request.query_params
+                else end - timedelta(days=29)
+            )
+        except ValueError:
+            return Response({'error': 'start and end must be dates in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end or (end - start).days >= DAILY_REPORT_MAX_DAYS:
+            return Response(
+                {'error': f'start must be on or before end, at most {DAILY_REPORT_MAX_DAYS} days apart'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(cached_stats('daily', lambda: daily_report(start, end), f'{start}:{end}'))
+
+    if report_type not in ('patient_summary', 'staff_summary', 'financial_summary'):
+        report_type = 'overview'
+    stats = cached_stats('report', lambda: report_stats(report_type), report_type)
+
     if report_type == 'patient_summary':
         return Response({
-            'total_patients': Patient.objects.count(),
-            'patients_by_priority': dict(Patient.objects.values('priority').annotate(count=Count('priority')).values_list('priority', 'count')),
-            'patients_by_gender': dict(Patient.objects.values('gender').annotate(count=Count('gender')).values_list('gender', 'count')),
-            'recent_registrations': PatientSerializer(Patient.objects.order_by('-created_at')[:10], many=True).data,
+            **stats,
+            'recent_registrations': recent_patients(10),
         })
     
     elif report_type == 'staff_summary':
         return Response({
-            'total_staff': StaffProfile.objects.count(),
-            'staff_by_department': dict(StaffProfile.objects.values('department').annotate(count=Count('department')).values_list('department', 'count')),
-            'staff_by_status': dict(StaffProfile.objects.values('employment_status').annotate(count=Count('employment_status')).values_list('employment_status', 'count')),
-            'recent_hires': StaffProfileSerializer(StaffProfile.objects.order_by('-hire_date')[:10], many=True).data,
-        })
-    
-    elif report_type == 'financial_summary':
-        this_month = timezone.now().replace(day=1).date()
-        return Response({
-            'monthly_payroll': PayrollEntry.objects.filter(pay_period_start__gte=this_month).aggregate(total=Sum('net_pay'))['total'] or 0,
-            'total_staff_hours': Shift.objects.filter(start_time__date__gte=this_month, status='completed').count(),
-            'payroll_by_department': dict(
-                PayrollEntry.objects.filter(pay_period_start__gte=this_month)
-                .values('staff__department')
-                .annotate(total=Sum('net_pay'))
-                .values_list('staff__department', 'total')
-            ),
+            **stats,
+            'recent_hires': recent_staff(10),
         })
     
-    # Default overview report
-    return Response({
-        'patients': Patient.objects.count(),
-        'staff': StaffProfile.objects.count(),
-        'active_visits': Visit.objects.filter(stage__in=['waiting_room', 'questioning', 'laboratory_test', 'results_by_doctor']).count(),
-        'appointments_today': Appointment.objects.filter(appointment_date__date=timezone.now().date()).count(),
-        'pending_lab_tests': LabTest.objects.filter(status='requested').count(),
-        'prescriptions_today': Prescription.objects.filter(created_at__date=timezone.now().date()).count(),
-    })
\ No newline at end of file
+    # Financial summary and the default overview report
+    return Response(stats)
@@ -0,0 +1,108 @@
+"""
+Helpers shared by the benchmark_* management commands.
+
+Benchmarks seed synthetic rows inside a transaction that is always rolled
+back, so they can be pointed at any database without leaving data behind.
+"""
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Patient, Visit, LabTest, Prescription
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def seed_patients(count, prefix='bench', name_for=None):
+    """Create `count` patient users and patients; `name_for(i)` may supply (first_name, last_name)"""
+    name_for = name_for or (lambda i: (f'First{i}', f'Last{i}'))
+    users = User.objects.bulk_create([
+        User(
+            username=f'{prefix}-{i}', first_name=name_for(i)[0], last_name=name_for(i)[1],
+            email=f'{prefix}{i}@clinic.local', role='patient', password='!'
+        )
+        for i in range(count)
+    ])
+    return Patient.objects.bulk_create([
+        Patient(
+            user=user, patient_id=f'{prefix.upper()}-{i}', card_number=f'{prefix.upper()}-C{i}',
+            phone=f'09{i:08d}', age=20 + i % 60, gender='female' if i % 2 else 'male',
+            priority='urgent' if i % 10 == 0 else 'standard'
+        )
+        for i, user in enumerate(users)
+    ])
+
+
+def seed_visits(count, prefix='bench'):
+    """Create `count` patients, each with one visit, two lab tests and (every other visit) a prescription"""
+    now = timezone.now()
+    stages = [stage for stage, label in Visit.STAGE_CHOICES]
+
+    patients = seed_patients(count, prefix)
+    visits = Visit.objects.bulk_create([
+        Visit(
+            patient=patient, stage=stages[i % len(stages)],
+            check_in_time=now - timedelta(minutes=count - i),
+            vital_signs={'bp': '120/80', 'temp': '36.8'}, triage_notes='Stable',
+            questioning_findings='Headache for two days'
+        )
+        for i, patient in enumerate(patients)
+    ])
+    LabTest.objects.bulk_create([
+        LabTest(
+            visit=visit, test_name=name, test_type=name,
+            status='completed' if name == 'CBC' else 'requested',
+            results='Within normal limits' if name == 'CBC' else None
+        )
+        for visit in visits for name in ('CBC', 'Urinalysis')
+    ])
+    Prescription.objects.bulk_create([
+        Prescription(
+            visit=visit, prescription_number=f'{prefix.upper()}-RX{i}',
+            medications=[{'name': 'Paracetamol', 'dose': '500mg', 'frequency': 'TID', 'duration': '5 days'}]
+        )
+        for i, visit in enumerate(visits) if i % 2 == 0
+    ])
+    return visits
+
+
+class _QueryCounter:
+    # Unlike CaptureQueriesContext, not capped by the connection's query log
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(func, repeat=3):
+    """Run `func` and return (result, queries issued, best wall time in seconds)"""
+    best = None
+    for _ in range(repeat):
+        queries = _QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, queries.count, best
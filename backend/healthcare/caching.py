@@ -0,0 +1,101 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import ChangeCounter
+
+# Counter bumped by changes to Visit, LabTest, Prescription and Patient
+QUEUE_COUNTER = 'queue'
+
+# Counter bumped by changes to Visit, LabTest, Appointment, Prescription and Patient
+DASHBOARD_COUNTER = 'dashboard'
+
+# Snapshots are keyed by counter value, so this only bounds memory use
+SNAPSHOT_TIMEOUT = 60 * 10
+
+# How long a single caller may hold the rebuild of a versioned cache entry
+REBUILD_LOCK_TIMEOUT = 10
+# Out-of-date versioned entries are kept this long to be served during rebuilds
+STALE_TIMEOUT = 60 * 60 * 24
+
+
+def bump_counter(name):
+    updated = ChangeCounter.objects.filter(name=name).update(
+        value=F('value') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        counter, created = ChangeCounter.objects.get_or_create(name=name, defaults={'value': 1})
+        if not created:
+            bump_counter(name)
+
+
+def bump_counter_on_commit(name):
+    """
+    Bump a counter after the current transaction commits, so a reader can
+    never cache pre-commit data under the new version.
+    """
+    transaction.on_commit(lambda: bump_counter(name))
+
+
+def counter_value(name):
+    return ChangeCounter.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+def snapshot_response(request, counter, variant, build):
+    """
+    Serve a payload shared by every caller from a snapshot versioned by `counter`.
+
+    The response carries an ETag for the counter value and rendered format; a
+    matching If-None-Match gets a 304 without building or rendering anything.
+    Otherwise the rendered bytes are cached until the counter moves on.
+    """
+    renderer = request.accepted_renderer
+    version = counter_value(counter)
+    etag = f'"{counter}-{variant}-{renderer.format}-{version}"'
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        key = f'healthcare:snapshot:{counter}:{variant}:{renderer.format}:{version}'
+        content = cache.get(key)
+        if content is None:
+            content = renderer.render(build(), renderer.media_type)
+            cache.set(key, content, SNAPSHOT_TIMEOUT)
+        response = HttpResponse(content, content_type=renderer.media_type)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def versioned_cache(counter, key, build, max_age):
+    """
+    `build()`, cached until `counter` moves on or the value is `max_age`
+    seconds old. When it is out of date, one caller rebuilds it while
+    concurrent callers keep getting the previous value, so a burst of
+    requests after a change (or at shift change) costs one build.
+    """
+    version = counter_value(counter)
+    cache_key = f'healthcare:versioned:{counter}:{key}'
+    entry = cache.get(cache_key)
+    if entry is not None:
+        entry_version, built_at, value = entry
+        if entry_version == version and time.time() - built_at < max_age:
+            return value
+        if not cache.add(f'{cache_key}:rebuilding', True, REBUILD_LOCK_TIMEOUT):
+            return value
+
+    try:
+        value = build()
+        cache.set(cache_key, (version, time.time(), value), STALE_TIMEOUT)
+    finally:
+        cache.delete(f'{cache_key}:rebuilding')
+    return value
@@ -0,0 +1,171 @@
+"""
+Card-number lookup for the reception scanner.
+
+Scanned cards resolve to a compact identity summary held in a bounded,
+per-process LRU cache, so repeat scans skip the patient/user join. Entries
+are dropped when the patient or their user is saved (see signals.py) and
+expire after CARD_CACHE_TTL, which bounds how long another worker's change
+can go unseen. The active visit is always read live.
+
+Card numbers are stored uppercased (Patient.save), so lookups are exact
+matches on the card_number index. Unknown cards are remembered for
+CARD_MISS_TTL, so a card that is scanned again does not rescan the history.
+
+Cards that were reissued still resolve through Patient.card_number_history.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.utils import timezone
+
+from .models import Patient, Visit
+
+CARD_CACHE_SIZE = 5000
+CARD_CACHE_TTL = 60
+CARD_MISS_TTL = 10
+
+
+def normalize_card(card):
+    return (card or '').strip().upper()
+
+
+class CardCache:
+    """Thread-safe LRU of card number -> (patient pk, summary) with a TTL, and of unknown cards"""
+
+    def __init__(self, max_size=CARD_CACHE_SIZE, ttl=CARD_CACHE_TTL, miss_ttl=CARD_MISS_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._entries = OrderedDict()
+        self._misses = OrderedDict()
+        self._cards_by_patient = {}
+        self._lock = threading.Lock()
+
+    def get(self, card):
+        with self._lock:
+            entry = self._entries.get(card)
+            if entry is None:
+                return None
+            expires, patient_pk, summary = entry
+            if expires < time.monotonic():
+                self._remove(card)
+                return None
+            self._entries.move_to_end(card)
+            return summary
+
+    def set(self, card, summary):
+        with self._lock:
+            self._remove(card)
+            self._entries[card] = (time.monotonic() + self.ttl, summary['id'], summary)
+            self._cards_by_patient.setdefault(summary['id'], set()).add(card)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def is_missing(self, card):
+        with self._lock:
+            expires = self._misses.get(card)
+            if expires is not None and expires < time.monotonic():
+                del self._misses[card]
+                expires = None
+            return expires is not None
+
+    def set_missing(self, card):
+        with self._lock:
+            self._misses.pop(card, None)
+            self._misses[card] = time.monotonic() + self.miss_ttl
+            while len(self._misses) > self.max_size:
+                self._misses.popitem(last=False)
+
+    def invalidate(self, patient_pk, card=None):
+        """Drop a patient's entries, and `card` from the unknown cards once it has been assigned"""
+        with self._lock:
+            for cached in list(self._cards_by_patient.get(patient_pk, ())):
+                self._remove(cached)
+            self._misses.pop(card, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._misses.clear()
+            self._cards_by_patient.clear()
+
+    def _remove(self, card):
+        entry = self._entries.pop(card, None)
+        if entry is not None:
+            cards = self._cards_by_patient.get(entry[1])
+            cards.discard(card)
+            if not cards:
+                del self._cards_by_patient[entry[1]]
+
+
+card_cache = CardCache()
+
+
+def _history_cards(history):
+    # Entries are plain card numbers or dicts holding one under 'card_number'
+    for entry in history or []:
+        card = entry.get('card_number') if isinstance(entry, dict) else entry
+        if isinstance(card, str):
+            yield normalize_card(card)
+
+
+def _identity(card):
+    fields = (
+        'pk', 'patient_id', 'card_number', 'user__first_name', 'user__last_name',
+        'age', 'gender', 'phone', 'priority'
+    )
+    patient = Patient.objects.filter(card_number=card).values(*fields).first()
+    reissued_from = None
+    if patient is None:
+        # The JSON text match narrows the rows; the exact check is done here
+        for candidate in Patient.objects.filter(card_number_history__icontains=card).values(
+            *fields, 'card_number_history'
+        ):
+            if card in _history_cards(candidate['card_number_history']):
+                patient, reissued_from = candidate, card
+                break
+    if patient is None:
+        return None
+
+    return {
+        'id': patient['pk'],
+        'patient_id': patient['patient_id'],
+        'card_number': patient['card_number'],
+        'reissued_from': reissued_from,
+        'full_name': f"{patient['user__first_name']} {patient['user__last_name']}".strip(),
+        'age': patient['age'],
+        'gender': patient['gender'],
+        'phone': patient['phone'],
+        'priority': patient['priority'],
+    }
+
+
+def active_visit_summary(patient_pk):
+    visit = (
+        Visit.objects.filter(patient_id=patient_pk, stage__in=Visit.ACTIVE_STAGES)
+        .order_by('-check_in_time')
+        .values('id', 'stage', 'check_in_time', 'attending_doctor_id')
+        .first()
+    )
+    if visit is None:
+        return None
+    visit['waiting_minutes'] = int((timezone.now() - visit['check_in_time']).total_seconds() // 60)
+    return visit
+
+
+def lookup_card(card):
+    """Identity and active-visit summary of the patient holding `card`, or None"""
+    card = normalize_card(card)
+    if not card:
+        return None
+    identity = card_cache.get(card)
+    if identity is None:
+        if card_cache.is_missing(card):
+            return None
+        identity = _identity(card)
+        if identity is None:
+            card_cache.set_missing(card)
+            return None
+        card_cache.set(card, identity)
+    return {**identity, 'active_visit': active_visit_summary(identity['id'])}
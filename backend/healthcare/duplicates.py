@@ -0,0 +1,113 @@
+"""
+Duplicate-patient detection.
+
+Candidates are narrowed with indexed blocking keys on PatientSearchIndex
+(Soundex of the last name within neighbouring five-year birth bands, or the
+same phone suffix), so a check touches a handful of rows however large the
+registry is. Only those candidates are scored with rapidfuzz.
+"""
+import re
+from collections import defaultdict
+from itertools import combinations
+
+from django.db.models import Q
+from django.utils import timezone
+from rapidfuzz import fuzz
+
+from .models import PatientSearchIndex
+from .search import normalize_text, blocking_keys
+
+DUPLICATE_MIN_SCORE = 85
+DUPLICATE_MAX_CANDIDATES = 200
+# Blocks larger than this (very common surname in one birth band) are skipped by the batch scan
+DUPLICATE_MAX_BLOCK = 500
+
+
+def _score(name, phone_digits, age, candidate_name, candidate_phone, candidate_age):
+    """0-100 likelihood that two patient records are the same person"""
+    score = fuzz.token_sort_ratio(name, candidate_name)
+    if phone_digits and candidate_phone:
+        if phone_digits[-9:] == candidate_phone[-9:]:
+            score += 20
+        elif phone_digits[-7:] == candidate_phone[-7:]:
+            score += 10
+    if age is not None and candidate_age is not None and abs(age - candidate_age) > 5:
+        score -= 20
+    return max(0, min(100, round(score)))
+
+
+def find_duplicate_candidates(first_name, last_name, phone=None, age=None, exclude=None, limit=5):
+    """
+    Existing patients that look like the same person, best first, as
+    compact dicts with a 0-100 score. `exclude` is a patient pk to leave out.
+    """
+    keys = blocking_keys(last_name, age, phone, timezone.now().year)
+    block = Q(pk__in=[])
+    if keys['surname_key']:
+        same_surname = Q(surname_key=keys['surname_key'])
+        if keys['birth_band'] is not None:
+            band = keys['birth_band']
+            same_surname &= Q(birth_band__in=[band - 1, band, band + 1]) | Q(birth_band__isnull=True)
+        block |= same_surname
+    if len(keys['phone_suffix']) == 7:
+        block |= Q(phone_suffix=keys['phone_suffix'])
+
+    candidates = (
+        PatientSearchIndex.objects.filter(block)
+        .exclude(patient_id=exclude)
+        .values(
+            'patient_id', 'name', 'patient__patient_id', 'patient__card_number',
+            'patient__phone', 'patient__age'
+        )[:DUPLICATE_MAX_CANDIDATES]
+    )
+
+    name = normalize_text(f"{first_name} {last_name}")
+    phone_digits = re.sub(r'\D', '', phone or '')
+    matches = []
+    for candidate in candidates:
+        score = _score(
+            name, phone_digits, age,
+            candidate['name'], re.sub(r'\D', '', candidate['patient__phone'] or ''), candidate['patient__age']
+        )
+        if score >= DUPLICATE_MIN_SCORE:
+            matches.append({
+                'id': candidate['patient_id'],
+                'patient_id': candidate['patient__patient_id'],
+                'card_number': candidate['patient__card_number'],
+                'name': candidate['name'].title(),
+                'phone': candidate['patient__phone'],
+                'age': candidate['patient__age'],
+                'score': score,
+            })
+    matches.sort(key=lambda match: -match['score'])
+    return matches[:limit]
+
+
+def iter_duplicate_pairs(min_score=DUPLICATE_MIN_SCORE):
+    """
+    Yield (score, patient pk, patient pk) for likely duplicates across the
+    whole registry, comparing patients only within their blocks.
+    """
+    rows = PatientSearchIndex.objects.values_list(
+        'patient_id', 'name', 'surname_key', 'birth_band', 'phone_suffix', 'patient__phone', 'patient__age'
+    )
+    blocks = defaultdict(list)
+    for patient_id, name, surname_key, band, phone_suffix, phone, age in rows.iterator(chunk_size=5000):
+        record = (patient_id, name, re.sub(r'\D', '', phone or ''), age)
+        if surname_key:
+            blocks['surname', surname_key, band].append(record)
+        if len(phone_suffix) == 7:
+            blocks['phone', phone_suffix].append(record)
+
+    seen = set()
+    for block in blocks.values():
+        if len(block) < 2 or len(block) > DUPLICATE_MAX_BLOCK:
+            continue
+        for first, second in combinations(block, 2):
+            pair = (min(first[0], second[0]), max(first[0], second[0]))
+            if pair in seen:
+                continue
+            seen.add(pair)
+            score = _score(first[1], first[2], first[3], second[1], second[2], second[3])
+            if score >= min_score:
+                yield score, pair[0], pair[1]
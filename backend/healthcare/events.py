@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+class QueueEventBus:
+    """
+    In-process bus for queue events.
+
+    Keeps the most recent events in memory and wakes up listeners blocked in
+    `wait()` whenever a new one is published. Events only reach listeners in
+    the publishing process, so the app should be served by a single process
+    with threads (see the gunicorn command in the Dockerfile).
+
+    Every blocked listener holds one of those threads, so at most
+    `max_listeners` may wait at once; the rest are turned away at once
+    rather than starving ordinary requests.
+    """
+
+    def __init__(self, maxlen=1000, max_listeners=8):
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._listeners = threading.BoundedSemaphore(max_listeners)
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, event_type, visit):
+        with self._condition:
+            self._seq += 1
+            event = {
+                'seq': self._seq,
+                'type': event_type,
+                'visitId': visit.id,
+                'stage': visit.stage,
+                'at': timezone.now().isoformat(),
+            }
+            self._events.append(event)
+            self._condition.notify_all()
+        return event
+
+    def _events_after(self, after):
+        # None tells the caller its position is unknown here (restart, other
+        # process or events already rotated out) and it has to resync.
+        if after > self._seq:
+            return None
+        if self._events and self._events[0]['seq'] > after + 1:
+            return None
+        return [event for event in self._events if event['seq'] > after]
+
+    @contextmanager
+    def listener(self):
+        """Hold a listener slot for the block; yields False, without waiting, when none is free"""
+        acquired = self._listeners.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._listeners.release()
+
+    def wait(self, after, timeout):
+        """Return events newer than `after`, blocking up to `timeout` seconds for one to arrive"""
+        with self._condition:
+            events = self._events_after(after)
+            if events == []:
+                self._condition.wait_for(lambda: self._seq > after, timeout)
+                events = self._events_after(after)
+            return events
+
+
+queue_events = QueueEventBus(max_listeners=settings.QUEUE_MAX_LISTENERS)
+
+# Idle streams get a comment line this often so proxies keep them open, and
+# every stream is closed after a while so clients reconnect with Last-Event-ID.
+QUEUE_STREAM_HEARTBEAT = 15
+QUEUE_STREAM_LIFETIME = 300
+# How long a client turned away for lack of a listener slot waits to retry
+QUEUE_LISTENER_RETRY = 15
+
+
+def publish_queue_event(event_type, visit):
+    """Publish a queue event once the current transaction has committed"""
+    transaction.on_commit(lambda: queue_events.publish(event_type, visit))
+
+
+def stream_queue_events(after):
+    """
+    Yield queue events newer than `after` formatted as Server-Sent Events.
+    When every listener slot is taken the stream ends straight away, telling
+    the EventSource to reconnect after QUEUE_LISTENER_RETRY seconds.
+    """
+    with queue_events.listener() as listening:
+        if not listening:
+            yield f"retry: {QUEUE_LISTENER_RETRY * 1000}\nevent: busy\ndata: {json.dumps({'last': after})}\n\n"
+            return
+
+        yield f"retry: 3000\nevent: hello\ndata: {json.dumps({'last': queue_events.last_seq})}\n\n"
+
+        deadline = time.monotonic() + QUEUE_STREAM_LIFETIME
+        while time.monotonic() < deadline:
+            events = queue_events.wait(after, QUEUE_STREAM_HEARTBEAT)
+            if events is None:
+                after = queue_events.last_seq
+                yield f"event: reset\ndata: {json.dumps({'last': after})}\n\n"
+            elif events:
+                for event in events:
+                    yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                after = events[-1]['seq']
+            else:
+                yield ": keep-alive\n\n"
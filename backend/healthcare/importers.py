@@ -0,0 +1,219 @@
+"""
+Bulk patient import from CSV, JSON or NDJSON.
+
+Rows are read lazily and handled in batches. Each batch validates its rows
+with the same field rules as PatientCreateSerializer, checks email,
+username and card number uniqueness with one set-based query per field,
+reserves patient IDs and card numbers in blocks, and inserts users and
+patients with bulk_create. Rows that fail are reported with their row
+number and the rest of the batch goes in. Explicit card numbers move the
+card sequence past them, so generated cards never collide with them.
+"""
+import codecs
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .caching import QUEUE_COUNTER, DASHBOARD_COUNTER, bump_counter_on_commit
+from .cards import normalize_card
+from .models import Patient, IdentifierSequence
+from .search import index_patients
+from .serializers import PatientCreateSerializer
+
+User = get_user_model()
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_FORMATS = ['csv', 'json', 'ndjson']
+
+
+class PatientImportRowSerializer(PatientCreateSerializer):
+    """PatientCreateSerializer's field rules without its per-row uniqueness and duplicate queries"""
+
+    check_duplicates = False
+
+    def validate_email(self, value):
+        return value
+
+    def validate_username(self, value):
+        return value
+
+    def validate_card_number(self, value):
+        return normalize_card(value) or None
+
+
+def guess_format(filename):
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if filename.endswith('.json'):
+        return 'json'
+    return 'csv'
+
+
+def read_rows(stream, import_format):
+    """
+    Yield row dicts from a binary stream. Blank CSV cells are dropped so
+    optional columns fall back to their defaults.
+    """
+    if import_format == 'csv':
+        for row in csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig')):
+            yield {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+    elif import_format == 'ndjson':
+        for line in codecs.iterdecode(stream, 'utf-8-sig'):
+            if line.strip():
+                yield json.loads(line)
+    elif import_format == 'json':
+        rows = json.loads(stream.read().decode('utf-8-sig'))
+        if isinstance(rows, dict):
+            rows = rows.get('patients', [])
+        yield from rows
+    else:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+
+
+class PatientImporter:
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.created = 0
+        self.errors = []
+        # Values taken by earlier batches of this import
+        self.seen = {'email': set(), 'username': set(), 'card_number': set()}
+
+    def run(self, rows):
+        """Import an iterable of row dicts and return the report"""
+        batch = []
+        for row_number, row in enumerate(rows, start=1):
+            batch.append((row_number, row))
+            if len(batch) == self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.report()
+
+    def report(self):
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'dryRun': self.dry_run,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+
+    def import_batch(self, batch):
+        rows = self._validate(batch)
+        rows = self._check_uniqueness(rows)
+        if self.dry_run or not rows:
+            self.created += len(rows)
+            return
+
+        try:
+            self._insert(rows)
+        except IntegrityError as e:
+            # A concurrent insert took an email, username or card number after the checks
+            self.errors.extend(
+                {'row': row_number, 'errors': {'non_field_errors': [f'Could not be saved: {e}']}}
+                for row_number, data in rows
+            )
+            return
+        self.created += len(rows)
+
+    def _insert(self, rows):
+        with transaction.atomic():
+            patient_ids = IdentifierSequence.next_identifiers('patient', len(rows))
+            IdentifierSequence.advance_past(
+                'card', [data['card_number'] for row_number, data in rows if data.get('card_number')]
+            )
+            card_numbers = iter(self._free_card_numbers(
+                sum(1 for row_number, data in rows if not data.get('card_number'))
+            ))
+
+            users = []
+            patients = []
+            for (row_number, data), patient_id in zip(rows, patient_ids):
+                first_name, last_name = PatientCreateSerializer.pop_names(data)
+                user = User(
+                    username=data.pop('username', None) or f"{first_name.lower()}{last_name.lower()}.{patient_id.lower()}",
+                    email=data.pop('email', f"{first_name.lower()}.{last_name.lower()}@clinic.local"),
+                    first_name=first_name,
+                    last_name=last_name,
+                    role='patient'
+                )
+                user.set_unusable_password()
+                users.append(user)
+                patients.append(Patient(
+                    patient_id=patient_id,
+                    card_number=data.pop('card_number', None) or next(card_numbers),
+                    **data
+                ))
+
+            User.objects.bulk_create(users)
+            for user, patient in zip(users, patients):
+                patient.user = user
+            Patient.objects.bulk_create(patients)
+
+            # bulk_create() does not send post_save
+            index_patients(patients)
+            bump_counter_on_commit(QUEUE_COUNTER)
+            bump_counter_on_commit(DASHBOARD_COUNTER)
+
+    @staticmethod
+    def _free_card_numbers(count):
+        """`count` generated card numbers no patient holds (imports before the sequence tracked them may have)"""
+        free = []
+        while len(free) < count:
+            numbers = IdentifierSequence.next_identifiers('card', count - len(free))
+            taken = set(Patient.objects.filter(card_number__in=numbers).values_list('card_number', flat=True))
+            free += [number for number in numbers if number not in taken]
+        return free
+
+    def _validate(self, batch):
+        # One serializer validates every row; building its fields per row costs more than validating
+        serializer = PatientImportRowSerializer()
+        valid = []
+        for row_number, row in batch:
+            if not isinstance(row, dict):
+                self.errors.append({'row': row_number, 'errors': {'non_field_errors': ['Row must be an object']}})
+                continue
+            try:
+                valid.append((row_number, dict(serializer.run_validation(row))))
+            except serializers.ValidationError as e:
+                self.errors.append({'row': row_number, 'errors': e.detail})
+        return valid
+
+    def _check_uniqueness(self, rows):
+        """Drop rows whose email, username or card number is taken, using one query per field"""
+        taken = {
+            'email': set(User.objects.filter(
+                email__in=[data['email'] for row_number, data in rows if data.get('email')]
+            ).values_list('email', flat=True)),
+            'username': set(User.objects.filter(
+                username__in=[data['username'] for row_number, data in rows if data.get('username')]
+            ).values_list('username', flat=True)),
+            'card_number': set(Patient.objects.filter(
+                card_number__in=[data['card_number'] for row_number, data in rows if data.get('card_number')]
+            ).values_list('card_number', flat=True)),
+        }
+        messages = {
+            'email': 'A user with this email already exists.',
+            'username': 'A user with this username already exists.',
+            'card_number': 'This card number is already assigned to another patient.',
+        }
+
+        unique = []
+        for row_number, data in rows:
+            errors = {
+                field: [messages[field]]
+                for field in messages
+                if data.get(field) and (data[field] in taken[field] or data[field] in self.seen[field])
+            }
+            if errors:
+                self.errors.append({'row': row_number, 'errors': errors})
+                continue
+            for field in messages:
+                if data.get(field):
+                    self.seen[field].add(data[field])
+            unique.append((row_number, data))
+        return unique
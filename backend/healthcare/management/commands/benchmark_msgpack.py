@@ -0,0 +1,111 @@
+import gzip
+import io
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from healthcare.benchmarks import rolled_back, seed_visits
+from healthcare.models import Visit, Medication, StaffProfile, PayrollEntry
+from healthcare.parsers import MessagePackParser
+from healthcare.projections import queue_rows
+from healthcare.queue import active_queue, visit_history
+from healthcare.renderers import FastJSONRenderer, MessagePackRenderer
+from healthcare.throughput import add_wait_estimates
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON and MessagePack payload sizes and decode times (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=10000,
+            help='Number of visits to seed'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Timed decodes per payload'
+        )
+
+    def handle(self, *args, **options):
+        json_renderer, msgpack_renderer = FastJSONRenderer(), MessagePackRenderer()
+
+        with rolled_back():
+            seed_visits(options['size'])
+            self.check_round_trips(msgpack_renderer)
+
+            payloads = {
+                'queue': add_wait_estimates(queue_rows(active_queue())),
+                'all_patients': queue_rows(visit_history()),
+            }
+            for name, payload in payloads.items():
+                as_json = json_renderer.render(payload)
+                as_msgpack = msgpack_renderer.render(payload)
+                json_time, decoded_json = self.time(lambda: json.loads(as_json), options['repeat'])
+                msgpack_time, decoded_msgpack = self.time(lambda: self.parse(as_msgpack), options['repeat'])
+                if decoded_msgpack != decoded_json:
+                    raise CommandError(f'{name}: the MessagePack payload decodes differently')
+
+                self.stdout.write(
+                    f'{name} ({len(payload)} rows): '
+                    f'JSON {len(as_json):,} bytes ({len(gzip.compress(as_json)):,} gzipped), '
+                    f'decode {json_time * 1000:.1f} ms; '
+                    f'MessagePack {len(as_msgpack):,} bytes ({len(gzip.compress(as_msgpack)):,} gzipped), '
+                    f'decode {msgpack_time * 1000:.1f} ms; '
+                    f'{1 - len(as_msgpack) / len(as_json):.0%} smaller'
+                )
+
+        self.stdout.write(self.style.SUCCESS('Every payload decodes to the same data in both formats'))
+
+    def check_round_trips(self, renderer):
+        """Datetimes, dates and Decimals of visits, payroll and medications come back unchanged"""
+        user = User.objects.create(username='bench-payroll', role='doctor', password='!')
+        staff = StaffProfile.objects.create(
+            user=user, employee_id='BENCH-PAYROLL', hire_date=timezone.localdate(), hourly_rate=Decimal('12.50'),
+            department='OPD'
+        )
+        today = timezone.localdate()
+        PayrollEntry.objects.bulk_create([
+            PayrollEntry(
+                staff=staff,
+                pay_period_start=today - timedelta(days=14 * (i + 1)), pay_period_end=today - timedelta(days=14 * i),
+                total_hours=Decimal('80.25'), hourly_rate=Decimal('12.50'), gross_pay=Decimal('1003.13'),
+                deductions=Decimal('100.31'), net_pay=Decimal('902.82')
+            )
+            for i in range(10)
+        ])
+        Medication.objects.bulk_create([
+            Medication(name=f'Medication {i}', strength='500mg', dosage_form='tablet', unit_price=Decimal(f'{i}.05'))
+            for i in range(10)
+        ])
+
+        for model in (Visit, PayrollEntry, Medication):
+            rows = list(model.objects.values()[:100])
+            if self.parse(renderer.render(rows)) != rows:
+                raise CommandError(f'{model.__name__} rows do not survive a MessagePack round trip')
+            self.stdout.write(f'{model.__name__}: {len(rows)} rows round-trip unchanged')
+
+    @staticmethod
+    def parse(content):
+        return MessagePackParser().parse(io.BytesIO(content))
+
+    @staticmethod
+    def time(decode, repeat):
+        """(median wall time of `repeat` decodes, the decoded value)"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            value = decode()
+            timings.append(time.perf_counter() - started)
+        return sorted(timings)[len(timings) // 2], value
+
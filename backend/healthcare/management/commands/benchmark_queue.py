@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from healthcare.benchmarks import rolled_back, seed_visits, measure
+from healthcare.models import Visit
+from healthcare.projections import QUEUE_ROWS_QUERIES, queue_rows
+from healthcare.serializers import QueuePatientSerializer
+
+
+class Command(BaseCommand):
+    help = 'Time QueuePatientSerializer against the values() queue projection (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000],
+            help='Numbers of visits to benchmark with'
+        )
+
+    def handle(self, *args, **options):
+        # Matching output is checked in healthcare.tests
+        for size in options['sizes']:
+            with rolled_back():
+                seed_visits(size)
+                visits = Visit.objects.order_by('-check_in_time')
+
+                def serializer_path():
+                    queryset = visits.select_related(
+                        'patient__user', 'attending_doctor', 'triage_completed_by'
+                    ).prefetch_related('lab_tests', 'prescription')
+                    return QueuePatientSerializer(queryset, many=True).data
+
+                serialized, serializer_queries, serializer_time = measure(serializer_path)
+                rows, projection_queries, projection_time = measure(lambda: queue_rows(visits))
+
+            if projection_queries != QUEUE_ROWS_QUERIES:
+                raise CommandError(
+                    f'Projection ran {projection_queries} queries at {size} visits, expected {QUEUE_ROWS_QUERIES}'
+                )
+            if projection_time >= serializer_time:
+                raise CommandError(f'Projection is not faster than QueuePatientSerializer at {size} visits')
+
+            self.stdout.write(
+                f'{size} visits: serializer {serializer_queries} queries / {serializer_time * 1000:.0f} ms, '
+                f'projection {projection_queries} queries / {projection_time * 1000:.0f} ms '
+                f'({serializer_time / projection_time:.1f}x faster)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Projection is faster and runs {QUEUE_ROWS_QUERIES} queries at every size'
+        ))
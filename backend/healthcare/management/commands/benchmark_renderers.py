@@ -0,0 +1,86 @@
+import json
+import math
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from healthcare.benchmarks import rolled_back, seed_visits
+from healthcare.models import Patient, Visit
+from healthcare.projections import queue_rows, patient_rows
+from healthcare.renderers import FastJSONRenderer, orjson
+from healthcare.serializers import PatientSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec and p95 latency of the list read paths and renderers (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=10000,
+            help='Number of patients (each with one visit) to seed'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Timed runs per path'
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; FastJSONRenderer falls back to JSONRenderer'))
+        json_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+
+        with rolled_back():
+            seed_visits(options['size'])
+            patients = PatientSerializer.prepare(Patient.objects.order_by('-created_at'))
+            visits = Visit.objects.order_by('-check_in_time')
+
+            groups = {
+                'patients': {
+                    'serializer + JSONRenderer': lambda: json_renderer.render(
+                        PatientSerializer(patients, many=True).data
+                    ),
+                    'serializer + FastJSONRenderer': lambda: fast_renderer.render(
+                        PatientSerializer(patients, many=True).data
+                    ),
+                    'values() + FastJSONRenderer': lambda: fast_renderer.render(patient_rows(patients)),
+                },
+                'all_patients': {
+                    'values() + JSONRenderer': lambda: json_renderer.render(queue_rows(visits)),
+                    'values() + FastJSONRenderer': lambda: fast_renderer.render(queue_rows(visits)),
+                },
+            }
+
+            for group, paths in groups.items():
+                self.stdout.write(f'{group} ({options["size"]} rows):')
+                baseline = None
+                for name, render in paths.items():
+                    content, timings = self.time(render, options['repeat'])
+                    payload = json.loads(content)
+                    if baseline is None:
+                        baseline = payload
+                    elif payload != baseline:
+                        raise CommandError(f'{group}: {name} renders a different payload')
+
+                    median = timings[len(timings) // 2]
+                    p95 = timings[math.ceil(len(timings) * 0.95) - 1]
+                    self.stdout.write(
+                        f'  {name}: {options["size"] / median:,.0f} rows/s, '
+                        f'median {median * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, {len(content):,} bytes'
+                    )
+
+        self.stdout.write(self.style.SUCCESS('Every path renders the same payload'))
+
+    @staticmethod
+    def time(render, repeat):
+        """(content, sorted wall times of `repeat` runs)"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = render()
+            timings.append(time.perf_counter() - started)
+        return content, sorted(timings)
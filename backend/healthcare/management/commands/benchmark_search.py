@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from healthcare.benchmarks import rolled_back, seed_patients, measure
+from healthcare.models import Patient
+from healthcare.search import SEARCH_MAX_RESULTS, index_patients, search_patient_ids
+
+FIRST_NAMES = ['Abebe', 'Almaz', 'Bekele', 'Chaltu', 'Dawit', 'Eleni', 'Fikru', 'Genet', 'Hana', 'Kebede']
+LAST_NAMES = ['Tesfaye', 'Girma', 'Haile', 'Mekonnen', 'Tadesse', 'Wolde', 'Alemu', 'Bekele', 'Desta', 'Kassa']
+
+
+def _letters(number):
+    # Digit-free unique suffix so seeded names look like names, not IDs
+    letters = ''
+    while True:
+        number, remainder = divmod(number, 26)
+        letters = 'abcdefghijklmnopqrstuvwxyz'[remainder] + letters
+        if not number:
+            return letters
+
+
+def _name(i):
+    return FIRST_NAMES[i % 10], f'{LAST_NAMES[i // 10 % 10]}{_letters(i // 100)}'
+
+
+class Command(BaseCommand):
+    help = 'Time indexed patient search against the icontains scan it replaced (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=100000,
+            help='Number of patients to seed'
+        )
+        parser.add_argument(
+            '--budget-ms',
+            type=float,
+            default=50,
+            help='Fail if an indexed query takes longer than this'
+        )
+
+    def handle(self, *args, **options):
+        size = options['size']
+        middle = size // 2
+        first, last = _name(middle)
+        # Each query with the seeded patients it must find (every one, or a full page of them). A typo
+        # only has to find close names: many seeded names are as close as the one it was made from
+        queries = {
+            'common name': (
+                f'{first} {last[:4]}',
+                lambda i: _name(i)[0] == first and _name(i)[1].lower().startswith(last[:4].lower())
+            ),
+            'full name': (' '.join(_name(middle)), lambda i: _name(i)[0] == first and _name(i)[1].startswith(last)),
+            'phone': (f'09{middle:08d}'[:7], lambda i: f'{i:08d}'[:5] == f'{middle:08d}'[:5]),
+            'patient id': (f'BENCH-{middle}', lambda i: str(i).startswith(str(middle))),
+            'typo': (f'{first[:-1]}x {last[:-1]}', None),
+        }
+
+        with rolled_back():
+            patients = seed_patients(size, name_for=_name)
+            for start in range(0, size, 2000):
+                index_patients(patients[start:start + 2000])
+
+            slow = []
+            missed = []
+            for label, (query, expected) in queries.items():
+                ids, queries_run, indexed_time = measure(lambda: search_patient_ids(query))
+                if expected is None:
+                    if not ids:
+                        missed.append(f'{label} (no hits)')
+                else:
+                    expected_ids = {patient.pk for i, patient in enumerate(patients) if expected(i)}
+                    if len(expected_ids) >= SEARCH_MAX_RESULTS:
+                        found = len(ids) == SEARCH_MAX_RESULTS
+                    else:
+                        found = expected_ids <= set(ids)
+                    if not found:
+                        missed.append(f'{label} ({len(ids)} hits, {len(expected_ids)} expected)')
+
+                def scan():
+                    return list(Patient.objects.filter(
+                        Q(user__first_name__icontains=query) |
+                        Q(user__last_name__icontains=query) |
+                        Q(patient_id__icontains=query) |
+                        Q(phone__icontains=query)
+                    ).values_list('pk', flat=True)[:200])
+
+                scanned, scan_queries, scan_time = measure(scan)
+                self.stdout.write(
+                    f'{label} ({query!r}): index {len(ids)} hits / {indexed_time * 1000:.1f} ms, '
+                    f'icontains {len(scanned)} hits / {scan_time * 1000:.1f} ms'
+                )
+                if indexed_time * 1000 > options['budget_ms']:
+                    slow.append(label)
+
+        if missed:
+            raise CommandError(f"Searches missed patients at {size} patients: {', '.join(missed)}")
+        if slow:
+            raise CommandError(f"Over the {options['budget_ms']} ms budget at {size} patients: {', '.join(slow)}")
+        self.stdout.write(self.style.SUCCESS(f'All searches within {options["budget_ms"]} ms at {size} patients'))
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from healthcare.benchmarks import rolled_back, seed_visits, measure
+from healthcare.models import Patient, Visit, LabTest
+from healthcare.stats import visit_dashboard_stats, overview_stats, report_stats, role_dashboard_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Count the queries and time of every dashboard statistics builder (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=10000,
+            help='Number of visits to seed'
+        )
+        parser.add_argument(
+            '--max-queries',
+            type=int,
+            default=2,
+            help='Fail if a dashboard needs more queries than this'
+        )
+
+    def handle(self, *args, **options):
+        over_budget = []
+
+        with rolled_back():
+            visits = seed_visits(options['size'])
+            users = {
+                role: User.objects.create(username=f'bench-{role}', role=role, password='!')
+                for role in ('reception', 'doctor', 'laboratory', 'admin')
+            }
+            users['patient'] = visits[0].patient.user
+            Visit.objects.filter(pk__in=[visit.pk for visit in visits[::3]]).update(attending_doctor=users['doctor'])
+
+            # Spot-check against the per-count queries the dashboards used to run
+            expected = {
+                'total_patients': Patient.objects.count(),
+                'active_visits': Visit.objects.filter(stage__in=Visit.ACTIVE_STAGES).count(),
+                'pending_lab_tests': LabTest.objects.filter(status='requested').count(),
+                'visits_by_stage': dict(
+                    Visit.objects.order_by().values('stage').annotate(count=Count('stage')).values_list('stage', 'count')
+                ),
+            }
+            stats = visit_dashboard_stats()
+            if {key: stats[key] for key in expected} != expected:
+                raise CommandError(f'visit dashboard counts differ: {stats} != {expected}')
+
+            dashboards = {
+                'visits': visit_dashboard_stats,
+                'overview': overview_stats,
+                **{
+                    f'report:{report_type}': (lambda report_type=report_type: report_stats(report_type))
+                    for report_type in ('overview', 'patient_summary', 'staff_summary', 'financial_summary')
+                },
+                **{
+                    f'role:{role}': (lambda user=user: role_dashboard_stats(user))
+                    for role, user in users.items()
+                },
+            }
+            for name, build in dashboards.items():
+                result, queries, elapsed = measure(build)
+                self.stdout.write(f'{name}: {queries} queries / {elapsed * 1000:.1f} ms')
+                if queries > options['max_queries']:
+                    over_budget.append(f'{name} ({queries})')
+
+        if over_budget:
+            raise CommandError(f"More than {options['max_queries']} queries: {', '.join(over_budget)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Every dashboard within {options['max_queries']} queries at {options['size']} visits"
+        ))
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from healthcare.benchmarks import rolled_back, seed_visits, measure
+from healthcare.models import Patient, Visit, StaffProfile
+from healthcare.serializers import PatientSerializer, VisitSerializer, StaffProfileSerializer
+from healthcare.stats import RECENT_ACTIVITY_WIDGETS
+
+User = get_user_model()
+
+# The same serializers without prepare(), as the widgets used to render them
+FULL_SERIALIZERS = {
+    'new_patients': lambda: PatientSerializer(Patient.objects.order_by('-created_at')[:5], many=True).data,
+    'recent_visits': lambda: VisitSerializer(Visit.objects.order_by('-check_in_time')[:5], many=True).data,
+    'recent_staff': lambda: StaffProfileSerializer(StaffProfile.objects.order_by('-hire_date')[:5], many=True).data,
+}
+
+
+class Command(BaseCommand):
+    help = 'Time the recent-activity widgets against their unprepared serializers (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=1000,
+            help='Number of visits to seed'
+        )
+
+    def handle(self, *args, **options):
+        # The pinned query counts are checked in healthcare.tests
+        with rolled_back():
+            seed_visits(options['size'])
+            supervisor = None
+            for i in range(10):
+                user = User.objects.create(username=f'bench-staff-{i}', role='doctor', password='!')
+                supervisor = StaffProfile.objects.create(
+                    user=user, employee_id=f'BENCH-EMP-{i}', hire_date=timezone.localdate(),
+                    hourly_rate=10, department='OPD', supervisor=supervisor
+                )
+
+            for name, (build, pinned) in RECENT_ACTIVITY_WIDGETS.items():
+                rows, queries, elapsed = measure(build)
+                full, full_queries, full_time = measure(FULL_SERIALIZERS[name])
+                self.stdout.write(
+                    f'{name}: {queries} queries / {elapsed * 1000:.1f} ms '
+                    f'(pinned to {pinned}; unprepared {full_queries} queries / {full_time * 1000:.1f} ms)'
+                )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from healthcare.benchmarks import rolled_back, seed_visits, measure
+from healthcare.models import LabTest
+from healthcare.serializers import LabTestSerializer
+from healthcare.worklist import OPEN_LAB_STATUSES, open_lab_tests, worklist_rows
+
+
+class Command(BaseCommand):
+    help = 'Compare the lab worklist with serializing open lab tests (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000],
+            help='Numbers of visits (two lab tests each) to benchmark with'
+        )
+
+    def handle(self, *args, **options):
+        query_counts = set()
+
+        for size in options['sizes']:
+            with rolled_back():
+                seed_visits(size)
+                serialized, serializer_queries, serializer_time = measure(
+                    lambda: LabTestSerializer(LabTest.objects.filter(status__in=OPEN_LAB_STATUSES), many=True).data
+                )
+                rows, worklist_queries, worklist_time = measure(lambda: worklist_rows(open_lab_tests()))
+
+            if sorted(row['id'] for row in rows) != sorted(test['id'] for test in serialized):
+                raise CommandError(f'The worklist and the serialized open tests differ at {size} visits')
+            query_counts.add(worklist_queries)
+
+            self.stdout.write(
+                f'{size} visits ({len(rows)} open tests): '
+                f'serializer {serializer_queries} queries / {serializer_time * 1000:.0f} ms, '
+                f'worklist {worklist_queries} queries / {worklist_time * 1000:.0f} ms'
+            )
+
+        if len(query_counts) > 1:
+            raise CommandError(f'Worklist query count grows with row count: {sorted(query_counts)}')
+        self.stdout.write(self.style.SUCCESS('The worklist lists every open test in a constant number of queries'))
@@ -0,0 +1,48 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from healthcare.duplicates import DUPLICATE_MIN_SCORE, iter_duplicate_pairs
+from healthcare.models import Patient
+
+
+class Command(BaseCommand):
+    help = 'List likely duplicate patient records, comparing patients only within blocking-key groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-score',
+            type=int,
+            default=DUPLICATE_MIN_SCORE,
+            help='Lowest 0-100 match score to report'
+        )
+        parser.add_argument(
+            '--csv',
+            help='Write the pairs to this CSV file instead of the console'
+        )
+
+    def handle(self, *args, **options):
+        pairs = sorted(iter_duplicate_pairs(options['min_score']), reverse=True)
+        patient_ids = {pk for score, first, second in pairs for pk in (first, second)}
+        labels = {
+            patient['pk']: (
+                patient['patient_id'],
+                f"{patient['user__first_name']} {patient['user__last_name']}",
+                patient['phone'] or '',
+            )
+            for patient in Patient.objects.filter(pk__in=patient_ids).values(
+                'pk', 'patient_id', 'user__first_name', 'user__last_name', 'phone'
+            )
+        }
+
+        if options['csv']:
+            with open(options['csv'], 'w', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(['score', 'patient_id', 'name', 'phone', 'duplicate_patient_id', 'duplicate_name', 'duplicate_phone'])
+                for score, first, second in pairs:
+                    writer.writerow([score, *labels[first], *labels[second]])
+        else:
+            for score, first, second in pairs:
+                self.stdout.write(f"{score:3d}  {' / '.join(labels[first])}  <->  {' / '.join(labels[second])}")
+
+        self.stdout.write(self.style.SUCCESS(f'Found {len(pairs)} likely duplicate pairs'))
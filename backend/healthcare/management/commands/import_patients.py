@@ -0,0 +1,62 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from healthcare.importers import PatientImporter, IMPORT_BATCH_SIZE, IMPORT_FORMATS, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import patients from a CSV, JSON or NDJSON file in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument(
+            '--format',
+            dest='import_format',
+            choices=IMPORT_FORMATS,
+            help='File format (guessed from the extension by default)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Rows validated and inserted per batch'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate every row without saving anything'
+        )
+        parser.add_argument(
+            '--errors',
+            help='Write the per-row error report to this JSON file'
+        )
+
+    def handle(self, *args, **options):
+        import_format = options['import_format'] or guess_format(options['path'])
+        importer = PatientImporter(batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = importer.run(read_rows(stream, import_format))
+        except OSError as e:
+            raise CommandError(f'Could not open {options["path"]}: {e}')
+        except ValueError as e:
+            raise CommandError(f'Could not read {options["path"]} after {importer.created} rows: {e}')
+        elapsed = time.perf_counter() - started
+
+        if options['errors']:
+            with open(options['errors'], 'w') as errors_file:
+                json.dump(report['errors'], errors_file, indent=2)
+        else:
+            for error in report['errors'][:20]:
+                self.stdout.write(self.style.WARNING(f"Row {error['row']}: {json.dumps(error['errors'])}"))
+            if report['failed'] > 20:
+                self.stdout.write(f"... and {report['failed'] - 20} more (use --errors to save them all)")
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['created']} patients in {elapsed:.1f}s; {report['failed']} rows failed"
+        ))
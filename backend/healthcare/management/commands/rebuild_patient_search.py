@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from healthcare.models import Patient, PatientSearchIndex
+from healthcare.search import index_patients
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the patient search index from the patient and user tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Patients indexed per batch'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        indexed = 0
+
+        with transaction.atomic():
+            PatientSearchIndex.objects.all().delete()
+            batch = []
+            for patient in Patient.objects.select_related('user').iterator(chunk_size=batch_size):
+                batch.append(patient)
+                if len(batch) == batch_size:
+                    index_patients(batch)
+                    indexed += len(batch)
+                    batch = []
+            index_patients(batch)
+            indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} patients'))
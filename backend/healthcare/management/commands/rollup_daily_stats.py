@@ -0,0 +1,42 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from healthcare.rollups import ROLLUP_LOOKBACK_DAYS, run_rollup
+
+
+class Command(BaseCommand):
+    help = 'Bring DailyClinicStats up to date, recomputing only the days whose data changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lookback-days',
+            type=int,
+            default=ROLLUP_LOOKBACK_DAYS,
+            help='Always recompute this many days before today'
+        )
+        parser.add_argument(
+            '--since',
+            help='Also recompute every day from this date (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild every day since the first recorded activity'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        started = time.perf_counter()
+        days = run_rollup(lookback_days=options['lookback_days'], since=since, full=options['full'])
+        elapsed = time.perf_counter() - started
+
+        span = f' ({days[0]} to {days[-1]})' if days else ''
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {len(days)} days{span} in {elapsed:.1f}s'))
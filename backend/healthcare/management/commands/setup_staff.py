@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.contrib.auth import get_user_model
-from healthcare.models import StaffProfile
+from healthcare.models import StaffProfile, IdentifierSequence
 from datetime import date
 
 User = get_user_model()
@@ -16,23 +17,19 @@ class Command(BaseCommand):
         for user in staff_users:
             # Check if staff profile already exists
             if not hasattr(user, 'staff_profile'):
-                # Generate employee ID
-                last_staff = StaffProfile.objects.order_by('-id').first()
-                if last_staff:
-                    last_id = int(last_staff.employee_id.split('-')[1])
-                    employee_id = f"EMP-{str(last_id + 1).zfill(3)}"
-                else:
-                    employee_id = "EMP-001"
+                with transaction.atomic():
+                    # Generate employee ID
+                    employee_id = IdentifierSequence.next_identifier('employee')
                 
-                # Create staff profile
-                StaffProfile.objects.create(
-                    user=user,
-                    employee_id=employee_id,
-                    hire_date=date.today(),
-                    employment_status='active',
-                    hourly_rate=25.00,  # Default rate
-                    department=user.role.title()
-                )
+                    # Create staff profile
+                    StaffProfile.objects.create(
+                        user=user,
+                        employee_id=employee_id,
+                        hire_date=date.today(),
+                        employment_status='active',
+                        hourly_rate=25.00,  # Default rate
+                        department=user.role.title()
+                    )
                 created_count += 1
                 self.stdout.write(
                     self.style.SUCCESS(f'Created staff profile for {user.get_full_name()} ({employee_id})')
@@ -0,0 +1,99 @@
+"""
+Time-bucketed volume series for charts.
+
+Each series is one grouped query that truncates its timestamp to the hour
+or (local) day in the database. Empty buckets are filled in here and the
+result is returned as columns: one list of bucket starts and one list of
+values per series, all the same length.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import Visit, LabTest, Prescription, Appointment
+
+METRICS_INTERVALS = ['hour', 'day']
+METRICS_MAX_BUCKETS = 24 * 366
+METRICS_DEFAULT_DAYS = {'hour': 7, 'day': 90}
+
+Series = namedtuple('Series', ['model', 'field', 'condition', 'value'])
+
+_TURNAROUND = ExpressionWrapper(F('completed_at') - F('requested_at'), output_field=DurationField())
+
+SERIES = {
+    'visits': Series(Visit, 'check_in_time', None, Count('pk')),
+    'discharges': Series(Visit, 'discharge_time', Q(stage='discharged'), Count('pk')),
+    'lab_requests': Series(LabTest, 'requested_at', None, Count('pk')),
+    'lab_completions': Series(LabTest, 'completed_at', Q(status='completed'), Count('pk')),
+    # Average minutes from request to completion of the tests completed in each bucket
+    'lab_turnaround_minutes': Series(LabTest, 'completed_at', Q(status='completed'), Avg(_TURNAROUND)),
+    'prescriptions': Series(Prescription, 'created_at', None, Count('pk')),
+    'prescriptions_dispensed': Series(Prescription, 'dispensed_at', Q(is_dispensed=True), Count('pk')),
+    'appointments': Series(Appointment, 'appointment_date', None, Count('pk')),
+}
+
+
+def bucket_starts(interval, start, end):
+    """Aware starts of the hour or local-day buckets overlapping [start, end)"""
+    if interval == 'day':
+        day = timezone.localdate(start)
+        buckets = []
+        while True:
+            bucket = timezone.make_aware(datetime.combine(day, time.min))
+            if bucket >= end:
+                return buckets
+            buckets.append(bucket)
+            day += timedelta(days=1)
+
+    # Step in UTC so DST changes neither skip nor repeat an hour
+    bucket = start.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    buckets = []
+    while bucket < end:
+        buckets.append(bucket)
+        bucket += timedelta(hours=1)
+    return buckets
+
+
+def _column(series, interval, start, end, buckets):
+    truncate = TruncDay if interval == 'day' else TruncHour
+    rows = series.model.objects.filter(**{f'{series.field}__gte': buckets[0], f'{series.field}__lt': end})
+    if series.condition is not None:
+        rows = rows.filter(series.condition)
+    values = dict(
+        rows.order_by()
+        .annotate(bucket=truncate(series.field))
+        .values('bucket')
+        .annotate(value=series.value)
+        .values_list('bucket', 'value')
+    )
+    values = {bucket.timestamp(): value for bucket, value in values.items()}
+
+    empty = 0 if isinstance(series.value, Count) else None
+    column = []
+    for bucket in buckets:
+        value = values.get(bucket.timestamp(), empty)
+        if isinstance(value, timedelta):
+            value = round(value.total_seconds() / 60, 1)
+        column.append(value)
+    return column
+
+
+def metric_series(names, interval, start, end):
+    """
+    Columnar {interval, start, end, buckets, series: {name: [values]}} for
+    the series `names` (keys of SERIES) bucketed by `interval` over [start, end).
+    """
+    buckets = bucket_starts(interval, start, end)
+    return {
+        'interval': interval,
+        'start': start,
+        'end': end,
+        'buckets': buckets,
+        'series': {
+            name: _column(SERIES[name], interval, start, end, buckets) if buckets else []
+            for name in names
+        },
+    }
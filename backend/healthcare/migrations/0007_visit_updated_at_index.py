@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0006_performance_improvements'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['updated_at'], name='healthcare__updated_705e08_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0008_changecounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['check_in_time', 'id'], name='healthcare__check_i_db0399_idx'),
+        ),
+    ]
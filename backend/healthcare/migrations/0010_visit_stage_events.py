@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0009_visit_history_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visit',
+            name='stage_entered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='StageHourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('waiting_room', 'Waiting Room'), ('triage', 'Triage'), ('questioning', 'Questioning'), ('laboratory_test', 'Laboratory Test'), ('results_by_doctor', 'Results by Doctor'), ('discharged', 'Discharged')], max_length=20)),
+                ('hour', models.DateTimeField()),
+                ('entered', models.PositiveIntegerField(default=0)),
+                ('exited', models.PositiveIntegerField(default=0)),
+                ('timed_exits', models.PositiveIntegerField(default=0)),
+                ('seconds_in_stage', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-hour', 'stage'],
+                'unique_together': {('stage', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitStageEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_stage', models.CharField(blank=True, choices=[('waiting_room', 'Waiting Room'), ('triage', 'Triage'), ('questioning', 'Questioning'), ('laboratory_test', 'Laboratory Test'), ('results_by_doctor', 'Results by Doctor'), ('discharged', 'Discharged')], max_length=20)),
+                ('to_stage', models.CharField(choices=[('waiting_room', 'Waiting Room'), ('triage', 'Triage'), ('questioning', 'Questioning'), ('laboratory_test', 'Laboratory Test'), ('results_by_doctor', 'Results by Doctor'), ('discharged', 'Discharged')], max_length=20)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('seconds_in_stage', models.PositiveIntegerField(blank=True, null=True)),
+                ('moved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stage_moves', to=settings.AUTH_USER_MODEL)),
+                ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_events', to='healthcare.visit')),
+            ],
+            options={
+                'ordering': ['occurred_at'],
+                'indexes': [models.Index(fields=['visit', 'occurred_at'], name='healthcare__visit_i_d71c98_idx'), models.Index(fields=['to_stage', 'occurred_at'], name='healthcare__to_stag_89530d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0010_visit_stage_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageServiceTime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('waiting_room', 'Waiting Room'), ('triage', 'Triage'), ('questioning', 'Questioning'), ('laboratory_test', 'Laboratory Test'), ('results_by_doctor', 'Results by Doctor'), ('discharged', 'Discharged')], max_length=20, unique=True)),
+                ('average_seconds', models.FloatField(default=0)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
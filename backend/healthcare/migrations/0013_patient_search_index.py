@@ -0,0 +1,121 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:50
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'healthcare_patientsearch_fts'
+INDEX_TABLE = 'healthcare_patientsearchindex'
+INDEX_COLUMNS = ['name', 'phone_digits', 'identifiers']
+
+
+# Copies of the healthcare.search helpers as of this migration, so later
+# changes to search normalization do not change what it writes
+def normalize_text(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(re.split(r'[\W_]+', value.lower())).strip()
+
+
+def normalize_identifier(value):
+    return ''.join(char for char in (value or '').upper() if char.isalnum())
+
+
+def phone_variants(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    variants = {digits.lstrip('0'), digits[-9:]}
+    return ' '.join(sorted(variant for variant in variants if variant))
+
+
+def index_fields(patient_id, card_number, first_name, last_name, phone):
+    return {
+        'name': normalize_text(f"{first_name} {last_name}")[:200],
+        'phone_digits': phone_variants(phone)[:60],
+        'identifiers': ' '.join(
+            identifier for identifier in (normalize_identifier(patient_id), normalize_identifier(card_number))
+            if identifier
+        )[:60],
+    }
+
+
+def create_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in INDEX_COLUMNS:
+            schema_editor.execute(
+                f'CREATE INDEX {INDEX_TABLE}_{column}_trgm ON {INDEX_TABLE} USING gin ({column} gin_trgm_ops)'
+            )
+    elif vendor == 'sqlite':
+        columns = ', '.join(INDEX_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in INDEX_COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in INDEX_COLUMNS)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, "
+            f"content='{INDEX_TABLE}', content_rowid='patient_id', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {INDEX_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.patient_id, {new_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {INDEX_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.patient_id, {old_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {INDEX_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.patient_id, {old_values}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.patient_id, {new_values}); END"
+        )
+
+
+def drop_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for column in INDEX_COLUMNS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_TABLE}_{column}_trgm')
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def index_existing_patients(apps, schema_editor):
+    Patient = apps.get_model('healthcare', 'Patient')
+    PatientSearchIndex = apps.get_model('healthcare', 'PatientSearchIndex')
+    rows = []
+    for patient in Patient.objects.values(
+        'pk', 'patient_id', 'card_number', 'user__first_name', 'user__last_name', 'phone'
+    ).iterator(chunk_size=2000):
+        rows.append(PatientSearchIndex(patient_id=patient['pk'], **index_fields(
+            patient['patient_id'], patient['card_number'],
+            patient['user__first_name'], patient['user__last_name'], patient['phone']
+        )))
+        if len(rows) == 2000:
+            PatientSearchIndex.objects.bulk_create(rows)
+            rows = []
+    PatientSearchIndex.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0012_identifiersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSearchIndex',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='healthcare.patient')),
+                ('name', models.CharField(max_length=200)),
+                ('phone_digits', models.CharField(blank=True, max_length=60)),
+                ('identifiers', models.CharField(max_length=60)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_structures, drop_search_structures),
+        migrations.RunPython(index_existing_patients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:59
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copies of the healthcare.search helpers as of this migration, so later
+# changes to them do not change what it writes
+def soundex(word):
+    word = unicodedata.normalize('NFKD', word or '')
+    letters = [char for char in word.upper() if 'A' <= char <= 'Z']
+    if not letters:
+        return ''
+    codes = {
+        **dict.fromkeys('BFPV', '1'), **dict.fromkeys('CGJKQSXZ', '2'), **dict.fromkeys('DT', '3'),
+        'L': '4', **dict.fromkeys('MN', '5'), 'R': '6',
+    }
+    code = letters[0]
+    previous = codes.get(letters[0], '')
+    for char in letters[1:]:
+        digit = codes.get(char, '')
+        if digit and digit != previous:
+            code += digit
+        if char not in 'HW':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def blocking_keys(last_name, age, phone, reference_year):
+    return {
+        'surname_key': soundex(last_name),
+        'birth_band': None if age is None else (reference_year - age) // 5,
+        'phone_suffix': re.sub(r'\D', '', phone or '')[-7:],
+    }
+
+
+FTS_TABLE = 'healthcare_patientsearch_fts'
+INDEX_TABLE = 'healthcare_patientsearchindex'
+INDEX_COLUMNS = ['name', 'phone_digits', 'identifiers']
+
+
+def restore_fts_triggers(apps, schema_editor):
+    """
+    Adding the fields rebuilds the index table on SQLite, which drops the
+    FTS5 sync triggers from 0013; recreate them and resync the FTS table.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    columns = ', '.join(INDEX_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in INDEX_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in INDEX_COLUMNS)
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {INDEX_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.patient_id, {new_values}); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {INDEX_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.patient_id, {old_values}); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {INDEX_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.patient_id, {old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.patient_id, {new_values}); END"
+    )
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fill_blocking_keys(apps, schema_editor):
+    Patient = apps.get_model('healthcare', 'Patient')
+    PatientSearchIndex = apps.get_model('healthcare', 'PatientSearchIndex')
+    rows = []
+    for patient in Patient.objects.filter(search_index__isnull=False).values(
+        'pk', 'user__last_name', 'age', 'phone', 'created_at'
+    ).iterator(chunk_size=2000):
+        rows.append(PatientSearchIndex(patient_id=patient['pk'], **blocking_keys(
+            patient['user__last_name'], patient['age'], patient['phone'], patient['created_at'].year
+        )))
+        if len(rows) == 2000:
+            PatientSearchIndex.objects.bulk_update(rows, ['surname_key', 'birth_band', 'phone_suffix'])
+            rows = []
+    PatientSearchIndex.objects.bulk_update(rows, ['surname_key', 'birth_band', 'phone_suffix'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0013_patient_search_index'),
+    ]
+
+    operations = [
+        # Unapplying removes the fields after this runs, rebuilding the table again
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddField(
+            model_name='patientsearchindex',
+            name='birth_band',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='patientsearchindex',
+            name='phone_suffix',
+            field=models.CharField(blank=True, max_length=7),
+        ),
+        migrations.AddField(
+            model_name='patientsearchindex',
+            name='surname_key',
+            field=models.CharField(blank=True, max_length=4),
+        ),
+        migrations.AddIndex(
+            model_name='patientsearchindex',
+            index=models.Index(fields=['surname_key', 'birth_band'], name='healthcare__surname_991e7d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientsearchindex',
+            index=models.Index(fields=['phone_suffix'], name='healthcare__phone_s_cbbc22_idx'),
+        ),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+        migrations.RunPython(fill_blocking_keys, migrations.RunPython.noop),
+    ]
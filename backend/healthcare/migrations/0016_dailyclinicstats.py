@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0015_dashboard_stat_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyClinicStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('check_ins', models.PositiveIntegerField(default=0)),
+                ('visits_by_stage', models.JSONField(blank=True, default=dict)),
+                ('discharges', models.PositiveIntegerField(default=0)),
+                ('new_patients', models.PositiveIntegerField(default=0)),
+                ('lab_tests_requested', models.PositiveIntegerField(default=0)),
+                ('lab_tests_completed', models.PositiveIntegerField(default=0)),
+                ('prescriptions', models.PositiveIntegerField(default=0)),
+                ('appointments', models.PositiveIntegerField(default=0)),
+                ('shifts_completed', models.PositiveIntegerField(default=0)),
+                ('shift_hours', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('payroll', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+    ]
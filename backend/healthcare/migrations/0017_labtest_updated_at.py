@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:24
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_updated_at(apps, schema_editor):
+    # Existing tests last changed when they were completed, or else requested
+    LabTest = apps.get_model('healthcare', 'LabTest')
+    LabTest.objects.update(updated_at=Coalesce('completed_at', 'requested_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0016_dailyclinicstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labtest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['status', 'requested_at'], name='healthcare__status_3c4410_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['updated_at'], name='healthcare__updated_5eb622_idx'),
+        ),
+    ]
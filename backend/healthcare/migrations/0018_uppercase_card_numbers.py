@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:02
+
+from django.db import migrations
+from django.db.models.functions import Trim, Upper
+
+
+def uppercase_card_numbers(apps, schema_editor):
+    # Card lookups are exact matches on the uppercased number; a card whose
+    # uppercased form another patient already holds is left as it is
+    Patient = apps.get_model('healthcare', 'Patient')
+    for patient in Patient.objects.filter(card_number__isnull=False).exclude(
+        card_number=Upper(Trim('card_number'))
+    ).only('pk', 'card_number').iterator():
+        card = patient.card_number.strip().upper()
+        if card and not Patient.objects.filter(card_number=card).exists():
+            Patient.objects.filter(pk=patient.pk).update(card_number=card)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0017_labtest_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(uppercase_card_numbers, migrations.RunPython.noop),
+    ]
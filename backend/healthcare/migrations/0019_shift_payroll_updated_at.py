@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:10
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    # Existing rows last changed when created, as far as anyone can tell
+    for model in ('Shift', 'PayrollEntry'):
+        apps.get_model('healthcare', model).objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0018_uppercase_card_numbers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollentry',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 
@@ -62,34 +63,25 @@ class Patient(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['card_number']),
+            models.Index(fields=['created_at']),
         ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.patient_id})"
     
     def save(self, *args, **kwargs):
-        if not self.patient_id:
-            # Generate patient ID
-            last_patient = Patient.objects.order_by('-id').first()
-            if last_patient:
-                last_id = int(last_patient.patient_id.split('-')[1])
-                self.patient_id = f"P-{str(last_id + 1).zfill(3)}"
-            else:
-                self.patient_id = "P-001"
-        
-        if not self.card_number:
-            # Generate card number (C-001, C-002, etc.)
-            last_patient_with_card = Patient.objects.exclude(card_number__isnull=True).exclude(card_number='').order_by('-id').first()
-            if last_patient_with_card and last_patient_with_card.card_number:
-                try:
-                    last_card_id = int(last_patient_with_card.card_number.split('-')[1])
-                    self.card_number = f"C-{str(last_card_id + 1).zfill(5)}"
-                except (ValueError, IndexError):
-                    self.card_number = "C-00001"
-            else:
-                self.card_number = "C-00001"
-        
-        super().save(*args, **kwargs)
+        # Card lookups match the uppercased number exactly, so it can use the index
+        self.card_number = (self.card_number or '').strip().upper() or None
+        if self.patient_id and self.card_number:
+            return super().save(*args, **kwargs)
+
+        # Reserve numbers in the same transaction as the insert, so a failed insert gives them back
+        with transaction.atomic():
+            if not self.patient_id:
+                self.patient_id = IdentifierSequence.next_identifier('patient')
+            if not self.card_number:
+                self.card_number = IdentifierSequence.next_identifier('card')
+            super().save(*args, **kwargs)
 
 
 class Visit(models.Model):
@@ -101,11 +93,15 @@ class Visit(models.Model):
         ('results_by_doctor', 'Results by Doctor'),
         ('discharged', 'Discharged'),
     ]
+
+    # Stages that keep a visit on the live clinic queue
+    ACTIVE_STAGES = ['waiting_room', 'triage', 'questioning', 'laboratory_test', 'results_by_doctor']
     
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='visits')
     stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='waiting_room')
     check_in_time = models.DateTimeField(default=timezone.now)
     discharge_time = models.DateTimeField(null=True, blank=True)
+    stage_entered_at = models.DateTimeField(null=True, blank=True)  # Null until the first stage move
     
     # Visit details
     chief_complaint = models.TextField(null=True, blank=True)
@@ -159,6 +155,9 @@ class Visit(models.Model):
             models.Index(fields=['stage']),
             models.Index(fields=['check_in_time']),
             models.Index(fields=['stage', 'check_in_time']),
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['check_in_time', 'id']),
+            models.Index(fields=['discharge_time']),
         ]
 
 
@@ -200,12 +199,18 @@ class LabTest(models.Model):
     # Timestamps
     requested_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.test_name} - {self.visit.patient.user.get_full_name()}"
     
     class Meta:
         ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['status', 'completed_at']),
+            models.Index(fields=['status', 'requested_at']),
+            models.Index(fields=['updated_at']),
+        ]
 
 
 class Prescription(models.Model):
@@ -250,24 +255,22 @@ class Prescription(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def save(self, *args, **kwargs):
-        if not self.prescription_number:
-            # Generate prescription number (RX-001, RX-002, etc.)
-            last_rx = Prescription.objects.order_by('-id').first()
-            if last_rx and last_rx.prescription_number:
-                try:
-                    last_num = int(last_rx.prescription_number.split('-')[1])
-                    self.prescription_number = f"RX-{str(last_num + 1).zfill(3)}"
-                except (ValueError, IndexError):
-                    self.prescription_number = "RX-001"
-            else:
-                self.prescription_number = "RX-001"
-        super().save(*args, **kwargs)
+        if self.prescription_number:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            # Prescription numbers: RX-001, RX-002, etc.
+            self.prescription_number = IdentifierSequence.next_identifier('prescription')
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Prescription for {self.visit.patient.user.get_full_name()} - {self.created_at.strftime('%Y-%m-%d')}"
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
 
 
 class Medication(models.Model):
@@ -340,6 +343,9 @@ class Appointment(models.Model):
     
     class Meta:
         ordering = ['appointment_date']
+        indexes = [
+            models.Index(fields=['appointment_date']),
+        ]
 
 
 class MedicalRecord(models.Model):
@@ -493,9 +499,13 @@ class Shift(models.Model):
     status = models.CharField(max_length=20, choices=SHIFT_STATUS, default='scheduled')
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['start_time', 'status']),
+        ]
     
     def duration_hours(self):
         return (self.end_time - self.start_time).total_seconds() / 3600
@@ -514,6 +524,7 @@ class PayrollEntry(models.Model):
     deductions = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     net_pay = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-pay_period_end']
@@ -682,4 +693,200 @@ class Immunization(models.Model):
         return f"{self.vaccine_name} - {self.patient.user.get_full_name()} (Dose {self.dose_number})"
 
     class Meta:
-        ordering = ['-administered_date']
\ No newline at end of file
+        ordering = ['-administered_date']
+
+class ChangeCounter(models.Model):
+    """Named counters bumped whenever the tables behind a cached payload change"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} (v{self.value})"
+
+
+class VisitStageEvent(models.Model):
+    """Append-only log of every stage a visit enters (from_stage is blank on check-in)"""
+    visit = models.ForeignKey(Visit, on_delete=models.CASCADE, related_name='stage_events')
+    from_stage = models.CharField(max_length=20, choices=Visit.STAGE_CHOICES, blank=True)
+    to_stage = models.CharField(max_length=20, choices=Visit.STAGE_CHOICES)
+    occurred_at = models.DateTimeField(default=timezone.now)
+    seconds_in_stage = models.PositiveIntegerField(null=True, blank=True)  # Time spent in from_stage
+    moved_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stage_moves'
+    )
+
+    def __str__(self):
+        return f"Visit {self.visit_id}: {self.from_stage or 'check-in'} -> {self.to_stage}"
+
+    class Meta:
+        ordering = ['occurred_at']
+        indexes = [
+            models.Index(fields=['visit', 'occurred_at']),
+            models.Index(fields=['to_stage', 'occurred_at']),
+        ]
+
+
+class VisitTombstone(models.Model):
+    """Ids of deleted visits, so queue deltas can report them as removed"""
+    visit_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Visit {self.visit_id} deleted at {self.deleted_at}"
+
+
+class StageHourlyStats(models.Model):
+    """Per-stage, per-hour arrival and departure counters kept up to date by stage moves"""
+    stage = models.CharField(max_length=20, choices=Visit.STAGE_CHOICES)
+    hour = models.DateTimeField()  # Start of the hour (UTC)
+    entered = models.PositiveIntegerField(default=0)
+    exited = models.PositiveIntegerField(default=0)
+    timed_exits = models.PositiveIntegerField(default=0)  # Exits with a known time in stage
+    seconds_in_stage = models.PositiveBigIntegerField(default=0)  # Sum over timed exits
+
+    def __str__(self):
+        return f"{self.stage} @ {self.hour:%Y-%m-%d %H:00}"
+
+    class Meta:
+        ordering = ['-hour', 'stage']
+        unique_together = ['stage', 'hour']
+
+
+class StageServiceTime(models.Model):
+    """Exponentially weighted moving average of the time visits spend in each stage"""
+    stage = models.CharField(max_length=20, choices=Visit.STAGE_CHOICES, unique=True)
+    average_seconds = models.FloatField(default=0)
+    samples = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.stage}: {self.average_seconds / 60:.1f} min"
+
+
+class DailyClinicStats(models.Model):
+    """One local day of clinic activity, rolled up by the rollup_daily_stats command"""
+    day = models.DateField(unique=True)
+    check_ins = models.PositiveIntegerField(default=0)
+    visits_by_stage = models.JSONField(default=dict, blank=True)  # Stage -> visits that entered it that day
+    discharges = models.PositiveIntegerField(default=0)
+    new_patients = models.PositiveIntegerField(default=0)
+    lab_tests_requested = models.PositiveIntegerField(default=0)
+    lab_tests_completed = models.PositiveIntegerField(default=0)
+    prescriptions = models.PositiveIntegerField(default=0)
+    appointments = models.PositiveIntegerField(default=0)
+    shifts_completed = models.PositiveIntegerField(default=0)  # Completed shifts starting that day
+    shift_hours = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    payroll = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Net pay of periods starting that day
+    computed_at = models.DateTimeField()  # Start of the rollup run that wrote this row
+
+    def __str__(self):
+        return f"Clinic stats {self.day}"
+
+    class Meta:
+        ordering = ['-day']
+
+
+class IdentifierSequence(models.Model):
+    """
+    Counters behind the human-readable identifiers (P-001, C-00001, RX-001,
+    EMP-001). A sequence row is locked while numbers are handed out, so
+    concurrent inserts never get the same number, and numbers reserved in a
+    transaction that rolls back are handed out again.
+    """
+    # name: (prefix, zero padding, model, field) of each identifier
+    FORMATS = {
+        'patient': ('P-', 3, 'healthcare.Patient', 'patient_id'),
+        'card': ('C-', 5, 'healthcare.Patient', 'card_number'),
+        'prescription': ('RX-', 3, 'healthcare.Prescription', 'prescription_number'),
+        'employee': ('EMP-', 3, 'healthcare.StaffProfile', 'employee_id'),
+    }
+
+    name = models.CharField(max_length=20, unique=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+    @classmethod
+    def reserve(cls, name, count=1):
+        """Reserve `count` consecutive numbers from a sequence and return them as a range"""
+        with transaction.atomic():
+            sequence = cls.objects.select_for_update().filter(name=name).first()
+            if sequence is None:
+                # First use: continue from the highest identifier already issued
+                cls.objects.get_or_create(name=name, defaults={'last_value': cls._highest_issued(name)})
+                sequence = cls.objects.select_for_update().get(name=name)
+            start = sequence.last_value + 1
+            sequence.last_value += count
+            sequence.save(update_fields=['last_value'])
+        return range(start, start + count)
+
+    @classmethod
+    def advance_past(cls, name, identifiers):
+        """Move a sequence past explicitly chosen identifiers (e.g. imported cards) so it never issues them"""
+        prefix = cls.FORMATS[name][0]
+        highest = max((cls._number(prefix, value) for value in identifiers), default=0)
+        if highest:
+            with transaction.atomic():
+                cls.reserve(name, 0)
+                cls.objects.filter(name=name, last_value__lt=highest).update(last_value=highest)
+
+    @classmethod
+    def next_identifiers(cls, name, count, width=None):
+        """`count` new formatted identifiers, e.g. for bulk_create()"""
+        prefix, padding = cls.FORMATS[name][:2]
+        return [f"{prefix}{str(number).zfill(width or padding)}" for number in cls.reserve(name, count)]
+
+    @classmethod
+    def next_identifier(cls, name, width=None):
+        return cls.next_identifiers(name, 1, width)[0]
+
+    @classmethod
+    def _highest_issued(cls, name):
+        prefix, padding, model, field = cls.FORMATS[name]
+        issued = apps.get_model(model).objects.filter(**{f'{field}__startswith': prefix})
+        values = issued.values_list(field, flat=True).iterator()
+        return max((cls._number(prefix, value) for value in values), default=0)
+
+    @staticmethod
+    def _number(prefix, identifier):
+        """The number in a formatted identifier, or 0 when it is not one of this sequence's"""
+        if not identifier.startswith(prefix):
+            return 0
+        try:
+            return int(identifier[len(prefix):])
+        except ValueError:
+            return 0
+
+
+class PatientSearchIndex(models.Model):
+    """
+    Normalized copy of the searchable patient fields, kept in sync by
+    healthcare.search. Backed by trigram GIN indexes on PostgreSQL and an
+    FTS5 table on SQLite (see migration 0013).
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='search_index')
+    name = models.CharField(max_length=200)  # Lowercased, accent-free name tokens
+    phone_digits = models.CharField(max_length=60, blank=True)  # Digit-only phone variants
+    identifiers = models.CharField(max_length=60)  # Uppercased patient ID and card number, punctuation removed
+
+    # Blocking keys for duplicate detection (healthcare.duplicates)
+    surname_key = models.CharField(max_length=4, blank=True)  # Soundex of the last name
+    birth_band = models.SmallIntegerField(null=True, blank=True)  # Estimated birth year // 5
+    phone_suffix = models.CharField(max_length=7, blank=True)  # Last 7 phone digits
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.identifiers})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['surname_key', 'birth_band']),
+            models.Index(fields=['phone_suffix']),
+        ]
@@ -0,0 +1,103 @@
+"""
+Opt-in cursor pagination for the router list endpoints.
+
+Lists stay plain arrays unless the client passes ?cursor= or ?page_size=,
+so existing callers keep working. Paged responses are
+{next, previous, results}, plus {total, total_is_estimate} when
+?include_total=true: an exact count for small results, otherwise the
+PostgreSQL planner's estimate, which costs no table scan.
+"""
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+# Results the planner expects to be smaller than this are counted exactly
+EXACT_COUNT_BELOW = 10000
+
+
+def estimated_count(queryset):
+    """
+    Planner row estimate for `queryset`, or None where there is none (not
+    PostgreSQL, or a query that cannot be compiled).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+            # reltuples is -1 for a table that was never vacuumed or analyzed
+            if row and row[0] >= 0:
+                return row[0]
+            return None
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_with_estimate(queryset):
+    """(count, whether it is an estimate)"""
+    estimate = estimated_count(queryset)
+    if estimate is None or estimate < EXACT_COUNT_BELOW:
+        return queryset.count(), False
+    return estimate, True
+
+
+class OptionalCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    total_query_param = 'include_total'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.total = None
+        if params.get(self.total_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.total = count_with_estimate(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        if any(hasattr(backend, 'get_ordering') for backend in getattr(view, 'filter_backends', [])):
+            ordering = super().get_ordering(request, queryset, view)
+        else:
+            ordering = tuple(queryset.model._meta.ordering) or ('-pk',)
+
+        # The cursor compares the first field against its last value, read
+        # off the last row. That drops rows where it is NULL and cannot be
+        # done for lookups across relations ('user__first_name'), related
+        # objects or annotations; page those lists by primary key instead
+        field_name = ordering[0].lstrip('-')
+        try:
+            field = queryset.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            field = None
+        if field is None or field.null or field.is_relation or not field.concrete:
+            return ('-pk',) if ordering[0].startswith('-') else ('pk',)
+        return ordering
+
+    def get_paginated_response(self, data):
+        response = {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+        if self.total is not None:
+            response['total'], response['total_is_estimate'] = self.total
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['total'] = {'type': 'integer'}
+        response_schema['properties']['total_is_estimate'] = {'type': 'boolean'}
+        return response_schema
@@ -0,0 +1,30 @@
+import datetime
+import decimal
+
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .renderers import MSGPACK_DECIMAL, MSGPACK_DATE, MSGPACK_TIME
+
+
+def _msgpack_ext(code, data):
+    if code == MSGPACK_DECIMAL:
+        return decimal.Decimal(data.decode())
+    if code == MSGPACK_DATE:
+        return datetime.date.fromisoformat(data.decode())
+    if code == MSGPACK_TIME:
+        return datetime.time.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+class MessagePackParser(BaseParser):
+    """Accepts `Content-Type: application/msgpack` bodies, as MessagePackRenderer writes them"""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            # timestamp=3 turns MessagePack timestamps into aware UTC datetimes
+            return msgpack.unpackb(stream.read(), ext_hook=_msgpack_ext, timestamp=3, strict_map_key=False)
+        except (ValueError, TypeError, decimal.InvalidOperation) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
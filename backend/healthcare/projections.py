@@ -0,0 +1,190 @@
+"""
+Queue payloads built straight from values() queries.
+
+Produces the same rows as QueuePatientSerializer, but from a fixed number
+of queries (visits joined to patient and user, lab tests, prescriptions)
+stitched together in dictionaries, so the cost of the queue and
+all-patients feeds does not grow in queries with the number of visits.
+patient_rows does the same for PatientSerializer.
+"""
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import serializers
+
+from .models import LabTest, Prescription
+
+VISIT_VALUES = [
+    'id', 'stage', 'check_in_time', 'vital_signs', 'triage_notes', 'questioning_findings',
+    'lab_findings', 'diagnosis', 'final_findings',
+    'patient__patient_id', 'patient__phone', 'patient__address', 'patient__age',
+    'patient__gender', 'patient__priority',
+    'patient__user__first_name', 'patient__user__last_name', 'patient__user__email',
+]
+
+PATIENT_VALUES = [
+    'id', 'patient_id', 'card_number', 'age', 'gender', 'phone', 'address',
+    'medical_history', 'allergies', 'current_medications', 'emergency_contact_name',
+    'emergency_contact_phone', 'insurance_provider', 'insurance_policy_number',
+    'priority', 'created_at', 'updated_at',
+]
+PATIENT_USER_VALUES = ['user__id', 'user__username', 'user__first_name', 'user__last_name', 'user__email', 'user__role']
+# PatientSerializer's keys, in its order
+PATIENT_FIELDS = ['id', 'user', 'patient_id', 'card_number', 'full_name', *PATIENT_VALUES[3:]]
+
+# Payload columns that come from lab tests and prescriptions
+RELATED_FIELDS = {'requestedLabTests', 'labResults', 'prescription'}
+
+_datetime = serializers.DateTimeField()
+
+
+def _full_name(first_name, last_name):
+    # Same as AbstractUser.get_full_name()
+    return f"{first_name} {last_name}".strip()
+
+
+def _prescription_text(medications):
+    if isinstance(medications, list):
+        return "\n".join([
+            f"{med.get('name', '')}, {med.get('dose', '')}, {med.get('frequency', '')}, {med.get('duration', '')}"
+            for med in medications
+        ])
+    return None
+
+
+def _related(visit_filter):
+    lab_tests = defaultdict(list)
+    for visit_id, test_name, test_status, results in (
+        LabTest.objects.filter(**visit_filter)
+        .order_by('-requested_at')
+        .values_list('visit_id', 'test_name', 'status', 'results')
+    ):
+        lab_tests[visit_id].append((test_name, test_status, results))
+
+    prescriptions = dict(
+        Prescription.objects.filter(**visit_filter).values_list('visit_id', 'medications')
+    )
+    return lab_tests, prescriptions
+
+
+def _build_rows(visit_rows, lab_tests, prescriptions):
+    rows = []
+    for visit in visit_rows:
+        tests = lab_tests.get(visit['id'], [])
+        results = [f"{name}: {result}" for name, test_status, result in tests if test_status == 'completed']
+        prescription = None
+        if visit['id'] in prescriptions:
+            prescription = _prescription_text(prescriptions[visit['id']])
+
+        rows.append({
+            'id': visit['patient__patient_id'],
+            'visitId': visit['id'],
+            'name': _full_name(visit['patient__user__first_name'], visit['patient__user__last_name']),
+            'stage': visit['stage'],
+            'checkInTime': _datetime.to_representation(visit['check_in_time']),
+            'email': visit['patient__user__email'],
+            'phone': visit['patient__phone'],
+            'address': visit['patient__address'],
+            'age': visit['patient__age'],
+            'sex': visit['patient__gender'],
+            'priority': visit['patient__priority'].title(),
+            'vitalSigns': visit['vital_signs'],
+            'triageNotes': visit['triage_notes'],
+            'questioningFindings': visit['questioning_findings'],
+            'labFindings': visit['lab_findings'],
+            'requestedLabTests': [name for name, test_status, result in tests],
+            'labResults': "\n".join(results) if results else None,
+            'diagnosis': visit['diagnosis'],
+            'prescription': prescription,
+            'finalFindings': visit['final_findings'],
+        })
+    return rows
+
+
+# Queries queue_rows() runs however many visits it lists
+QUEUE_ROWS_QUERIES = 3
+
+
+def queue_rows(visits, fields=None):
+    """
+    Queue payload rows for a Visit queryset, in its order, using three queries.
+
+    `fields` trims every row to those keys; lab tests and prescriptions are
+    not queried at all when none of their columns are requested.
+    """
+    visit_rows = list(visits.values(*VISIT_VALUES))
+    if fields is not None and not RELATED_FIELDS.intersection(fields):
+        related = ({}, {})
+    elif visits.query.is_sliced:
+        related = _related({'visit_id__in': [visit['id'] for visit in visit_rows]})
+    else:
+        related = _related({'visit__in': visits.values('pk')})
+
+    rows = _build_rows(visit_rows, *related)
+    if fields is not None:
+        rows = [{field: row[field] for field in fields} for row in rows]
+    return rows
+
+
+def iter_queue_rows(visits, chunk_size=500):
+    """
+    Yield queue payload rows for a Visit queryset without loading it whole.
+
+    Visits are read with a database-side iterator; lab tests and
+    prescriptions are fetched per chunk, so memory stays bounded by
+    `chunk_size` and the query count by rows / chunk_size.
+    """
+    chunk = []
+    for visit in visits.values(*VISIT_VALUES).iterator(chunk_size=chunk_size):
+        chunk.append(visit)
+        if len(chunk) == chunk_size:
+            yield from _build_rows(chunk, *_related({'visit_id__in': [row['id'] for row in chunk]}))
+            chunk = []
+    if chunk:
+        yield from _build_rows(chunk, *_related({'visit_id__in': [row['id'] for row in chunk]}))
+
+
+def stream_rows(rows, stream_format='ndjson'):
+    """Encode an iterable of rows as newline-delimited JSON or as one JSON array, row by row"""
+    if stream_format == 'ndjson':
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+        return
+
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps(row, cls=DjangoJSONEncoder)
+        separator = ','
+    yield ']'
+
+
+def patient_rows(patients, fields=None):
+    """
+    PatientSerializer rows for a Patient queryset from one values() query.
+
+    Timestamps stay datetimes for the renderer to encode, which gives the
+    same text as the serializer with TIME_ZONE = 'UTC'. `fields` keeps only
+    those keys, in serializer order; the user is not joined unless needed.
+    """
+    fields = PATIENT_FIELDS if fields is None else fields
+    with_user = 'user' in fields or 'full_name' in fields
+    columns = [column for column in PATIENT_VALUES if column in fields or column == 'id']
+    if with_user:
+        columns += PATIENT_USER_VALUES
+
+    rows = []
+    for patient in patients.values(*columns):
+        if with_user:
+            patient['user'] = {
+                'id': patient.pop('user__id'),
+                'username': patient.pop('user__username'),
+                'first_name': patient.pop('user__first_name'),
+                'last_name': patient.pop('user__last_name'),
+                'email': patient.pop('user__email'),
+                'role': patient.pop('user__role'),
+            }
+            patient['full_name'] = _full_name(patient['user']['first_name'], patient['user']['last_name'])
+        rows.append({field: patient[field] for field in fields})
+    return rows
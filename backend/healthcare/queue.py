@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Q, Case, When, Value, IntegerField
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import QUEUE_COUNTER, DASHBOARD_COUNTER, bump_counter_on_commit
+from .models import Visit, VisitTombstone, LabTest, Prescription
+
+# Rows saved just before a cursor was issued may commit slightly after it,
+# so every delta re-reads a small window behind the cursor.
+QUEUE_CURSOR_GRACE = timedelta(seconds=2)
+# Deleted visits are remembered this long; older cursors must reload the full queue
+QUEUE_TOMBSTONE_RETENTION = timedelta(days=1)
+
+
+def encode_cursor(moment):
+    """Encode a datetime as an opaque queue cursor (microseconds since epoch)"""
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def decode_cursor(cursor):
+    """Decode a queue cursor; returns None for an empty/initial cursor"""
+    if cursor in (None, '', '0'):
+        return None
+    try:
+        return datetime.fromtimestamp(int(cursor) / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        # Not a number, or one too far from the epoch for a datetime
+        raise ValueError('Invalid queue cursor')
+
+
+# Queue stages each role works on for /visits/queue/mine/
+ROLE_QUEUE_STAGES = {
+    'triage': ['waiting_room', 'triage'],
+    'nurse': ['waiting_room', 'triage'],
+    'doctor': ['questioning', 'laboratory_test', 'results_by_doctor'],
+    'laboratory': ['laboratory_test'],
+}
+
+IDENTITY_FIELDS = [
+    'id', 'visitId', 'name', 'stage', 'checkInTime', 'email', 'phone', 'address', 'age', 'sex', 'priority'
+]
+
+# Queue columns each role gets on /visits/queue/mine/; roles not listed get every column
+ROLE_QUEUE_FIELDS = {
+    'reception': IDENTITY_FIELDS,
+    'triage': IDENTITY_FIELDS + ['vitalSigns', 'triageNotes'],
+    'nurse': IDENTITY_FIELDS + ['vitalSigns', 'triageNotes'],
+    'laboratory': IDENTITY_FIELDS + ['questioningFindings', 'requestedLabTests', 'labResults', 'labFindings'],
+}
+
+
+def parse_stages(value):
+    """Parse a comma-separated ?stage= value into a list of active queue stages"""
+    stages = [stage.strip() for stage in value.split(',') if stage.strip()]
+    invalid = [stage for stage in stages if stage not in Visit.ACTIVE_STAGES]
+    if invalid or not stages:
+        raise ValueError(f"stage must be one or more of: {', '.join(Visit.ACTIVE_STAGES)}")
+    return stages
+
+
+def urgent_first(patient='patient'):
+    """Order expression putting visits (or lab tests) of urgent patients first; `patient` is the path to the patient"""
+    return Case(
+        When(**{f'{patient}__priority': 'urgent'}, then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField()
+    )
+
+
+def active_queue(stages=None):
+    """Active visits in queue order, optionally limited to some stages"""
+    return Visit.objects.filter(stage__in=stages or Visit.ACTIVE_STAGES).order_by('check_in_time')
+
+
+def queue_changes(since, stages=None):
+    """
+    Visits touched since `since`, split into those still on the queue and
+    the ids of those that have left it (or left `stages`, when given),
+    including deleted ones.
+
+    A visit counts as touched when the visit itself, its patient, one of its
+    lab tests or its prescription has changed after `since`. Cursors older
+    than QUEUE_TOMBSTONE_RETENTION raise ValueError, since deletions before
+    then are no longer known.
+    """
+    stages = stages or Visit.ACTIVE_STAGES
+    if since is None:
+        return active_queue(stages), []
+    if since < timezone.now() - QUEUE_TOMBSTONE_RETENTION:
+        raise ValueError('Queue cursor expired; reload the full queue')
+
+    since = since - QUEUE_CURSOR_GRACE
+    touched = Visit.objects.filter(
+        Q(updated_at__gte=since) |
+        Q(patient__updated_at__gte=since) |
+        Q(id__in=LabTest.objects.filter(updated_at__gte=since).values('visit_id')) |
+        Q(id__in=Prescription.objects.filter(updated_at__gte=since).values('visit_id'))
+    )
+
+    changed = active_queue(stages).filter(id__in=touched.values('id'))
+    removed = list(
+        touched.exclude(stage__in=stages)
+        .filter(updated_at__gte=since)
+        .values_list('id', flat=True)
+    )
+    removed += VisitTombstone.objects.filter(deleted_at__gte=since).values_list('visit_id', flat=True)
+    return changed, removed
+
+
+# Stages a doctor picks patients from with /visits/claim_next/
+CLAIMABLE_STAGES = ['questioning', 'results_by_doctor']
+# Candidates tried before giving up when other doctors keep claiming them first
+CLAIM_ATTEMPTS = 5
+
+
+def _next_unclaimed(candidates):
+    # Rows another transaction is claiming are skipped rather than waited on
+    return (
+        candidates.select_for_update(skip_locked=True, of=('self',))
+        .order_by(urgent_first(), 'check_in_time')
+        .values_list('pk', flat=True)
+        .first()
+    )
+
+
+def claim_next_visit(doctor, stages=None):
+    """
+    Assign the most urgent, longest-waiting unclaimed visit in `stages` to
+    `doctor` and return it, or None when there is nothing left to claim.
+
+    The claim is an UPDATE that only matches while the visit is still
+    unclaimed, so two doctors never get the same visit even where row locks
+    are unavailable (SQLite); a caller that loses the race moves on to the
+    next candidate.
+    """
+    candidates = Visit.objects.filter(stage__in=stages or CLAIMABLE_STAGES, attending_doctor__isnull=True)
+    for _ in range(CLAIM_ATTEMPTS):
+        with transaction.atomic():
+            visit_id = _next_unclaimed(candidates)
+            if visit_id is None:
+                return None
+            if candidates.filter(pk=visit_id).update(attending_doctor=doctor, updated_at=timezone.now()):
+                # update() sends no post_save, so invalidate what the signals would have
+                bump_counter_on_commit(QUEUE_COUNTER)
+                bump_counter_on_commit(DASHBOARD_COUNTER)
+                return Visit.objects.get(pk=visit_id)
+    return None
+
+
+def encode_history_cursor(row):
+    """Cursor pointing just after a queue payload row"""
+    return f"{encode_cursor(parse_datetime(row['checkInTime']))}.{row['visitId']}"
+
+
+def decode_history_cursor(cursor):
+    try:
+        moment, visit_id = cursor.split('.')
+        return decode_cursor(moment), int(visit_id)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid history cursor')
+
+
+def visit_history(cursor=None):
+    """
+    All visits newest first, ordered on (check_in_time, id) so a page can
+    resume after the last row of the previous one without an OFFSET scan.
+    """
+    visits = Visit.objects.order_by('-check_in_time', '-id')
+    if cursor:
+        check_in_time, visit_id = decode_history_cursor(cursor)
+        visits = visits.filter(
+            Q(check_in_time__lt=check_in_time) |
+            Q(check_in_time=check_in_time, id__lt=visit_id)
+        )
+    return visits
+
+
+def next_cursor():
+    return encode_cursor(timezone.now())
@@ -0,0 +1,87 @@
+import datetime
+import decimal
+import json
+
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+
+# MessagePack extension types for values the format has no type for. Aware
+# datetimes use MessagePack's own timestamp type instead.
+MSGPACK_DECIMAL = 1
+MSGPACK_DATE = 2
+MSGPACK_TIME = 3
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets views answer `Accept: text/event-stream` (Server-Sent Events)"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Streams are written directly by the view; this only covers errors.
+        if data is None:
+            return b''
+        return f"event: error\ndata: {json.dumps(data)}\n\n".encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer's output, encoded with orjson.
+
+    orjson encodes dicts, lists, strings, numbers and UUIDs natively.
+    Datetimes, dates and times go through DRF's encoder, like anything else
+    orjson has no type for (Decimals, timedeltas, lazy strings, querysets),
+    so they come out exactly as JSONRenderer writes them. The one difference:
+    NaN and infinite floats render as null, where JSONRenderer refuses them
+    as invalid JSON. Falls back to JSONRenderer without orjson or for
+    indented output.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        content = orjson.dumps(
+            data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+        # JSONRenderer escapes these too: valid JSON, but line terminators in JavaScript
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return msgpack.ExtType(MSGPACK_DECIMAL, str(obj).encode())
+    if isinstance(obj, datetime.date) and not isinstance(obj, datetime.datetime):
+        return msgpack.ExtType(MSGPACK_DATE, obj.isoformat().encode())
+    if isinstance(obj, datetime.time) and obj.tzinfo is None:
+        return msgpack.ExtType(MSGPACK_TIME, obj.isoformat().encode())
+    # Naive datetimes, timedeltas, UUIDs, lazy strings... as JSONRenderer has them
+    return _encoder.default(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Answers `Accept: application/msgpack`. Decimals, dates and times are
+    extension types and aware datetimes MessagePack timestamps, so they
+    decode back to the same values (see MessagePackParser).
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default, datetime=True)
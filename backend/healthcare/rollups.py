@@ -0,0 +1,195 @@
+"""
+Daily clinic rollups.
+
+rollup_daily_stats recomputes DailyClinicStats rows for the days whose
+source rows changed since its last run, plus today and a short lookback
+window. That window catches what timestamps cannot show, such as deletions
+or rows moved off a day. Reports read the rollups for past days and count
+today, and any earlier day without a rollup row yet, live, so a date range
+costs about one row per day once the rollups are current.
+
+build.sh runs the command on each deploy (the first run backfills every
+day). Between deploys, schedule it every few minutes and at least once just
+after midnight, e.g. from cron on the app host:
+
+    */5 * * * * cd /app && python manage.py rollup_daily_stats
+
+Stale rollups only make reports slower, never wrong for days without a row,
+but a day edited after its row was computed reads stale until the next run.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DurationField, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Patient, Visit, VisitStageEvent, LabTest, Prescription, Appointment, Shift, PayrollEntry, DailyClinicStats
+)
+from .stats import aggregates, fetch_aggregates, day_range
+
+ROLLUP_LOOKBACK_DAYS = 2
+DAILY_REPORT_MAX_DAYS = 366
+
+ROLLUP_FIELDS = [
+    'check_ins', 'visits_by_stage', 'discharges', 'new_patients', 'lab_tests_requested', 'lab_tests_completed',
+    'prescriptions', 'appointments', 'shifts_completed', 'shift_hours', 'payroll'
+]
+# Summable rollup columns (everything but the stage breakdown)
+ROLLUP_TOTALS = [field for field in ROLLUP_FIELDS if field != 'visits_by_stage']
+
+
+def compute_day(day):
+    """Rollup column values for one local day, in one query"""
+    start, end = day_range(day)
+    row = fetch_aggregates(
+        check_ins=aggregates(Visit.objects.filter(check_in_time__gte=start, check_in_time__lt=end), total=Count('pk')),
+        discharges=aggregates(
+            Visit.objects.filter(discharge_time__gte=start, discharge_time__lt=end), total=Count('pk')
+        ),
+        stages=aggregates(
+            VisitStageEvent.objects.filter(occurred_at__gte=start, occurred_at__lt=end),
+            **{stage: Count('pk', filter=Q(to_stage=stage)) for stage, label in Visit.STAGE_CHOICES}
+        ),
+        patients=aggregates(Patient.objects.filter(created_at__gte=start, created_at__lt=end), total=Count('pk')),
+        requested=aggregates(LabTest.objects.filter(requested_at__gte=start, requested_at__lt=end), total=Count('pk')),
+        completed=aggregates(
+            LabTest.objects.filter(status='completed', completed_at__gte=start, completed_at__lt=end), total=Count('pk')
+        ),
+        prescriptions=aggregates(
+            Prescription.objects.filter(created_at__gte=start, created_at__lt=end), total=Count('pk')
+        ),
+        appointments=aggregates(
+            Appointment.objects.filter(appointment_date__gte=start, appointment_date__lt=end), total=Count('pk')
+        ),
+        shifts=aggregates(
+            Shift.objects.filter(start_time__gte=start, start_time__lt=end, status='completed'),
+            total=Count('pk'),
+            duration=Sum(F('end_time') - F('start_time'), output_field=DurationField()),
+        ),
+        payroll=aggregates(PayrollEntry.objects.filter(pay_period_start=day), total=Sum('net_pay')),
+    )
+    return {
+        'check_ins': row['check_ins']['total'],
+        'visits_by_stage': {stage: count for stage, count in row['stages'].items() if count},
+        'discharges': row['discharges']['total'],
+        'new_patients': row['patients']['total'],
+        'lab_tests_requested': row['requested']['total'],
+        'lab_tests_completed': row['completed']['total'],
+        'prescriptions': row['prescriptions']['total'],
+        'appointments': row['appointments']['total'],
+        'shifts_completed': row['shifts']['total'],
+        'shift_hours': Decimal(str(round((row['shifts']['duration'] or timedelta()).total_seconds() / 3600, 2))),
+        'payroll': row['payroll']['total'] or 0,
+    }
+
+
+# (rows changed since the watermark, the fields that place each row on a day)
+def _change_sources(since):
+    return [
+        (Visit.objects.filter(updated_at__gte=since), ['check_in_time', 'discharge_time']),
+        (VisitStageEvent.objects.filter(occurred_at__gte=since), ['occurred_at']),
+        (Patient.objects.filter(updated_at__gte=since), ['created_at']),
+        (LabTest.objects.filter(updated_at__gte=since), ['requested_at', 'completed_at']),
+        (Prescription.objects.filter(updated_at__gte=since), ['created_at']),
+        (Appointment.objects.filter(updated_at__gte=since), ['appointment_date']),
+        (Shift.objects.filter(updated_at__gte=since), ['start_time']),
+        (PayrollEntry.objects.filter(updated_at__gte=since), ['pay_period_start']),
+    ]
+
+
+def _days_of(queryset, field):
+    queryset = queryset.order_by().exclude(**{f'{field}__isnull': True})
+    if queryset.model._meta.get_field(field).get_internal_type() == 'DateField':
+        return set(queryset.values_list(field, flat=True).distinct())
+    return set(queryset.annotate(_day=TruncDate(field)).values_list('_day', flat=True).distinct())
+
+
+def changed_days(since):
+    """Local days with source rows created or updated since `since`"""
+    days = set()
+    for queryset, fields in _change_sources(since):
+        for field in fields:
+            days |= _days_of(queryset, field)
+    return days
+
+
+def first_activity_day():
+    """The earliest local day with any activity, or None on an empty database"""
+    candidates = [
+        Visit.objects.aggregate(first=Min('check_in_time'))['first'],
+        Patient.objects.aggregate(first=Min('created_at'))['first'],
+        Appointment.objects.aggregate(first=Min('appointment_date'))['first'],
+        Shift.objects.aggregate(first=Min('start_time'))['first'],
+    ]
+    days = [timezone.localdate(value) for value in candidates if value]
+    first_payroll = PayrollEntry.objects.aggregate(first=Min('pay_period_start'))['first']
+    if first_payroll:
+        days.append(first_payroll)
+    return min(days) if days else None
+
+
+def run_rollup(lookback_days=ROLLUP_LOOKBACK_DAYS, since=None, full=False):
+    """
+    Recompute the rollup rows that may be out of date and return their days.
+    `since` (a date) forces every day from then on; `full` rebuilds everything.
+    """
+    started = timezone.now()
+    today = timezone.localdate(started)
+    watermark = DailyClinicStats.objects.aggregate(watermark=Max('computed_at'))['watermark']
+
+    if full or watermark is None:
+        since = first_activity_day() or today
+        days = set()
+    else:
+        days = changed_days(watermark)
+        days |= {today - timedelta(days=offset) for offset in range(lookback_days + 1)}
+    if since:
+        days |= {since + timedelta(days=offset) for offset in range((today - since).days + 1)}
+    days = sorted(day for day in days if day <= today)
+
+    for chunk_start in range(0, len(days), 100):
+        DailyClinicStats.objects.bulk_create(
+            [
+                DailyClinicStats(day=day, computed_at=started, **compute_day(day))
+                for day in days[chunk_start:chunk_start + 100]
+            ],
+            update_conflicts=True,
+            unique_fields=['day'],
+            update_fields=[*ROLLUP_FIELDS, 'computed_at'],
+        )
+    return days
+
+
+def daily_report(start_day, end_day):
+    """
+    Rollup rows of [start_day, end_day] with their totals. Today, and earlier
+    days the rollup has not reached yet, are computed live; days before any
+    activity are left out.
+    """
+    today = timezone.localdate()
+    last_day = min(end_day, today)
+    rolled_up = {
+        row['day']: row
+        for row in DailyClinicStats.objects.filter(day__gte=start_day, day__lte=last_day)
+        .exclude(day=today).values('day', *ROLLUP_FIELDS)
+    }
+
+    rows, first_day = [], None
+    for offset in range((last_day - start_day).days + 1):
+        day = start_day + timedelta(days=offset)
+        if day in rolled_up:
+            rows.append(rolled_up[day])
+            continue
+        if first_day is None:
+            first_day = first_activity_day() or today
+        if day >= first_day:
+            rows.append({'day': day, **compute_day(day)})
+
+    totals = {field: sum(row[field] for row in rows) for field in ROLLUP_TOTALS}
+    totals['visits_by_stage'] = {}
+    for row in rows:
+        for stage, count in row['visits_by_stage'].items():
+            totals['visits_by_stage'][stage] = totals['visits_by_stage'].get(stage, 0) + count
+    return {'start': start_day, 'end': end_day, 'days': rows, 'totals': totals}
@@ -0,0 +1,278 @@
+"""
+Patient search over PatientSearchIndex.
+
+Names are stored as lowercase, accent-free tokens, phones as digit-only
+variants and patient IDs / card numbers uppercased without punctuation, so
+"abebe 0911-23", "P-001" and "c00001" all hit an index instead of an
+icontains scan joined to the user table. PostgreSQL matches with pg_trgm
+GIN indexes ranked by trigram similarity; SQLite uses an FTS5 table with
+prefix indexes ranked by bm25. When a query finds little, a relaxed lookup
+on name prefixes is re-scored with rapidfuzz to catch typos.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q, Case, When, Value, IntegerField
+from django.utils import timezone
+from rapidfuzz import fuzz, process
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from .models import PatientSearchIndex
+
+SEARCH_MAX_RESULTS = 200
+# Trailing digits that identify a phone regardless of country or trunk prefix
+PHONE_NATIONAL_DIGITS = 9
+# Fuzzy matching kicks in below this many exact/prefix matches
+FUZZY_FALLBACK_BELOW = 5
+FUZZY_CANDIDATES = 500
+FUZZY_MIN_SCORE = 70
+
+FTS_TABLE = 'healthcare_patientsearch_fts'
+
+_fts_available = None
+
+
+def normalize_text(value):
+    """Lowercase, strip accents and split on anything that is not a letter or digit"""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(re.split(r'[\W_]+', value.lower())).strip()
+
+
+def normalize_identifier(value):
+    """Uppercase without punctuation; letters of any script are kept so non-Latin names still parse"""
+    return ''.join(char for char in (value or '').upper() if char.isalnum())
+
+
+def phone_variants(phone):
+    """Digit-only forms of a phone: without leading zeros, and its national part"""
+    digits = re.sub(r'\D', '', phone or '')
+    variants = {digits.lstrip('0'), digits[-PHONE_NATIONAL_DIGITS:]}
+    return ' '.join(sorted(variant for variant in variants if variant))
+
+
+def index_fields(patient_id, card_number, first_name, last_name, phone):
+    """PatientSearchIndex column values for one patient"""
+    return {
+        'name': normalize_text(f"{first_name} {last_name}")[:200],
+        'phone_digits': phone_variants(phone)[:60],
+        'identifiers': ' '.join(
+            identifier for identifier in (normalize_identifier(patient_id), normalize_identifier(card_number))
+            if identifier
+        )[:60],
+    }
+
+
+def soundex(word):
+    """American Soundex code of a word ('' if it has no letters)"""
+    letters = [char for char in normalize_text(word).upper() if 'A' <= char <= 'Z']
+    if not letters:
+        return ''
+    codes = {
+        **dict.fromkeys('BFPV', '1'), **dict.fromkeys('CGJKQSXZ', '2'), **dict.fromkeys('DT', '3'),
+        'L': '4', **dict.fromkeys('MN', '5'), 'R': '6',
+    }
+    code = letters[0]
+    previous = codes.get(letters[0], '')
+    for char in letters[1:]:
+        digit = codes.get(char, '')
+        if digit and digit != previous:
+            code += digit
+        if char not in 'HW':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def birth_band(age, reference_year):
+    """Five-year band of the birth year implied by an age given in `reference_year`"""
+    if age is None:
+        return None
+    return (reference_year - age) // 5
+
+
+def blocking_keys(last_name, age, phone, reference_year):
+    """Duplicate-detection blocking keys for one patient"""
+    return {
+        'surname_key': soundex(last_name),
+        'birth_band': birth_band(age, reference_year),
+        'phone_suffix': re.sub(r'\D', '', phone or '')[-7:],
+    }
+
+
+def index_patients(patients):
+    """Create or refresh the search rows of Patient instances (with their user loaded)"""
+    this_year = timezone.now().year
+    rows = [
+        PatientSearchIndex(
+            patient_id=patient.pk,
+            **index_fields(
+                patient.patient_id, patient.card_number,
+                patient.user.first_name, patient.user.last_name, patient.phone
+            ),
+            # Ages are recorded at registration, so birth years are estimated from then
+            **blocking_keys(
+                patient.user.last_name, patient.age, patient.phone,
+                patient.created_at.year if patient.created_at else this_year
+            )
+        )
+        for patient in patients
+    ]
+    # Delete and insert rather than upsert so the SQLite FTS triggers see plain inserts
+    PatientSearchIndex.objects.filter(patient_id__in=[row.patient_id for row in rows]).delete()
+    PatientSearchIndex.objects.bulk_create(rows)
+
+
+def _parse_query(query):
+    """
+    Split a query into terms of (identifier, name words, phone digits). Digit
+    groups separated by spaces or dashes are joined first, so a phone can be
+    typed the way it is printed.
+
+    Each term only targets the columns it can match: letters are name words,
+    digits a phone or card number, and letters mixed with digits an ID. A
+    term like "P" would otherwise prefix-match every identifier.
+    """
+    query = re.sub(r'(?<=\d)[\s\-().]+(?=\d)', '', query or '')
+    terms = []
+    for chunk in query.split():
+        identifier = normalize_identifier(chunk)
+        if not identifier:
+            continue
+        if identifier.isdigit():
+            terms.append((identifier, [], chunk.lstrip('+').lstrip('0')))
+        elif any(char.isdigit() for char in identifier):
+            terms.append((identifier, [], ''))
+        else:
+            terms.append(('', normalize_text(chunk).split(), ''))
+    return terms
+
+
+def _uses_fts():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def _fts_quote(token):
+    return '"' + token.replace('"', '""') + '"*'
+
+
+def _fts_search(terms, limit):
+    clauses = []
+    for identifier, words, digits in terms:
+        alternatives = []
+        if identifier:
+            alternatives.append(f"identifiers : {_fts_quote(identifier)}")
+        if words:
+            alternatives.append(f"name : ({' AND '.join(_fts_quote(word) for word in words)})")
+        if digits:
+            alternatives.append(f"phone_digits : {_fts_quote(digits)}")
+        clauses.append(f"({' OR '.join(alternatives)})")
+
+    # Ranking scores every match before LIMIT applies, which is too costly
+    # for one- and two-character prefixes that match much of the registry
+    tokens = [token for identifier, words, digits in terms for token in [identifier, *words] if token]
+    order = f"ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 5.0)" if min(map(len, tokens)) >= 3 else ''
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {order} LIMIT %s",
+            [' AND '.join(clauses), limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _term_filter(identifier, words, digits):
+    term = Q(identifiers__contains=identifier) if identifier else Q(pk__in=[])
+    if words:
+        name = Q()
+        for word in words:
+            name &= Q(name__contains=word)
+        term |= name
+    if digits:
+        term |= Q(phone_digits__contains=digits)
+    return term
+
+
+def _orm_search(terms, limit):
+    # On PostgreSQL these LIKE '%...%' filters are served by the trigram GIN indexes
+    matches = PatientSearchIndex.objects.all()
+    for term in terms:
+        matches = matches.filter(_term_filter(*term))
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        words = ' '.join(word for identifier, term_words, digits in terms for word in term_words)
+        matches = matches.annotate(rank=TrigramSimilarity('name', words)).order_by('-rank')
+    else:
+        matches = matches.order_by('name')
+    return list(matches.values_list('patient_id', flat=True)[:limit])
+
+
+def _fuzzy_search(terms, exclude, limit):
+    """Patients whose name shares a 3-letter prefix with a query word, scored with rapidfuzz"""
+    words = [word for identifier, term_words, digits in terms for word in term_words if not word.isdigit()]
+    if not words:
+        return []
+
+    if _uses_fts():
+        expression = 'name : (' + ' OR '.join(_fts_quote(word[:3]) for word in words) + ')'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, name FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT %s",
+                [expression, FUZZY_CANDIDATES]
+            )
+            candidates = dict(cursor.fetchall())
+    else:
+        prefixes = Q()
+        for word in words:
+            prefixes |= Q(name__startswith=word[:3]) | Q(name__contains=f' {word[:3]}')
+        candidates = dict(
+            PatientSearchIndex.objects.filter(prefixes).values_list('patient_id', 'name')[:FUZZY_CANDIDATES]
+        )
+
+    for patient_id in exclude:
+        candidates.pop(patient_id, None)
+    scored = process.extract(
+        ' '.join(words), candidates, scorer=fuzz.WRatio, score_cutoff=FUZZY_MIN_SCORE, limit=limit
+    )
+    return [patient_id for name, score, patient_id in scored]
+
+
+def search_patient_ids(query, limit=SEARCH_MAX_RESULTS):
+    """Primary keys of the patients matching `query`, best match first"""
+    terms = _parse_query(query)
+    if not terms:
+        return []
+
+    ids = _fts_search(terms, limit) if _uses_fts() else _orm_search(terms, limit)
+    if len(ids) < FUZZY_FALLBACK_BELOW:
+        ids += _fuzzy_search(terms, set(ids), limit - len(ids))
+    return ids
+
+
+class PatientSearchFilter(BaseFilterBackend):
+    """
+    ?search= over the patient search index, ordered by relevance unless the
+    request asks for an explicit ?ordering=. Returns at most
+    SEARCH_MAX_RESULTS patients.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+
+        ids = search_patient_ids(query)
+        queryset = queryset.filter(pk__in=ids)
+        if not ids or api_settings.ORDERING_PARAM in request.query_params:
+            return queryset
+        return queryset.order_by(Case(
+            *[When(pk=patient_id, then=Value(position)) for position, patient_id in enumerate(ids)],
+            output_field=IntegerField()
+        ))
@@ -1,13 +1,20 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from django.db import transaction
+from django.db.models import Prefetch
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError as DjangoValidationError
 from datetime import datetime, timedelta
 import re
 from .models import (
     Patient, Visit, LabTest, Prescription, Medication, Appointment, MedicalRecord,
-    MedicalHistory, Allergy, PatientMedication, StaffProfile, Shift, PayrollEntry, PerformanceReview
+    MedicalHistory, Allergy, PatientMedication, StaffProfile, Shift, PayrollEntry, PerformanceReview,
+    IdentifierSequence
 )
+from .cards import normalize_card
+from .duplicates import find_duplicate_candidates
 
 User = get_user_model()
 
@@ -18,9 +25,66 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'first_name', 'last_name', 'email', 'role']
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets: ?fields=a,b keeps only those fields and ?omit=c,d drops
+    them. Only a serializer given the request in its context is narrowed,
+    so nested serializers always render in full, and only on reads, so a
+    write still validates every field. Unknown names are ignored, and a
+    ?fields= naming none of the fields keeps them all.
+
+    `related_fields` maps each field to the select_related lookups it reads
+    and `prefetch_fields` to its prefetch_related lookups; prepare() loads
+    only those of the fields the request keeps.
+    """
+    related_fields = {}
+    prefetch_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self._context.get('request')
+        if request is None:
+            return
+        kept = self.requested_fields(request, self.fields)
+        for name in set(self.fields) - kept:
+            self.fields.pop(name)
+
+    @staticmethod
+    def _names(request, param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    @classmethod
+    def requested_fields(cls, request, names):
+        """The subset of the field `names` the request asks for"""
+        names = set(names)
+        if request is None or request.method not in SAFE_METHODS:
+            return names
+        fields = cls._names(request, 'fields')
+        if fields and names & fields:
+            names &= fields
+        return names - (cls._names(request, 'omit') or set())
+
+    @classmethod
+    def prepare(cls, queryset, request=None):
+        """`queryset` with the joins and prefetches the requested fields need"""
+        kept = cls.requested_fields(request, cls.Meta.fields)
+        related = {lookup for name in kept for lookup in cls.related_fields.get(name, ())}
+        prefetch = [lookup for name in kept for lookup in cls.prefetch_fields.get(name, ())]
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class PatientSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     full_name = serializers.SerializerMethodField()
+
+    related_fields = {'user': ['user'], 'full_name': ['user']}
     
     class Meta:
         model = Patient
@@ -35,6 +99,24 @@ class PatientSerializer(serializers.ModelSerializer):
     def get_full_name(self, obj):
         return obj.user.get_full_name()
 
+    def validate_card_number(self, value):
+        # The unique validator sees the number as typed; it is stored uppercased
+        value = normalize_card(value) or None
+        taken = Patient.objects.filter(card_number=value).exclude(pk=getattr(self.instance, 'pk', None))
+        if value and taken.exists():
+            raise serializers.ValidationError('This card number is already assigned to another patient.')
+        return value
+
+    def update(self, instance, validated_data):
+        # Keep replaced card numbers so lost or reissued cards still resolve at reception
+        new_card = normalize_card(validated_data.get('card_number', instance.card_number)) or None
+        if instance.card_number and new_card != instance.card_number:
+            instance.card_number_history = [
+                *instance.card_number_history,
+                {'card_number': instance.card_number, 'replaced_at': timezone.now().isoformat()}
+            ]
+        return super().update(instance, validated_data)
+
 
 class PatientCreateSerializer(serializers.ModelSerializer):
     # User fields - make them optional and handle different input formats
@@ -64,13 +146,19 @@ class PatientCreateSerializer(serializers.ModelSerializer):
         allow_null=True
     )
 
+    # Refuse to register when the patient looks like an existing one (otherwise only reported)
+    reject_duplicates = serializers.BooleanField(required=False, default=False, write_only=True)
+
+    # Whether validate() looks for existing records of the same person
+    check_duplicates = True
+
     class Meta:
         model = Patient
         fields = [
             'first_name', 'last_name', 'name', 'email', 'username', 'age', 'gender', 'phone', 'address',
             'medical_history', 'allergies', 'current_medications', 'emergency_contact_name',
             'emergency_contact_phone', 'insurance_provider', 'insurance_policy_number', 'priority',
-            'card_number'
+            'card_number', 'reject_duplicates'
         ]
 
     def validate_email(self, value):
@@ -114,7 +202,8 @@ class PatientCreateSerializer(serializers.ModelSerializer):
     
     def validate_card_number(self, value):
         """Validate card number uniqueness"""
-        if value and value.strip():
+        value = normalize_card(value)
+        if value:
             # Check if card number already exists
             if Patient.objects.filter(card_number=value).exists():
                 # Get the conflicting patient's name
@@ -122,7 +211,7 @@ class PatientCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     f'This card number is already assigned to {conflicting_patient.user.get_full_name()}.'
                 )
-        return value if value and value.strip() else None
+        return value or None
 
     def validate(self, data):
         """Cross-field validation"""
@@ -141,9 +230,24 @@ class PatientCreateSerializer(serializers.ModelSerializer):
                 'insurance_policy_number': 'Insurance policy number is required when insurance provider is specified.'
             })
 
+        # Look for existing records of the same person
+        reject_duplicates = data.pop('reject_duplicates', False)
+        self.duplicate_candidates = []
+        if self.check_duplicates and (data.get('first_name') or data.get('last_name') or data.get('name')):
+            first_name, last_name = self.pop_names(dict(data))
+            self.duplicate_candidates = find_duplicate_candidates(
+                first_name, last_name, data.get('phone'), data.get('age')
+            )
+            if reject_duplicates and self.duplicate_candidates:
+                raise serializers.ValidationError({
+                    'duplicate_candidates': self.duplicate_candidates
+                })
+
         return data
     
-    def create(self, validated_data):
+    @staticmethod
+    def pop_names(validated_data):
+        """Pop the name fields from validated data and return (first_name, last_name)"""
         # Handle different name input formats
         first_name = validated_data.pop('first_name', '')
         last_name = validated_data.pop('last_name', '')
@@ -160,6 +264,10 @@ class PatientCreateSerializer(serializers.ModelSerializer):
             first_name = 'Patient'
         if not last_name:
             last_name = 'User'
+        return first_name, last_name
+
+    def create(self, validated_data):
+        first_name, last_name = self.pop_names(validated_data)
         
         # Generate email and username if not provided
         email = validated_data.pop('email', f"{first_name.lower()}.{last_name.lower()}@clinic.local")
@@ -181,15 +289,23 @@ class PatientCreateSerializer(serializers.ModelSerializer):
         return patient
     
     def to_representation(self, instance):
-        # Use the regular PatientSerializer for the response
-        return PatientSerializer(instance).data
+        # Use the regular PatientSerializer for the response, plus possible duplicates found on validation
+        data = PatientSerializer(instance).data
+        data['duplicate_candidates'] = getattr(self, 'duplicate_candidates', [])
+        return data
 
 
-class LabTestSerializer(serializers.ModelSerializer):
+class LabTestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     requested_by = UserSerializer(read_only=True)
     performed_by = UserSerializer(read_only=True)
     patient_name = serializers.SerializerMethodField()
 
+    related_fields = {
+        'requested_by': ['requested_by'],
+        'performed_by': ['performed_by'],
+        'patient_name': ['visit__patient__user'],
+    }
+
     class Meta:
         model = LabTest
         fields = [
@@ -273,12 +389,26 @@ class PrescriptionSerializer(serializers.ModelSerializer):
         return obj.visit.patient.user.get_full_name()
 
 
-class VisitSerializer(serializers.ModelSerializer):
+class VisitSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     patient = PatientSerializer(read_only=True)
     attending_doctor = UserSerializer(read_only=True)
     triage_completed_by = UserSerializer(read_only=True)
     lab_tests = LabTestSerializer(many=True, read_only=True)
     prescription = PrescriptionSerializer(read_only=True)
+
+    # Nested lab tests and prescriptions name the patient through their visit
+    related_fields = {
+        'patient': ['patient__user'],
+        'attending_doctor': ['attending_doctor'],
+        'triage_completed_by': ['triage_completed_by'],
+        'lab_tests': ['patient__user'],
+        'prescription': ['prescription__prescribed_by', 'patient__user'],
+    }
+    prefetch_fields = {
+        'lab_tests': [
+            Prefetch('lab_tests', queryset=LabTest.objects.select_related('requested_by', 'performed_by'))
+        ],
+    }
     
     class Meta:
         model = Visit
@@ -322,11 +452,17 @@ class MedicationSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     patient_detail = PatientSerializer(source='patient', read_only=True)
     doctor_detail = UserSerializer(source='doctor', read_only=True)
     booked_by = UserSerializer(read_only=True)
 
+    related_fields = {
+        'patient_detail': ['patient__user'],
+        'doctor_detail': ['doctor'],
+        'booked_by': ['booked_by'],
+    }
+
     # Add writable fields for patient and doctor IDs
     patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
     doctor = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(role='doctor'))
@@ -425,6 +561,7 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
 # Simplified serializers for queue management
 class QueuePatientSerializer(serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
+    visitId = serializers.IntegerField(source='id')
     name = serializers.SerializerMethodField()
     stage = serializers.CharField()
     checkInTime = serializers.DateTimeField(source='check_in_time')
@@ -449,7 +586,7 @@ class QueuePatientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Visit
         fields = [
-            'id', 'name', 'stage', 'checkInTime', 'email', 'phone', 'address', 'age', 'sex',
+            'id', 'visitId', 'name', 'stage', 'checkInTime', 'email', 'phone', 'address', 'age', 'sex',
             'priority', 'vitalSigns', 'triageNotes', 'questioningFindings', 'labFindings',
             'requestedLabTests', 'labResults', 'diagnosis', 'prescription', 'finalFindings'
         ]
@@ -483,8 +620,10 @@ class QueuePatientSerializer(serializers.ModelSerializer):
     
     def get_labResults(self, obj):
         results = []
-        for test in obj.lab_tests.filter(status='completed'):
-            results.append(f"{test.test_name}: {test.results}")
+        # Filter in Python so a prefetch_related('lab_tests') is reused
+        for test in obj.lab_tests.all():
+            if test.status == 'completed':
+                results.append(f"{test.test_name}: {test.results}")
         return "\n".join(results) if results else None
     
     def get_diagnosis(self, obj):
@@ -533,6 +672,11 @@ class StaffProfileSerializer(serializers.ModelSerializer):
         model = StaffProfile
         fields = '__all__'
         read_only_fields = ['created_at']
+
+    @staticmethod
+    def prepare(queryset):
+        """`queryset` with the user and supervisor joins the serializer reads"""
+        return queryset.select_related('user', 'supervisor__user')
     
     def get_supervisor(self, obj):
         if obj.supervisor:
@@ -616,29 +760,25 @@ class StaffCreateSerializer(serializers.ModelSerializer):
         role = validated_data.pop('role')
         username = validated_data.pop('username', f"{first_name.lower()}.{last_name.lower()}")
         
-        # Create user
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            first_name=first_name,
-            last_name=last_name,
-            role=role
-        )
+        with transaction.atomic():
+            # Create user
+            user = User.objects.create_user(
+                username=username,
+                email=email,
+                first_name=first_name,
+                last_name=last_name,
+                role=role
+            )
         
-        # Generate employee ID
-        last_staff = StaffProfile.objects.order_by('-id').first()
-        if last_staff:
-            last_id = int(last_staff.employee_id.split('-')[1])
-            employee_id = f"EMP-{str(last_id + 1).zfill(3)}"
-        else:
-            employee_id = "EMP-001"
+            # Generate employee ID
+            employee_id = IdentifierSequence.next_identifier('employee')
         
-        # Create staff profile
-        staff = StaffProfile.objects.create(
-            user=user,
-            employee_id=employee_id,
-            **validated_data
-        )
+            # Create staff profile
+            staff = StaffProfile.objects.create(
+                user=user,
+                employee_id=employee_id,
+                **validated_data
+            )
         return staff
     
     def to_representation(self, instance):
@@ -674,4 +814,4 @@ class PerformanceReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = PerformanceReview
         fields = '__all__'
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at']
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import QUEUE_COUNTER, DASHBOARD_COUNTER, bump_counter_on_commit
+from .models import Patient, Visit, LabTest, Prescription, Appointment, VisitStageEvent, VisitTombstone
+from .queue import QUEUE_TOMBSTONE_RETENTION
+from .throughput import record_stage_events
+from .search import index_patients
+from .cards import card_cache
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Visit)
+@receiver(post_delete, sender=Visit)
+@receiver(post_save, sender=LabTest)
+@receiver(post_delete, sender=LabTest)
+@receiver(post_save, sender=Prescription)
+@receiver(post_delete, sender=Prescription)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_queue_snapshot(sender, **kwargs):
+    bump_counter_on_commit(QUEUE_COUNTER)
+
+
+@receiver(post_save, sender=User)
+def invalidate_queue_snapshot_for_patient_user(sender, instance, **kwargs):
+    # Queue entries show the patient's name and email from the user row
+    if instance.role == 'patient':
+        bump_counter_on_commit(QUEUE_COUNTER)
+
+
+@receiver(post_save, sender=Visit)
+@receiver(post_delete, sender=Visit)
+@receiver(post_save, sender=LabTest)
+@receiver(post_delete, sender=LabTest)
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=Prescription)
+@receiver(post_delete, sender=Prescription)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_role_dashboards(sender, **kwargs):
+    bump_counter_on_commit(DASHBOARD_COUNTER)
+
+
+@receiver(post_save, sender=Visit)
+def log_check_in(sender, instance, created, **kwargs):
+    # Check-in opens the visit's stage event log (later moves are logged by the transition code)
+    if created:
+        record_stage_events([
+            VisitStageEvent(visit=instance, to_stage=instance.stage, occurred_at=instance.check_in_time)
+        ])
+
+
+@receiver(post_save, sender=Patient)
+def index_patient(sender, instance, **kwargs):
+    index_patients([instance])
+
+
+@receiver(post_save, sender=User)
+def index_patient_user(sender, instance, **kwargs):
+    # The search index holds the patient's name from the user row
+    if instance.role == 'patient' and hasattr(instance, 'patient_profile'):
+        index_patients([instance.patient_profile])
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_card_lookup(sender, instance, **kwargs):
+    # Covers card_number and card_number_history changes too
+    card_cache.invalidate(instance.pk, instance.card_number)
+
+
+@receiver(post_save, sender=User)
+def invalidate_card_lookup_for_patient_user(sender, instance, **kwargs):
+    # Card lookups show the patient's name from the user row
+    if instance.role == 'patient' and hasattr(instance, 'patient_profile'):
+        card_cache.invalidate(instance.patient_profile.pk)
+
+
+@receiver(post_delete, sender=Visit)
+def record_visit_deletion(sender, instance, **kwargs):
+    # Queue deltas list these as removed; older cursors are refused, so old tombstones can go
+    VisitTombstone.objects.filter(deleted_at__lt=timezone.now() - QUEUE_TOMBSTONE_RETENTION).delete()
+    VisitTombstone.objects.create(visit_id=instance.pk)
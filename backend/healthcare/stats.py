@@ -0,0 +1,466 @@
+"""
+Dashboard statistics.
+
+Every dashboard is computed in one or two queries. The counts of each table
+are conditional aggregates (Count(filter=Q(...))) over a queryset whose
+WHERE clause narrows the rows, and the per-table aggregates are cross-joined
+into a single SELECT by fetch_aggregates(). Only breakdowns over free-text
+values (departments) need a second, grouped query.
+
+"Today" and "this month" are datetime ranges rather than __date lookups,
+which wrap the column in a function and so cannot use its index.
+
+Month-to-date figures add live counts to the DailyClinicStats rollups of
+earlier days (see rollups.py). Days without a rollup row, such as those
+since the rollup last ran, are counted live too.
+
+Results are cached for STATS_CACHE_TIMEOUT seconds per dashboard.
+"""
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Exists, F, OuterRef, Sum, Q, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Patient, Visit, LabTest, Prescription, Medication, Appointment, StaffProfile, Shift, PayrollEntry,
+    DailyClinicStats
+)
+from .serializers import PatientSerializer, VisitSerializer, StaffProfileSerializer
+
+User = get_user_model()
+
+STATS_CACHE_TIMEOUT = 30
+RECENT_ACTIVITY_LIMIT = 5
+
+# Stages the dashboards count as active visits; triage is left out, as it always has been there
+DASHBOARD_ACTIVE_STAGES = ['waiting_room', 'questioning', 'laboratory_test', 'results_by_doctor']
+DOCTOR_ACTIVE_STAGES = ['questioning', 'laboratory_test', 'results_by_doctor']
+PENDING_LAB_STATUSES = ['requested', 'in_progress']
+
+
+def day_range(day=None):
+    """[start, end) of a local calendar day"""
+    start = timezone.make_aware(datetime.combine(day or timezone.localdate(), time.min))
+    return start, start + timedelta(days=1)
+
+
+def month_start():
+    return timezone.make_aware(datetime.combine(timezone.localdate().replace(day=1), time.min))
+
+
+def aggregates(queryset, **expressions):
+    """
+    Unevaluated single-row aggregate of `queryset` (aggregate() runs at once,
+    so it cannot be combined with others). Grouping by a constant leaves no
+    GROUP BY, so a row comes back even when nothing matches.
+    """
+    return (
+        queryset.order_by()
+        .annotate(_row=Value(1)).values('_row')
+        .annotate(**expressions).values(*expressions)
+    )
+
+
+def fetch_aggregates(**querysets):
+    """
+    Evaluate several aggregates() querysets in one query and return
+    {name: {expression name: value}}.
+    """
+    columns, sources, params, converters = [], [], [], []
+    for index, (name, queryset) in enumerate(querysets.items()):
+        compiler = queryset.query.get_compiler(connection=connection)
+        sql, query_params = compiler.as_sql()
+        sources.append(f'({sql}) AS part{index}')
+        params.extend(query_params)
+        for expression, expression_sql, alias in compiler.select:
+            columns.append(f'part{index}.{connection.ops.quote_name(alias)}')
+            field_converters = compiler.get_converters([expression])
+            converters.append((name, alias, expression, field_converters.get(0, ([], None))[0]))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {' CROSS JOIN '.join(sources)}", params)
+        row = cursor.fetchone()
+
+    results = {name: {} for name in querysets}
+    for (name, alias, expression, field_converters), value in zip(converters, row):
+        for converter in field_converters:
+            value = converter(value, expression, connection)
+        results[name][alias] = value
+    return results
+
+
+def rollup_sums(start_day, end_day, **columns):
+    """aggregates() of DailyClinicStats columns over [start_day, end_day); `columns` maps result names to columns"""
+    return aggregates(
+        DailyClinicStats.objects.filter(day__gte=start_day, day__lt=end_day),
+        **{name: Sum(column, default=0) for name, column in columns.items()}
+    )
+
+
+def cached_stats(name, build, key=''):
+    """`build()`, cached briefly per dashboard (and per `key`, e.g. a user id)"""
+    return cache.get_or_set(f'healthcare:stats:{name}:{key}', build, STATS_CACHE_TIMEOUT)
+
+
+def _nonzero(counts):
+    return {value: count for value, count in counts.items() if count}
+
+
+def _choice_counts(field, choices):
+    return {value: Count('pk', filter=Q(**{field: value})) for value, label in choices}
+
+
+def visit_dashboard_stats():
+    """Counts for the clinic queue dashboard (VisitViewSet.dashboard_stats)"""
+    today_start, today_end = day_range()
+    row = fetch_aggregates(
+        patients=aggregates(Patient.objects.all(), total=Count('pk')),
+        visits=aggregates(
+            Visit.objects.all(),
+            active=Count('pk', filter=Q(stage__in=DASHBOARD_ACTIVE_STAGES)),
+            completed_today=Count('pk', filter=Q(
+                stage='discharged', discharge_time__gte=today_start, discharge_time__lt=today_end
+            )),
+            **_choice_counts('stage', Visit.STAGE_CHOICES)
+        ),
+        lab_tests=aggregates(LabTest.objects.filter(status='requested'), pending=Count('pk')),
+    )
+    visits = row['visits']
+    return {
+        'total_patients': row['patients']['total'],
+        'active_visits': visits.pop('active'),
+        'completed_visits_today': visits.pop('completed_today'),
+        'pending_lab_tests': row['lab_tests']['pending'],
+        'visits_by_stage': _nonzero(visits),
+    }
+
+
+def _department_counts(queryset):
+    return dict(queryset.order_by().values('department').annotate(count=Count('pk')).values_list('department', 'count'))
+
+
+def _not_rolled_up(queryset, day, today):
+    """`queryset` without the rows of earlier days that have a rollup row; `day` is the row's local day"""
+    return queryset.annotate(_day=day).exclude(
+        Exists(DailyClinicStats.objects.filter(day=OuterRef('_day'), day__lt=today))
+    )
+
+
+def _month_to_date_parts(today_start):
+    """
+    fetch_aggregates() parts for month-to-date new patients, payroll and
+    completed shifts: earlier days from their rollups, and today, later-dated
+    payroll periods and days not rolled up yet live. Read the result with
+    _month_to_date().
+    """
+    today = today_start.date()
+    first_day = today.replace(day=1)
+    first_day_start = timezone.make_aware(datetime.combine(first_day, time.min))
+    return {
+        'rollups': rollup_sums(
+            first_day, today, new_patients='new_patients', payroll='payroll', shifts_completed='shifts_completed'
+        ),
+        'patients_live': aggregates(
+            _not_rolled_up(Patient.objects.filter(created_at__gte=first_day_start), TruncDate('created_at'), today),
+            total=Count('pk')
+        ),
+        'payroll_live': aggregates(
+            _not_rolled_up(
+                PayrollEntry.objects.filter(pay_period_start__gte=first_day), F('pay_period_start'), today
+            ),
+            total=Sum('net_pay', default=0)
+        ),
+        'shifts_live': aggregates(
+            _not_rolled_up(
+                Shift.objects.filter(start_time__gte=first_day_start, status='completed'),
+                TruncDate('start_time'), today
+            ),
+            total=Count('pk')
+        ),
+    }
+
+
+def _month_to_date(row):
+    rollups = row['rollups']
+    return {
+        'new_patients': rollups['new_patients'] + row['patients_live']['total'],
+        'payroll': rollups['payroll'] + row['payroll_live']['total'],
+        'shifts_completed': rollups['shifts_completed'] + row['shifts_live']['total'],
+    }
+
+
+def overview_stats():
+    """Counts for the admin overview (AdminDashboardViewSet.overview_stats), without recent activity"""
+    today_start, today_end = day_range()
+    row = fetch_aggregates(
+        patients=aggregates(Patient.objects.all(), total=Count('pk')),
+        visits=aggregates(
+            Visit.objects.filter(
+                Q(stage__in=DASHBOARD_ACTIVE_STAGES) | Q(discharge_time__gte=today_start, discharge_time__lt=today_end)
+            ),
+            active=Count('pk', filter=Q(stage__in=DASHBOARD_ACTIVE_STAGES)),
+            completed_today=Count('pk', filter=Q(stage='discharged')),
+        ),
+        staff=aggregates(
+            StaffProfile.objects.all(),
+            total=Count('pk'),
+            active=Count('pk', filter=Q(employment_status='active')),
+        ),
+        shifts=aggregates(
+            Shift.objects.filter(start_time__gte=today_start, start_time__lt=today_end),
+            on_duty_today=Count('pk', filter=Q(status__in=['scheduled', 'in_progress'])),
+        ),
+        lab_tests=aggregates(LabTest.objects.filter(status='requested'), pending=Count('pk')),
+        prescriptions=aggregates(
+            Prescription.objects.filter(created_at__gte=today_start, created_at__lt=today_end), today=Count('pk')
+        ),
+        appointments=aggregates(
+            Appointment.objects.filter(appointment_date__gte=today_start, appointment_date__lt=today_end),
+            today=Count('pk')
+        ),
+        medications=aggregates(Medication.objects.filter(is_active=True), active=Count('pk')),
+        **_month_to_date_parts(today_start),
+    )
+    month_to_date = _month_to_date(row)
+    return {
+        'patients': {
+            'total': row['patients']['total'],
+            'new_this_month': month_to_date['new_patients'],
+            'active_visits': row['visits']['active'],
+            'completed_today': row['visits']['completed_today'],
+        },
+        'staff': {
+            'total': row['staff']['total'],
+            'active': row['staff']['active'],
+            'on_duty_today': row['shifts']['on_duty_today'],
+            'departments': _department_counts(StaffProfile.objects.all()),
+        },
+        'medical': {
+            'pending_lab_tests': row['lab_tests']['pending'],
+            'prescriptions_today': row['prescriptions']['today'],
+            'appointments_today': row['appointments']['today'],
+            'medication_inventory': row['medications']['active'],
+        },
+        'financial': {
+            'monthly_payroll': month_to_date['payroll'],
+            'staff_hours_this_month': month_to_date['shifts_completed'],
+        },
+    }
+
+
+def report_stats(report_type):
+    """Counts for admin_reports; `report_type` is one of its ?type= values"""
+    today_start, today_end = day_range()
+    this_month = month_start()
+
+    if report_type == 'patient_summary':
+        patients = fetch_aggregates(patients=aggregates(
+            Patient.objects.all(),
+            total=Count('pk'),
+            gender_unknown=Count('pk', filter=Q(gender__isnull=True)),
+            **{f'priority_{value}': count for value, count in _choice_counts('priority', Patient.PRIORITY_CHOICES).items()},
+            **{f'gender_{value}': count for value, count in _choice_counts('gender', Patient.GENDER_CHOICES).items()}
+        ))['patients']
+        by_gender = {value: patients[f'gender_{value}'] for value, label in Patient.GENDER_CHOICES}
+        by_gender[None] = patients['gender_unknown']
+        return {
+            'total_patients': patients['total'],
+            'patients_by_priority': _nonzero({
+                value: patients[f'priority_{value}'] for value, label in Patient.PRIORITY_CHOICES
+            }),
+            'patients_by_gender': _nonzero(by_gender),
+        }
+
+    if report_type == 'staff_summary':
+        staff = fetch_aggregates(staff=aggregates(
+            StaffProfile.objects.all(),
+            total=Count('pk'),
+            **_choice_counts('employment_status', StaffProfile.EMPLOYMENT_STATUS)
+        ))['staff']
+        return {
+            'total_staff': staff.pop('total'),
+            'staff_by_department': _department_counts(StaffProfile.objects.all()),
+            'staff_by_status': _nonzero(staff),
+        }
+
+    if report_type == 'financial_summary':
+        this_months_payroll = PayrollEntry.objects.filter(pay_period_start__gte=this_month.date())
+        month_to_date = _month_to_date(fetch_aggregates(**_month_to_date_parts(today_start)))
+        return {
+            'monthly_payroll': month_to_date['payroll'],
+            'total_staff_hours': month_to_date['shifts_completed'],
+            'payroll_by_department': dict(
+                this_months_payroll.order_by().values('staff__department')
+                .annotate(total=Sum('net_pay')).values_list('staff__department', 'total')
+            ),
+        }
+
+    row = fetch_aggregates(
+        patients=aggregates(Patient.objects.all(), total=Count('pk')),
+        staff=aggregates(StaffProfile.objects.all(), total=Count('pk')),
+        visits=aggregates(Visit.objects.filter(stage__in=DASHBOARD_ACTIVE_STAGES), active=Count('pk')),
+        appointments=aggregates(
+            Appointment.objects.filter(appointment_date__gte=today_start, appointment_date__lt=today_end),
+            today=Count('pk')
+        ),
+        lab_tests=aggregates(LabTest.objects.filter(status='requested'), pending=Count('pk')),
+        prescriptions=aggregates(
+            Prescription.objects.filter(created_at__gte=today_start, created_at__lt=today_end), today=Count('pk')
+        ),
+    )
+    return {
+        'patients': row['patients']['total'],
+        'staff': row['staff']['total'],
+        'active_visits': row['visits']['active'],
+        'appointments_today': row['appointments']['today'],
+        'pending_lab_tests': row['lab_tests']['pending'],
+        'prescriptions_today': row['prescriptions']['today'],
+    }
+
+
+def role_dashboard_key(user):
+    """
+    Cache key of a user's role dashboard: doctors and patients see their own
+    numbers, every other role shares one dashboard.
+    """
+    if user.is_patient or user.is_doctor:
+        return f'{user.role}:{user.pk}'
+    return f'{user.role}:{int(user.is_staff)}'
+
+
+def role_dashboard_stats(user):
+    """Counts for the signed-in user's role dashboard, or None for a role without one"""
+    today = timezone.localdate()
+    today_start, today_end = day_range(today)
+    todays_appointments = Appointment.objects.filter(
+        appointment_date__gte=today_start, appointment_date__lt=today_end
+    )
+
+    if user.is_patient:
+        row = fetch_aggregates(
+            profile=aggregates(Patient.objects.filter(user=user), found=Count('pk')),
+            appointments=aggregates(
+                Appointment.objects.filter(
+                    patient__user=user, appointment_date__gte=today_start, status__in=['scheduled', 'confirmed']
+                ),
+                upcoming=Count('pk')
+            ),
+            lab_tests=aggregates(
+                LabTest.objects.filter(visit__patient__user=user, status__in=PENDING_LAB_STATUSES), pending=Count('pk')
+            ),
+            prescriptions=aggregates(
+                Prescription.objects.filter(visit__patient__user=user, is_dispensed=False, valid_until__gte=today),
+                active=Count('pk')
+            ),
+        )
+        stats = {
+            'role': 'patient',
+            'upcoming_appointments': row['appointments']['upcoming'],
+            'pending_lab_results': row['lab_tests']['pending'],
+            'active_prescriptions': row['prescriptions']['active'],
+        }
+        if not row['profile']['found']:
+            stats['error'] = 'Patient profile not found'
+        return stats
+
+    if user.is_reception:
+        row = fetch_aggregates(
+            users=aggregates(User.objects.filter(role='patient'), patients=Count('pk')),
+            appointments=aggregates(todays_appointments, today=Count('pk')),
+            # Patients registered in the last 7 days without visits
+            registrations=aggregates(
+                Patient.objects.filter(created_at__gte=today_start - timedelta(days=7), visits__isnull=True),
+                pending=Count('pk')
+            ),
+        )
+        return {
+            'role': 'reception',
+            'total_patients': row['users']['patients'],
+            'todays_appointments': row['appointments']['today'],
+            'pending_registrations': row['registrations']['pending'],
+        }
+
+    if user.is_doctor:
+        row = fetch_aggregates(
+            appointments=aggregates(todays_appointments.filter(doctor=user), today=Count('pk')),
+            visits=aggregates(
+                Visit.objects.filter(attending_doctor=user, stage__in=DOCTOR_ACTIVE_STAGES),
+                pending=Count('pk'),
+                patients=Count('patient', distinct=True),
+            ),
+        )
+        return {
+            'role': 'doctor',
+            'todays_appointments': row['appointments']['today'],
+            'pending_consultations': row['visits']['pending'],
+            'patients_under_care': row['visits']['patients'],
+        }
+
+    if user.is_laboratory:
+        row = fetch_aggregates(
+            pending=aggregates(
+                LabTest.objects.filter(status__in=PENDING_LAB_STATUSES),
+                total=Count('pk'),
+                urgent=Count('pk', filter=Q(visit__patient__priority='urgent')),
+            ),
+            completed=aggregates(
+                LabTest.objects.filter(status='completed', completed_at__gte=today_start, completed_at__lt=today_end),
+                today=Count('pk')
+            ),
+        )
+        return {
+            'role': 'laboratory',
+            'pending_tests': row['pending']['total'],
+            'completed_today': row['completed']['today'],
+            'urgent_tests': row['pending']['urgent'],
+        }
+
+    if user.is_staff or user.role == 'admin':
+        row = fetch_aggregates(
+            patients=aggregates(Patient.objects.all(), total=Count('pk')),
+            users=aggregates(
+                User.objects.filter(role__in=['reception', 'doctor', 'laboratory', 'staff']), staff=Count('pk')
+            ),
+            appointments=aggregates(todays_appointments, today=Count('pk')),
+            visits=aggregates(Visit.objects.exclude(stage='discharged'), active=Count('pk')),
+            lab_tests=aggregates(LabTest.objects.filter(status__in=PENDING_LAB_STATUSES), pending=Count('pk')),
+        )
+        return {
+            'role': user.role,
+            'total_patients': row['patients']['total'],
+            'total_staff': row['users']['staff'],
+            'todays_appointments': row['appointments']['today'],
+            'active_visits': row['visits']['active'],
+            'pending_lab_tests': row['lab_tests']['pending'],
+        }
+
+    return None
+
+
+def recent_patients(limit=RECENT_ACTIVITY_LIMIT):
+    patients = PatientSerializer.prepare(Patient.objects.order_by('-created_at'))[:limit]
+    return PatientSerializer(patients, many=True).data
+
+
+def recent_visits(limit=RECENT_ACTIVITY_LIMIT):
+    visits = VisitSerializer.prepare(Visit.objects.order_by('-check_in_time'))[:limit]
+    return VisitSerializer(visits, many=True).data
+
+
+def recent_staff(limit=RECENT_ACTIVITY_LIMIT, hired_since=None):
+    staff = StaffProfile.objects.order_by('-hire_date')
+    if hired_since:
+        staff = staff.filter(hire_date__gte=hired_since)
+    return StaffProfileSerializer(StaffProfileSerializer.prepare(staff)[:limit], many=True).data
+
+
+# Widget builders and the number of queries each is pinned to (checked in tests.py)
+RECENT_ACTIVITY_WIDGETS = {
+    'new_patients': (recent_patients, 1),
+    'recent_visits': (recent_visits, 2),  # The visits, then their lab tests
+    'recent_staff': (recent_staff, 1),
+}
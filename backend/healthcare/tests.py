@@ -1,3 +1,893 @@
+from contextlib import ExitStack
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db.models import Count, Sum
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .benchmarks import seed_visits
+from .caching import DASHBOARD_COUNTER, QUEUE_COUNTER, counter_value
+from .cards import card_cache, lookup_card
+from .duplicates import DUPLICATE_MIN_SCORE
+from .events import QueueEventBus, queue_events, stream_queue_events
+from .importers import PatientImporter
+from .models import (
+    Appointment, DailyClinicStats, IdentifierSequence, LabTest, Medication, Patient, PayrollEntry, Prescription,
+    Shift, StaffProfile, StageHourlyStats, StageServiceTime, Visit, VisitStageEvent
+)
+from .projections import QUEUE_ROWS_QUERIES, queue_rows
+from .queue import (
+    QUEUE_TOMBSTONE_RETENTION, ROLE_QUEUE_FIELDS, ROLE_QUEUE_STAGES, claim_next_visit, decode_cursor, encode_cursor
+)
+from .renderers import FastJSONRenderer, orjson
+from .rollups import changed_days, daily_report, run_rollup
+from .search import normalize_identifier, search_patient_ids
+from .serializers import PatientSerializer, QueuePatientSerializer, StaffProfileSerializer, VisitSerializer
+from .stats import (
+    DASHBOARD_ACTIVE_STAGES, DOCTOR_ACTIVE_STAGES, RECENT_ACTIVITY_WIDGETS, day_range, overview_stats, report_stats,
+    role_dashboard_key, role_dashboard_stats, visit_dashboard_stats
+)
+from .throughput import SERVICE_TIME_ALPHA, record_stage_events, stage_event
+from .urls import router
+from .worklist import OPEN_LAB_STATUSES, open_lab_tests, worklist_rows
+
+User = get_user_model()
+
+
+def staff_client(role='reception', username='staff'):
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(username=username, password='x', role=role))
+    return client
+
+
+def make_patient(i, priority='standard'):
+    user = User.objects.create_user(username=f'patient{i}', password='x', role='patient', first_name=f'Pat{i}')
+    return Patient.objects.create(user=user, phone=f'09110000{i:02d}', age=30, gender='male', priority=priority)
+
+
+class QueueCursorTests(TestCase):
+    def test_out_of_range_cursors_are_invalid(self):
+        for cursor in ['1' + '0' * 400, '-' + '9' * 30, 'abc']:
+            with self.assertRaisesMessage(ValueError, 'Invalid queue cursor'):
+                decode_cursor(cursor)
+
+    def test_initial_cursor_is_none(self):
+        self.assertIsNone(decode_cursor('0'))
+
+
+class QueueDeltaTests(TestCase):
+    def setUp(self):
+        self.client = staff_client()
+        self.visit = Visit.objects.create(patient=make_patient(1), stage='waiting_room')
+        self.cursor = self.client.get('/api/healthcare/visits/queue/')['X-Queue-Cursor']
+
+    def test_deleted_visits_are_removed(self):
+        visit_id = self.visit.pk
+        self.visit.delete()
+        response = self.client.get(f'/api/healthcare/visits/queue/?since={self.cursor}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['removed'], [visit_id])
+        self.assertEqual(response.json()['changed'], [])
+
+    def test_cursors_older_than_the_tombstones_are_refused(self):
+        expired = encode_cursor(timezone.now() - QUEUE_TOMBSTONE_RETENTION - timedelta(minutes=1))
+        response = self.client.get(f'/api/healthcare/visits/queue/?since={expired}')
+        self.assertEqual(response.status_code, 400)
+
+
+class QueueListenerLimitTests(TestCase):
+    def setUp(self):
+        self.client = staff_client()
+
+    def test_listener_slots_are_bounded(self):
+        bus = QueueEventBus(max_listeners=1)
+        with bus.listener() as first:
+            with bus.listener() as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+        with bus.listener() as again:
+            self.assertTrue(again)
+
+    def test_long_poll_rejects_non_finite_timeouts(self):
+        for timeout in ['nan', 'inf', '-1']:
+            response = self.client.get(f'/api/healthcare/visits/events/?timeout={timeout}')
+            self.assertEqual(response.status_code, 400, timeout)
+
+    def test_listeners_are_turned_away_when_every_slot_is_taken(self):
+        with ExitStack() as slots:
+            while slots.enter_context(queue_events.listener()):
+                pass
+            response = self.client.get('/api/healthcare/visits/events/?timeout=0')
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response)
+            self.assertIn('event: busy', next(stream_queue_events(0)))
+
+
+class AllPatientsPageTests(TestCase):
+    def setUp(self):
+        self.client = staff_client()
+
+    def test_limit_below_one_is_rejected(self):
+        for limit in ['0', '-3', 'abc']:
+            response = self.client.get(f'/api/healthcare/visits/all_patients/?limit={limit}')
+            self.assertEqual(response.status_code, 400, limit)
+
+    def test_limit_pages(self):
+        response = self.client.get('/api/healthcare/visits/all_patients/?limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'results': [], 'next': None})
+
+
+class ClaimNextVisitTests(TestCase):
+    def setUp(self):
+        self.first, self.second = (
+            User.objects.create_user(username=f'doctor{i}', password='x', role='doctor') for i in range(2)
+        )
+        self.visit = Visit.objects.create(patient=make_patient(0), stage='questioning')
+
+    def test_claims_the_visit_once(self):
+        self.assertEqual(claim_next_visit(self.first), self.visit)
+        self.assertIsNone(claim_next_visit(self.second))
+        self.visit.refresh_from_db()
+        self.assertEqual(self.visit.attending_doctor, self.first)
+
+    def test_losing_the_race_does_not_overwrite_the_claim(self):
+        claim_next_visit(self.first)
+        # Another doctor picked the same candidate before the first claim landed
+        with mock.patch('healthcare.queue._next_unclaimed', side_effect=[self.visit.pk, None]):
+            self.assertIsNone(claim_next_visit(self.second))
+        self.visit.refresh_from_db()
+        self.assertEqual(self.visit.attending_doctor, self.first)
+
+
+class PatientImportCardTests(TestCase):
+    def row(self, i, card_number=''):
+        return {'first_name': f'Imp{i}', 'last_name': 'Orted', 'phone': f'09220000{i:02d}', 'age': 40,
+                'gender': 'female', 'card_number': card_number}
+
+    def test_generated_cards_skip_explicit_and_earlier_cards(self):
+        # An earlier import stored C-00003 before the sequence tracked explicit cards
+        Patient.objects.filter(pk=make_patient(0).pk).update(card_number='C-00003')
+        IdentifierSequence.objects.filter(name='card').update(last_value=1)
+
+        report = PatientImporter().run([self.row(1, 'C-00002'), self.row(2), self.row(3)])
+
+        self.assertEqual(report['failed'], 0, report['errors'])
+        cards = list(Patient.objects.filter(user__last_name='Orted').values_list('card_number', flat=True))
+        self.assertCountEqual(cards, ['C-00002', 'C-00004', 'C-00005'])
+        self.assertEqual(make_patient(9).card_number, 'C-00006')
+
+    def test_explicit_card_moves_the_sequence_past_it(self):
+        PatientImporter().run([self.row(1, 'C-00500')])
+        self.assertEqual(make_patient(9).card_number, 'C-00501')
+
+
+class IdentifierSequenceTests(TestCase):
+    def make_staff(self, employee_id):
+        user = User.objects.create_user(username=employee_id, password='x', role='reception')
+        return StaffProfile.objects.create(
+            user=user, employee_id=employee_id, hire_date=timezone.localdate(), hourly_rate=25, department='Front'
+        )
+
+    def test_reserve_returns_consecutive_blocks(self):
+        self.assertEqual(IdentifierSequence.reserve('prescription', 5), range(1, 6))
+        self.assertEqual(IdentifierSequence.reserve('prescription', 3), range(6, 9))
+        self.assertEqual(IdentifierSequence.next_identifiers('prescription', 2), ['RX-009', 'RX-010'])
+
+    def test_first_use_continues_from_the_highest_number_issued(self):
+        # Compared as numbers: a string max() would pick EMP-999 over EMP-1002
+        for employee_id in ['EMP-050', 'EMP-999', 'EMP-1002', 'TEMP-5000']:
+            self.make_staff(employee_id)
+        self.assertFalse(IdentifierSequence.objects.filter(name='employee').exists())
+
+        self.assertEqual(IdentifierSequence.next_identifier('employee'), 'EMP-1003')
+        self.assertEqual(IdentifierSequence.next_identifier('employee', width=4), 'EMP-1004')
+
+    def test_advance_past_skips_imported_identifiers_but_never_goes_back(self):
+        IdentifierSequence.reserve('card', 10)
+        IdentifierSequence.advance_past('card', ['C-00500', 'C-00020', 'legacy-9999'])
+        self.assertEqual(IdentifierSequence.next_identifier('card'), 'C-00501')
+
+        IdentifierSequence.advance_past('card', ['C-00100'])
+        self.assertEqual(IdentifierSequence.next_identifier('card'), 'C-00502')
+
+    def test_failed_patient_insert_gives_its_numbers_back(self):
+        existing = make_patient(0)
+        failed = Patient(user=existing.user, phone='0911999999', age=30, gender='male')
+        with self.assertRaises(IntegrityError):
+            failed.save()
+        self.assertEqual(failed.patient_id, 'P-002')
+
+        self.assertEqual(make_patient(1).patient_id, 'P-002')
+        self.assertEqual(IdentifierSequence.objects.get(name='patient').last_value, 2)
+
+    def test_failed_onboarding_keeps_neither_the_user_nor_the_number(self):
+        data = {'email': 'new@clinic.test', 'first_name': 'New', 'last_name': 'Hire', 'role': 'reception',
+                'department': 'Front'}
+        response = APIClient().post('/api/healthcare/staff/onboard/', {**data, 'hourly_rate': 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username='new@clinic.test').exists())
+
+        response = APIClient().post('/api/healthcare/staff/onboard/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['employee_id'], 'EMP-001')
+
+
+class SearchNormalizationTests(TestCase):
+    def test_identifiers_keep_letters_of_any_script(self):
+        self.assertEqual(normalize_identifier('c-00001'), 'C00001')
+        self.assertEqual(normalize_identifier('አበበ'), 'አበበ')
+
+
+class PatientSearchTests(TestCase):
+    # The test database is built by running the migrations, so this covers the SQLite FTS triggers too
+    def test_migrated_index_finds_patients(self):
+        latin, amharic = make_patient(1), make_patient(2)
+        for patient, first_name in [(latin, 'Abebe'), (amharic, 'አበበ')]:
+            patient.user.first_name = first_name
+            patient.user.save()
+            patient.save()
+
+        self.assertEqual(search_patient_ids('abebe'), [latin.pk])
+        self.assertEqual(search_patient_ids(latin.card_number.lower()), [latin.pk])
+        self.assertEqual(search_patient_ids('አበበ'), [amharic.pk])
+
+
+class DuplicatePatientTests(TestCase):
+    url = '/api/healthcare/patients/'
+
+    def setUp(self):
+        self.client = staff_client()
+        self.existing = self.register('Abebe', 'Kebede', age=40, phone='0911223344')
+        self.register('Sara', 'Tesfaye', age=25, phone='0922000000')
+
+    def register(self, first_name, last_name, **fields):
+        user = User.objects.create_user(
+            username=f'{first_name}.{last_name}', password='x', role='patient',
+            first_name=first_name, last_name=last_name
+        )
+        return Patient.objects.create(user=user, gender='male', **fields)
+
+    def post(self, **data):
+        return self.client.post(self.url, {'gender': 'male', **data}, format='json')
+
+    def test_registration_reports_likely_duplicates(self):
+        # Misspelt surname, a year older, same phone
+        response = self.post(first_name='Abebe', last_name='Kebde', age=41, phone='0911223344')
+        self.assertEqual(response.status_code, 201, response.content)
+        candidates = response.json()['duplicate_candidates']
+        self.assertEqual([candidate['id'] for candidate in candidates], [self.existing.pk])
+        self.assertEqual(candidates[0]['patient_id'], self.existing.patient_id)
+        self.assertGreaterEqual(candidates[0]['score'], DUPLICATE_MIN_SCORE)
+
+    def test_different_people_are_not_flagged(self):
+        response = self.post(first_name='Sara', last_name='Kebede', age=70, phone='0933000000')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['duplicate_candidates'], [])
+
+    def test_reject_duplicates_refuses_the_registration(self):
+        response = self.post(first_name='Abebe', last_name='Kebede', age=40, reject_duplicates=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([candidate['id'] for candidate in response.json()['duplicate_candidates']], [self.existing.pk])
+        self.assertEqual(Patient.objects.count(), 2)
+
+    def test_check_before_registering(self):
+        response = self.client.get(f'{self.url}duplicates/', {'name': 'Abebe Kebede', 'age': 39})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([candidate['id'] for candidate in response.json()['duplicate_candidates']], [self.existing.pk])
+
+        patient_client = APIClient()
+        patient_client.force_authenticate(self.existing.user)
+        self.assertEqual(patient_client.get(f'{self.url}duplicates/', {'name': 'Abebe Kebede'}).status_code, 403)
+
+
+class CardLookupTests(TestCase):
+    def setUp(self):
+        card_cache.clear()
+        self.client = staff_client()
+        self.patient = make_patient(1)
+
+    def test_cards_are_stored_uppercased_and_found_in_any_case(self):
+        self.patient.card_number = ' c-777 '
+        self.patient.save()
+        self.assertEqual(self.patient.card_number, 'C-777')
+        response = self.client.get('/api/healthcare/patients/by-card/c-777/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.patient.pk)
+
+    def test_unknown_cards_are_remembered_until_assigned(self):
+        self.assertIsNone(lookup_card('C-999'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(lookup_card('C-999'))
+
+        self.patient.card_number = 'C-999'
+        self.patient.save()
+        self.assertEqual(lookup_card('c-999')['id'], self.patient.pk)
+
+
+class DashboardStatsTests(TestCase):
+    """Each dashboard against the one-count-per-field queries it replaced"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now, today = timezone.now(), timezone.localdate()
+        cls.users = {
+            role: User.objects.create_user(username=role, password='x', role=role)
+            for role in ['reception', 'doctor', 'laboratory']
+        }
+        cls.users['admin'] = User.objects.create_user(username='admin', password='x', role='admin', is_staff=True)
+        patients = [make_patient(i, priority='urgent' if i == 0 else 'standard') for i in range(4)]
+        cls.users['patient'] = patients[0].user
+        doctor = cls.users['doctor']
+
+        visits = {
+            stage: Visit.objects.create(
+                patient=patients[i % 3], stage=stage, attending_doctor=doctor if i > 1 else None
+            )
+            for i, stage in enumerate(['waiting_room', 'triage', 'questioning', 'laboratory_test', 'results_by_doctor'])
+        }
+        Visit.objects.create(patient=patients[1], stage='discharged', discharge_time=now)
+        Visit.objects.create(patient=patients[2], stage='discharged', discharge_time=now - timedelta(days=2))
+
+        for status, visit in [('requested', 'waiting_room'), ('in_progress', 'laboratory_test'),
+                              ('requested', 'questioning'), ('completed', 'triage')]:
+            LabTest.objects.create(
+                visit=visits[visit], test_name='CBC', test_type='CBC', status=status,
+                completed_at=now if status == 'completed' else None
+            )
+        Prescription.objects.create(visit=visits['waiting_room'], valid_until=today + timedelta(days=3))
+        Prescription.objects.create(visit=visits['triage'], valid_until=today + timedelta(days=3), is_dispensed=True)
+        appointments = [
+            (patients[0], now, 'scheduled'),
+            (patients[0], now + timedelta(days=3), 'confirmed'),
+            (patients[1], now - timedelta(days=3), 'scheduled'),
+        ]
+        for patient, when, status in appointments:
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, appointment_date=when, reason='Checkup', status=status
+            )
+        staff = StaffProfile.objects.create(
+            user=cls.users['reception'], employee_id='EMP-001', hire_date=today, hourly_rate=20, department='Front'
+        )
+        Shift.objects.create(staff=staff, start_time=now, end_time=now + timedelta(hours=8), status='scheduled')
+        Medication.objects.create(name='Paracetamol', strength='500mg', dosage_form='tablet')
+
+    def test_role_dashboards(self):
+        today = timezone.localdate()
+        todays_appointments = Appointment.objects.filter(appointment_date__date=today)
+        patient, doctor = self.users['patient'], self.users['doctor']
+        doctor_visits = Visit.objects.filter(attending_doctor=doctor, stage__in=DOCTOR_ACTIVE_STAGES)
+        pending_tests = LabTest.objects.filter(status__in=['requested', 'in_progress'])
+        expected = {
+            'patient': {
+                'role': 'patient',
+                'upcoming_appointments': Appointment.objects.filter(
+                    patient__user=patient, appointment_date__date__gte=today, status__in=['scheduled', 'confirmed']
+                ).count(),
+                'pending_lab_results': pending_tests.filter(visit__patient__user=patient).count(),
+                'active_prescriptions': Prescription.objects.filter(
+                    visit__patient__user=patient, is_dispensed=False, valid_until__gte=today
+                ).count(),
+            },
+            'reception': {
+                'role': 'reception',
+                'total_patients': User.objects.filter(role='patient').count(),
+                'todays_appointments': todays_appointments.count(),
+                'pending_registrations': Patient.objects.filter(
+                    created_at__date__gte=today - timedelta(days=7), visits__isnull=True
+                ).count(),
+            },
+            'doctor': {
+                'role': 'doctor',
+                'todays_appointments': todays_appointments.filter(doctor=doctor).count(),
+                'pending_consultations': doctor_visits.count(),
+                'patients_under_care': doctor_visits.values('patient').distinct().count(),
+            },
+            'laboratory': {
+                'role': 'laboratory',
+                'pending_tests': pending_tests.count(),
+                'completed_today': LabTest.objects.filter(completed_at__date=today, status='completed').count(),
+                'urgent_tests': pending_tests.filter(visit__patient__priority='urgent').count(),
+            },
+            'admin': {
+                'role': 'admin',
+                'total_patients': Patient.objects.count(),
+                'total_staff': User.objects.filter(role__in=['reception', 'doctor', 'laboratory', 'staff']).count(),
+                'todays_appointments': todays_appointments.count(),
+                'active_visits': Visit.objects.exclude(stage='discharged').count(),
+                'pending_lab_tests': pending_tests.count(),
+            },
+        }
+        for role, stats in expected.items():
+            with self.subTest(role):
+                self.assertEqual(role_dashboard_stats(self.users[role]), stats)
+        # The data set is built so that every count above is non-zero
+        self.assertTrue(all(all(stats.values()) for stats in expected.values()))
+
+    def test_clinic_dashboards(self):
+        today = timezone.localdate()
+        active_visits = Visit.objects.filter(stage__in=DASHBOARD_ACTIVE_STAGES).count()
+        self.assertEqual(active_visits, 4)
+        self.assertEqual(visit_dashboard_stats(), {
+            'total_patients': Patient.objects.count(),
+            'active_visits': active_visits,
+            'completed_visits_today': Visit.objects.filter(stage='discharged', discharge_time__date=today).count(),
+            'pending_lab_tests': LabTest.objects.filter(status='requested').count(),
+            'visits_by_stage': dict(
+                Visit.objects.values('stage').annotate(count=Count('stage')).values_list('stage', 'count')
+            ),
+        })
+
+        overview = overview_stats()
+        self.assertEqual(overview['patients'], {
+            'total': Patient.objects.count(),
+            'new_this_month': Patient.objects.filter(created_at__date__gte=today.replace(day=1)).count(),
+            'active_visits': active_visits,
+            'completed_today': Visit.objects.filter(stage='discharged', discharge_time__date=today).count(),
+        })
+        self.assertEqual(overview['staff'], {
+            'total': 1, 'active': 1, 'on_duty_today': 1, 'departments': {'Front': 1},
+        })
+        self.assertEqual(overview['medical'], {
+            'pending_lab_tests': LabTest.objects.filter(status='requested').count(),
+            'prescriptions_today': Prescription.objects.filter(created_at__date=today).count(),
+            'appointments_today': Appointment.objects.filter(appointment_date__date=today).count(),
+            'medication_inventory': Medication.objects.filter(is_active=True).count(),
+        })
+        self.assertEqual(report_stats('overview')['active_visits'], active_visits)
+
+
+class MonthToDateTests(TestCase):
+    def setUp(self):
+        self.today_start, today_end = day_range()
+        # An earlier day this month, where there is one, so the rollups cover it
+        earlier = max(self.today_start - timedelta(days=1), self.today_start.replace(day=1))
+        staff = StaffProfile.objects.create(
+            user=User.objects.create_user(username='nurse', password='x', role='nurse'),
+            employee_id='EMP-1', hire_date=self.today_start.date(), hourly_rate=100, department='Nursing'
+        )
+        self.shift = Shift.objects.create(
+            staff=staff, start_time=earlier, end_time=earlier + timedelta(hours=8), status='completed'
+        )
+        PayrollEntry.objects.create(
+            staff=staff, pay_period_start=earlier.date(), pay_period_end=earlier.date(), total_hours=8, hourly_rate=100
+        )
+        Patient.objects.filter(pk=make_patient(1).pk).update(created_at=earlier)
+
+    def month_to_date(self):
+        stats = overview_stats()
+        return stats['patients']['new_this_month'], stats['financial']['monthly_payroll'], \
+            stats['financial']['staff_hours_this_month']
+
+    def test_days_without_rollups_are_counted_live(self):
+        self.assertFalse(DailyClinicStats.objects.exists())
+        self.assertEqual(self.month_to_date(), (1, 800, 1))
+
+    def test_rolled_up_days_are_not_counted_twice(self):
+        run_rollup()
+        self.assertTrue(DailyClinicStats.objects.filter(new_patients=1).exists())
+        self.assertEqual(self.month_to_date(), (1, 800, 1))
+
+    def test_shift_edits_mark_their_day_changed(self):
+        since = timezone.now()
+        self.shift.status = 'cancelled'
+        self.shift.save()
+        self.assertIn(timezone.localdate(self.shift.start_time), changed_days(since))
+
+
+class DailyReportTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        for i, days_ago in enumerate([3, 1]):
+            created, _ = day_range(self.today - timedelta(days=days_ago))
+            Patient.objects.filter(pk=make_patient(i).pk).update(created_at=created + timedelta(hours=12))
+        run_rollup()
+
+    def test_days_without_rollup_rows_are_computed_live(self):
+        DailyClinicStats.objects.filter(day=self.today - timedelta(days=1)).delete()
+
+        report = daily_report(self.today - timedelta(days=5), self.today)
+        # Days before the first activity are left out
+        self.assertEqual(
+            [(row['day'], row['new_patients']) for row in report['days']],
+            [(self.today - timedelta(days=days_ago), count) for days_ago, count in [(3, 1), (2, 0), (1, 1), (0, 0)]]
+        )
+        self.assertEqual(report['totals']['new_patients'], 2)
+
+
+class MetricsSeriesRangeTests(TestCase):
+    def setUp(self):
+        self.client = staff_client()
+
+    def test_end_date_includes_that_day(self):
+        response = self.client.get('/api/healthcare/metrics/series/?start=2026-01-01&end=2026-01-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['buckets']), 2)
+
+    def test_out_of_range_dates_are_rejected(self):
+        for query in ['end=9999-12-31', 'end=0001-01-01', 'start=9999-12-31T23:00:00&end=9999-12-31']:
+            response = self.client.get(f'/api/healthcare/metrics/series/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+class QueueProjectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_visits(12)
+
+    def test_projection_matches_the_serializer(self):
+        visits = Visit.objects.order_by('-check_in_time').select_related(
+            'patient__user', 'attending_doctor', 'triage_completed_by'
+        ).prefetch_related('lab_tests', 'prescription')
+        expected = [dict(row) for row in QueuePatientSerializer(visits, many=True).data]
+        self.assertEqual(queue_rows(Visit.objects.order_by('-check_in_time')), expected)
+
+    def test_projection_query_count_does_not_grow(self):
+        for visits in [Visit.objects.order_by('-check_in_time'), Visit.objects.order_by('-check_in_time')[:5]]:
+            with self.assertNumQueries(QUEUE_ROWS_QUERIES):
+                queue_rows(visits)
+        seed_visits(500, prefix='more')
+        with self.assertNumQueries(QUEUE_ROWS_QUERIES):
+            self.assertEqual(len(queue_rows(Visit.objects.all())), 512)
+
+
+class RecentActivityWidgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_visits(12)
+        supervisor = None
+        for i in range(6):
+            supervisor = StaffProfile.objects.create(
+                user=User.objects.create_user(username=f'staff{i}', password='x', role='doctor'),
+                employee_id=f'EMP-{i}', hire_date=timezone.localdate(), hourly_rate=10, department='OPD',
+                supervisor=supervisor
+            )
+
+    def test_widgets_run_their_pinned_queries(self):
+        for name, (build, pinned) in RECENT_ACTIVITY_WIDGETS.items():
+            with self.subTest(name), self.assertNumQueries(pinned):
+                self.assertEqual(len(build()), 5)
+
+    def test_widgets_render_what_their_unprepared_serializers_did(self):
+        serializers = {
+            'new_patients': (PatientSerializer, Patient),
+            'recent_visits': (VisitSerializer, Visit),
+            'recent_staff': (StaffProfileSerializer, StaffProfile),
+        }
+        for name, (build, pinned) in RECENT_ACTIVITY_WIDGETS.items():
+            serializer, model = serializers[name]
+            with self.subTest(name):
+                rows = build()
+                unprepared = serializer(model.objects.filter(pk__in=[row['id'] for row in rows]), many=True).data
+                self.assertCountEqual(rows, unprepared)
+
+
+class CursorOrderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_visits(3)
+        for i in range(2):
+            staff = StaffProfile.objects.create(
+                user=User.objects.create_user(username=f'staff{i}', password='x', role='doctor'),
+                employee_id=f'EMP-{i}', hire_date=timezone.localdate(), hourly_rate=10, department='OPD'
+            )
+            Shift.objects.create(staff=staff, start_time=timezone.now(), end_time=timezone.now() + timedelta(hours=8))
+            PayrollEntry.objects.create(
+                staff=staff, pay_period_start=timezone.localdate(), pay_period_end=timezone.localdate(),
+                total_hours=8, hourly_rate=10
+            )
+
+    def test_every_endpoint_pages_with_every_ordering(self):
+        client = staff_client(role='admin', username='admin')
+        for prefix, viewset, basename in router.registry:
+            for field in getattr(viewset, 'ordering_fields', None) or []:
+                for ordering in (field, f'-{field}'):
+                    url = f'/api/healthcare/{prefix}/?page_size=1&ordering={ordering}'
+                    seen = []
+                    while url:
+                        response = client.get(url)
+                        self.assertEqual(response.status_code, 200, url)
+                        seen += [row['id'] for row in response.json()['results']]
+                        url = response.json()['next']
+                    unpaged = client.get(f'/api/healthcare/{prefix}/?ordering={ordering}').json()
+                    self.assertCountEqual(seen, [row['id'] for row in unpaged], f'{prefix} ?ordering={ordering}')
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.client = staff_client()
+        make_patient(1)
+
+    def test_fast_and_serializer_lists_keep_the_same_fields(self):
+        for fields in ['bogus', 'patient_id,bogus', 'full_name,age', '']:
+            rows = self.client.get(f'/api/healthcare/patients/?fields={fields}').json()
+            fast_rows = self.client.get(f'/api/healthcare/patients/?fields={fields}&fast=true').json()
+            self.assertEqual(list(fast_rows[0]), list(rows[0]), fields)
+
+        self.assertEqual(len(rows[0]), len(PatientSerializer.Meta.fields))
+        only = self.client.get('/api/healthcare/patients/?fields=patient_id,bogus').json()
+        self.assertEqual(list(only[0]), ['patient_id'])
+
+
+class BulkMoveTests(TestCase):
+    url = '/api/healthcare/visits/bulk_move/'
+
+    def setUp(self):
+        self.first, self.second = (Visit.objects.create(patient=make_patient(i), stage='triage') for i in range(2))
+        self.moved_before = Visit.objects.get(pk=self.first.pk).updated_at
+
+    def test_moves_every_item_and_records_it(self):
+        doctor = User.objects.create_user(username='doc', password='x', role='doctor')
+        client = APIClient()
+        client.force_authenticate(doctor)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(self.url, {'items': [
+                {'visit_id': self.first.pk, 'stage': 'questioning', 'payload': {'vitalSigns': {'bp': '120/80'}}},
+                {'visit_id': self.second.pk, 'stage': 'laboratory_test', 'payload': {'requestedLabTests': ['CBC']}},
+            ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        first, second = Visit.objects.get(pk=self.first.pk), Visit.objects.get(pk=self.second.pk)
+        self.assertEqual(first.stage, 'questioning')
+        self.assertEqual((first.vital_signs, first.triage_completed_by), ({'bp': '120/80'}, doctor))
+        self.assertGreater(first.updated_at, self.moved_before)
+        self.assertEqual(second.stage, 'laboratory_test')
+        self.assertEqual(list(second.lab_tests.values_list('test_name', flat=True)), ['CBC'])
+        self.assertCountEqual(
+            VisitStageEvent.objects.exclude(from_stage='')
+            .values_list('visit_id', 'from_stage', 'to_stage', 'moved_by'),
+            [(first.pk, 'triage', 'questioning', doctor.pk), (second.pk, 'triage', 'laboratory_test', doctor.pk)]
+        )
+        self.assertEqual(counter_value(QUEUE_COUNTER), 1)
+
+    def test_one_item_breaking_role_rules_applies_none(self):
+        client = staff_client(role='reception')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(self.url, {'items': [
+                {'visit_id': self.first.pk, 'stage': 'questioning'},
+                {'visit_id': self.second.pk, 'stage': 'questioning', 'payload': {'vitalSigns': {'bp': '1/1'}}},
+                {'visit_id': 0, 'stage': 'questioning'},
+            ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.json()['results']], [200, 403, 404])
+
+        self.assertEqual(set(Visit.objects.values_list('stage', flat=True)), {'triage'})
+        self.assertEqual(Visit.objects.get(pk=self.first.pk).updated_at, self.moved_before)
+        self.assertFalse(VisitStageEvent.objects.exclude(from_stage='').exists())
+        self.assertEqual(counter_value(QUEUE_COUNTER), 0)
+
+
+class StageThroughputTests(TestCase):
+    def move(self, visit, stage, minutes):
+        from_stage, visit.stage = visit.stage, stage
+        event = stage_event(visit, from_stage, at=visit.check_in_time + timedelta(minutes=minutes))
+        visit.save()
+        record_stage_events([event])
+
+    def test_a_move_counts_in_both_stages_and_updates_the_average(self):
+        first, second = (Visit.objects.create(patient=make_patient(i), stage='waiting_room') for i in range(2))
+        self.move(first, 'triage', minutes=10)
+
+        totals = {
+            row['stage']: row for row in StageHourlyStats.objects.values('stage').annotate(
+                entered=Sum('entered'), exited=Sum('exited'),
+                timed_exits=Sum('timed_exits'), seconds_in_stage=Sum('seconds_in_stage')
+            )
+        }
+        self.assertEqual(
+            {stage: (row['entered'], row['exited']) for stage, row in totals.items()},
+            {'waiting_room': (2, 1), 'triage': (1, 0)}
+        )
+        self.assertEqual((totals['waiting_room']['timed_exits'], totals['waiting_room']['seconds_in_stage']), (1, 600))
+        service = StageServiceTime.objects.get(stage='waiting_room')
+        self.assertEqual((service.average_seconds, service.samples), (600, 1))
+
+        self.move(second, 'triage', minutes=20)
+        service.refresh_from_db()
+        self.assertAlmostEqual(service.average_seconds, 600 + SERVICE_TIME_ALPHA * (1200 - 600))
+        self.assertEqual(service.samples, 2)
+        self.assertFalse(StageServiceTime.objects.filter(stage='triage').exists())
+
+
+class WaitEstimateTests(TestCase):
+    url = '/api/healthcare/visits/queue/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = staff_client()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visits = [Visit.objects.create(patient=make_patient(i), stage='waiting_room') for i in range(3)]
+        StageServiceTime.objects.create(stage='waiting_room', average_seconds=30 * 60, samples=10)
+
+    def positions(self):
+        return {
+            row['visitId']: (row['queuePosition'], row['estimatedWaitMinutes'])
+            for row in self.client.get(self.url).json()
+        }
+
+    def test_urgent_visits_move_to_the_front_of_their_stage(self):
+        first, second, last = (visit.pk for visit in self.visits)
+        self.assertEqual(self.positions(), {first: (1, 10), second: (2, 20), last: (3, 30)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            patient = self.visits[2].patient
+            patient.priority = 'urgent'
+            patient.save()
+        self.assertEqual(self.positions(), {last: (1, 10), first: (2, 20), second: (3, 30)})
+
+    def test_stages_without_timing_data_have_no_estimate(self):
+        StageServiceTime.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visits[0].save()
+        self.assertEqual([wait for position, wait in self.positions().values()], [None] * 3)
+
+
+class RoleQueueTests(TestCase):
+    url = '/api/healthcare/visits/queue/mine/'
+
+    def setUp(self):
+        cache.clear()
+        for i, stage in enumerate(['waiting_room', 'triage', 'questioning', 'laboratory_test', 'discharged']):
+            Visit.objects.create(patient=make_patient(i), stage=stage)
+
+    def test_each_role_gets_its_stages_and_columns(self):
+        for role in ['reception', 'nurse', 'doctor', 'laboratory']:
+            with self.subTest(role):
+                rows = staff_client(role=role, username=role).get(self.url).json()
+                # One visit was created in each stage but results_by_doctor
+                stages = [
+                    stage for stage in ROLE_QUEUE_STAGES.get(role, Visit.ACTIVE_STAGES) if stage != 'results_by_doctor'
+                ]
+                self.assertCountEqual([row['stage'] for row in rows], stages)
+                if role in ROLE_QUEUE_FIELDS:
+                    columns = set(rows[0]) - {'queuePosition', 'estimatedWaitMinutes'}
+                    self.assertEqual(columns, set(ROLE_QUEUE_FIELDS[role]))
+
+    def test_patients_have_no_work_queue(self):
+        self.assertEqual(staff_client(role='patient', username='patient').get(self.url).status_code, 403)
+
+
+class QueueSnapshotTests(TestCase):
+    url = '/api/healthcare/visits/queue/'
+
+    def setUp(self):
+        # Snapshots are keyed by counter value, which every test starts again from
+        cache.clear()
+        self.client = staff_client()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visit = Visit.objects.create(patient=make_patient(1), stage='waiting_room')
+
+    def test_unchanged_queue_revalidates_from_the_counter_alone(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_bump_the_counter_and_rebuild_the_snapshot(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visit.patient.user.first_name = 'Renamed'
+            self.visit.patient.user.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Renamed', response.json()[0]['name'])
+
+
+@skipIf(orjson is None, 'FastJSONRenderer is JSONRenderer without orjson')
+class FastJSONRendererTests(TestCase):
+    def test_output_matches_json_renderer(self):
+        utc, east = dt_timezone.utc, dt_timezone(timedelta(hours=3))
+        data = {
+            'datetimes': [
+                datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=utc), datetime(2026, 1, 2, 3, 4, 5, tzinfo=east),
+                datetime(2026, 1, 2, 3, 4, 5, 120000), datetime(2026, 1, 2, tzinfo=dt_timezone(timedelta(seconds=5))),
+            ],
+            'date': date(2026, 1, 2),
+            'time': time(3, 4, 5, 7),
+            'decimal': Decimal('12.50'),
+            'duration': timedelta(minutes=90),
+            'text': 'አበበ \u2028 \u2029 "quoted"',
+            1: None,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_non_finite_floats_render_as_null(self):
+        for value in [float('nan'), float('inf'), float('-inf')]:
+            with self.subTest(value):
+                self.assertEqual(FastJSONRenderer().render({'value': value}), b'{"value":null}')
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render({'value': value})
+
+
+class SnapshotETagTests(TestCase):
+    def setUp(self):
+        self.client = staff_client()
+        Visit.objects.create(patient=make_patient(1), stage='waiting_room')
+
+    def test_etag_differs_per_format(self):
+        url = '/api/healthcare/visits/all_patients/'
+        json_response = self.client.get(url, HTTP_ACCEPT='application/json')
+        msgpack_response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertNotEqual(json_response['ETag'], msgpack_response['ETag'])
+
+        revalidated = self.client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=json_response['ETag'])
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(revalidated['Content-Type'], 'application/msgpack')
+        cached = self.client.get(url, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=json_response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+
+class RoleDashboardCacheTests(TestCase):
+    url = '/api/auth/dashboard-stats/'
+
+    def setUp(self):
+        # Entries are keyed by counter value, which every test starts again from
+        cache.clear()
+        self.doctor = User.objects.create_user(username='doctor', password='x', role='doctor')
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+        self.patient = make_patient(1)
+
+    def stats(self, client=None):
+        response = (client or self.client).get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repeat_requests_do_not_rebuild(self):
+        with mock.patch('healthcare.stats.role_dashboard_stats', wraps=role_dashboard_stats) as build:
+            self.stats()
+            self.stats()
+            # Other roles share one dashboard; doctors each get their own
+            self.stats(staff_client(role='reception', username='desk1'))
+            self.stats(staff_client(role='reception', username='desk2'))
+            self.stats(staff_client(role='doctor', username='doctor2'))
+        self.assertEqual(build.call_count, 3)
+
+    def test_changes_rebuild_the_dashboard(self):
+        self.assertEqual(self.stats()['todays_appointments'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor, appointment_date=timezone.now(), reason='Checkup'
+            )
+        self.assertEqual(self.stats()['todays_appointments'], 1)
+        self.assertEqual(self.stats(staff_client(role='doctor', username='doctor2'))['todays_appointments'], 0)
+
+    def test_previous_value_is_served_while_another_request_rebuilds(self):
+        self.stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Visit.objects.create(patient=self.patient, stage='questioning', attending_doctor=self.doctor)
+        key = f'healthcare:versioned:{DASHBOARD_COUNTER}:role:{role_dashboard_key(self.doctor)}'
+        cache.add(f'{key}:rebuilding', True)
+        self.assertEqual(self.stats()['pending_consultations'], 0)
+
+        cache.delete(f'{key}:rebuilding')
+        self.assertEqual(self.stats()['pending_consultations'], 1)
+
+
+class WorklistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_visits(12)
+
+    def test_worklist_lists_open_tests_urgent_first(self):
+        rows = worklist_rows(open_lab_tests())
+        open_ids = LabTest.objects.filter(status__in=OPEN_LAB_STATUSES).values_list('id', flat=True)
+        self.assertEqual(sorted(row['id'] for row in rows), sorted(open_ids))
+        urgent = [row['priority'] == 'urgent' for row in rows]
+        self.assertEqual(urgent, sorted(urgent, reverse=True))
 
-# Create your tests here.
+    def test_worklist_query_count_does_not_grow(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(worklist_rows(open_lab_tests())), 12)
+        seed_visits(200, prefix='more')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(worklist_rows(open_lab_tests())), 212)
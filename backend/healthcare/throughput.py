@@ -0,0 +1,169 @@
+"""
+Visit stage event log and the per-stage hourly counters derived from it.
+
+Every stage move appends a VisitStageEvent and folds it into
+StageHourlyStats with F() increments, so wait-time and throughput reports
+read a few small aggregate rows instead of diffing the Visit table. Timed
+exits also update StageServiceTime, the moving average behind the queue's
+wait estimates.
+"""
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Visit, VisitStageEvent, StageHourlyStats, StageServiceTime
+
+# Weight of the newest sample in the per-stage service time average
+SERVICE_TIME_ALPHA = 0.2
+
+
+def start_of_hour(moment):
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def stage_event(visit, from_stage, user=None, at=None):
+    """
+    Unsaved event for `visit` having just entered its current stage from
+    `from_stage`. Also moves visit.stage_entered_at to the event time (in
+    memory; the caller saves the visit).
+    """
+    at = at or timezone.now()
+    entered = visit.stage_entered_at
+    if entered is None and from_stage == 'waiting_room':
+        # Never moved before: it has waited since check-in
+        entered = visit.check_in_time
+    seconds = None
+    if entered is not None and entered <= at:
+        seconds = int((at - entered).total_seconds())
+
+    visit.stage_entered_at = at
+    return VisitStageEvent(
+        visit=visit, from_stage=from_stage, to_stage=visit.stage,
+        occurred_at=at, seconds_in_stage=seconds, moved_by=user
+    )
+
+
+def record_stage_events(events):
+    """Save `events` and add them to the hourly counters, one UPDATE per stage and hour touched"""
+    if not events:
+        return
+    VisitStageEvent.objects.bulk_create(events)
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for event in events:
+        hour = start_of_hour(event.occurred_at)
+        deltas[event.to_stage, hour]['entered'] += 1
+        if event.from_stage:
+            exits = deltas[event.from_stage, hour]
+            exits['exited'] += 1
+            if event.seconds_in_stage is not None:
+                exits['timed_exits'] += 1
+                exits['seconds_in_stage'] += event.seconds_in_stage
+
+    for (stage, hour), delta in deltas.items():
+        _add_to_hour(stage, hour, delta)
+
+    for event in events:
+        if event.from_stage and event.seconds_in_stage is not None:
+            _add_service_time(event.from_stage, float(event.seconds_in_stage))
+
+
+def _add_to_hour(stage, hour, delta):
+    updated = StageHourlyStats.objects.filter(stage=stage, hour=hour).update(
+        **{field: F(field) + amount for field, amount in delta.items()}
+    )
+    if not updated:
+        stats, created = StageHourlyStats.objects.get_or_create(stage=stage, hour=hour, defaults=dict(delta))
+        if not created:
+            _add_to_hour(stage, hour, delta)
+
+
+def _add_service_time(stage, seconds):
+    # avg += alpha * (sample - avg), as a single UPDATE
+    updated = StageServiceTime.objects.filter(stage=stage).update(
+        average_seconds=F('average_seconds') + SERVICE_TIME_ALPHA * (seconds - F('average_seconds')),
+        samples=F('samples') + 1,
+        updated_at=timezone.now()
+    )
+    if not updated:
+        stats, created = StageServiceTime.objects.get_or_create(
+            stage=stage, defaults={'average_seconds': seconds, 'samples': 1}
+        )
+        if not created:
+            _add_service_time(stage, seconds)
+
+
+def add_wait_estimates(rows):
+    """
+    Add queuePosition and estimatedWaitMinutes to queue payload rows (which
+    must hold whole stages, in check-in order).
+
+    Position counts within the visit's stage, urgent patients first. The
+    wait is the expected time until the visit leaves its stage: with L
+    visits in a stage whose average time in stage is W, one leaves every
+    W / L on average (Little's law), so position k waits about k * W / L.
+    """
+    averages = dict(StageServiceTime.objects.values_list('stage', 'average_seconds'))
+
+    by_stage = defaultdict(list)
+    for row in rows:
+        by_stage[row['stage']].append(row)
+
+    for stage, stage_rows in by_stage.items():
+        # Stable sort keeps check-in order within each priority
+        stage_rows.sort(key=lambda row: row['priority'] != 'Urgent')
+        average = averages.get(stage)
+        for position, row in enumerate(stage_rows, start=1):
+            row['queuePosition'] = position
+            row['estimatedWaitMinutes'] = (
+                round(position * average / len(stage_rows) / 60) if average is not None else None
+            )
+    return rows
+
+
+def stage_throughput(hours=24):
+    """
+    Arrivals, departures and average time in stage per stage over the last
+    `hours` hours, plus the hourly rows they were summed from.
+    """
+    since = start_of_hour(timezone.now()) - timedelta(hours=hours - 1)
+    rows = StageHourlyStats.objects.filter(hour__gte=since)
+
+    totals = {
+        row['stage']: row
+        for row in rows.values('stage').annotate(
+            entered_total=Sum('entered'),
+            exited_total=Sum('exited'),
+            timed_total=Sum('timed_exits'),
+            seconds_total=Sum('seconds_in_stage'),
+        )
+    }
+    stages = {}
+    for stage, label in Visit.STAGE_CHOICES:
+        row = totals.get(stage)
+        stages[stage] = {
+            'entered': row['entered_total'] if row else 0,
+            'exited': row['exited_total'] if row else 0,
+            'averageMinutes': (
+                round(row['seconds_total'] / row['timed_total'] / 60, 1)
+                if row and row['timed_total'] else None
+            ),
+        }
+
+    hourly = [
+        {
+            'stage': row['stage'],
+            'hour': row['hour'],
+            'entered': row['entered'],
+            'exited': row['exited'],
+            'averageMinutes': (
+                round(row['seconds_in_stage'] / row['timed_exits'] / 60, 1) if row['timed_exits'] else None
+            ),
+        }
+        for row in rows.order_by('hour', 'stage').values(
+            'stage', 'hour', 'entered', 'exited', 'timed_exits', 'seconds_in_stage'
+        )
+    ]
+    return {'since': since, 'stages': stages, 'hourly': hourly}
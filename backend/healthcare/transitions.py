@@ -0,0 +1,160 @@
+"""
+Visit stage transitions and the role rules that guard them.
+
+All authenticated staff can move patients through stages (queue
+coordination), but only specific roles can add medical data during a
+transition. Used by both the single and the bulk move endpoints.
+"""
+import json
+from collections import namedtuple
+
+from django.utils import timezone
+from rest_framework import status
+
+from .models import Visit, LabTest, Prescription
+from .throughput import stage_event
+
+# Every Visit column a transition may write, for bulk_update()
+TRANSITION_FIELDS = [
+    'stage', 'vital_signs', 'triage_notes', 'triage_completed_by', 'triage_completed_at',
+    'questioning_findings', 'questioning_completed_at', 'attending_doctor',
+    'lab_findings', 'lab_completed_at', 'diagnosis', 'treatment_plan', 'final_findings',
+    'discharge_time', 'stage_entered_at', 'updated_at',
+]
+
+# What a transition leaves for the caller to persist: requested lab test
+# names, prescription medications (or None) and the stage event (or None
+# when the visit stayed in its stage)
+TransitionResult = namedtuple('TransitionResult', ['requested_tests', 'medications', 'event'])
+
+
+class TransitionError(Exception):
+    def __init__(self, message, status_code=status.HTTP_403_FORBIDDEN):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _require_doctor(user, message):
+    if not (user.is_doctor or user.is_admin):
+        raise TransitionError(message)
+
+
+def _set_questioning_findings(visit, user, data):
+    _require_doctor(user, 'Only doctors can add consultation findings')
+    visit.questioning_findings = data['questioningFindings']
+    visit.questioning_completed_at = timezone.now()
+    visit.attending_doctor = user
+
+
+def parse_prescription(prescription_text):
+    """Parse "name, dose, frequency, duration" lines into medication dicts"""
+    medications = []
+    for line in prescription_text.split('\n'):
+        if line.strip():
+            parts = [part.strip() for part in line.split(',')]
+            if len(parts) >= 4:
+                medications.append({
+                    'name': parts[0],
+                    'dose': parts[1],
+                    'frequency': parts[2],
+                    'duration': parts[3]
+                })
+    return medications
+
+
+def apply_transition(visit, user, new_stage, data):
+    """
+    Move `visit` to `new_stage` in memory, applying the medical data in
+    `data` that `user`'s role may add. Nothing is saved.
+
+    Returns a TransitionResult for the caller to persist. Raises
+    TransitionError when the stage is invalid or the role may not add some
+    of the data.
+    """
+    if new_stage not in dict(Visit.STAGE_CHOICES):
+        raise TransitionError('Invalid stage', status.HTTP_400_BAD_REQUEST)
+
+    from_stage = visit.stage
+    visit.stage = new_stage
+    requested_tests = []
+    medications = None
+
+    # Handle Triage data - can be added when completing triage (moving FROM triage stage)
+    if 'vitalSigns' in data or 'triageNotes' in data:
+        allowed_roles = ['triage', 'nurse', 'doctor', 'staff', 'admin']
+        if user.role not in allowed_roles:
+            raise TransitionError(
+                f'Only {", ".join(allowed_roles)} staff can add vital signs and triage notes. Your role: {user.role}'
+            )
+        if 'vitalSigns' in data:
+            vital_signs_data = data['vitalSigns']
+            # If it's a string, parse it as JSON; otherwise use it directly
+            if isinstance(vital_signs_data, str):
+                try:
+                    visit.vital_signs = json.loads(vital_signs_data)
+                except json.JSONDecodeError:
+                    # If parsing fails, store as-is for backward compatibility
+                    visit.vital_signs = vital_signs_data
+            else:
+                visit.vital_signs = vital_signs_data
+        if 'triageNotes' in data:
+            visit.triage_notes = data['triageNotes']
+        visit.triage_completed_by = user
+        visit.triage_completed_at = timezone.now()
+
+    # Questioning, laboratory and results stages - ONLY doctors can add consultation findings
+    if new_stage in ('questioning', 'laboratory_test', 'results_by_doctor') and 'questioningFindings' in data:
+        _set_questioning_findings(visit, user, data)
+
+    # Handle Laboratory phase - ONLY doctors can REQUEST lab tests
+    if new_stage == 'laboratory_test' and 'requestedLabTests' in data:
+        _require_doctor(user, 'Only doctors can request lab tests')
+        requested_tests = list(data['requestedLabTests'])
+
+    # Handle Results by Doctor phase - ONLY doctors can add lab findings
+    # (lab tests themselves are completed by laboratory staff in LabTestViewSet)
+    if new_stage == 'results_by_doctor' and 'labFindings' in data:
+        _require_doctor(user, 'Only doctors can add lab findings and interpretations')
+        visit.lab_findings = data['labFindings']
+        visit.lab_completed_at = timezone.now()
+
+    # Handle Discharge phase - ONLY doctors can add diagnosis/treatment/prescriptions
+    if new_stage == 'discharged':
+        visit.discharge_time = timezone.now()
+
+        if any(key in data for key in ('diagnosis', 'treatment_plan', 'finalFindings', 'prescription')):
+            _require_doctor(user, 'Only doctors can add diagnosis, treatment plans, and prescriptions')
+            if 'diagnosis' in data:
+                visit.diagnosis = data['diagnosis']
+            if 'treatment_plan' in data:
+                visit.treatment_plan = data['treatment_plan']
+            if 'finalFindings' in data:
+                visit.final_findings = data['finalFindings']
+            if 'prescription' in data:
+                medications = parse_prescription(data['prescription'])
+
+    event = stage_event(visit, from_stage, user) if from_stage != new_stage else None
+    return TransitionResult(requested_tests, medications, event)
+
+
+def new_lab_tests(visit, test_names, user):
+    """Unsaved LabTest rows for the tests requested during a transition"""
+    return [
+        LabTest(visit=visit, test_name=test_name, test_type=test_name, requested_by=user)
+        for test_name in test_names
+    ]
+
+
+def save_prescription(visit, user, medications):
+    prescription, created = Prescription.objects.get_or_create(
+        visit=visit,
+        defaults={
+            'prescribed_by': user,
+            'medications': medications
+        }
+    )
+    if not created:
+        prescription.medications = medications
+        prescription.save()
+    return prescription
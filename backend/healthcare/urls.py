@@ -31,5 +31,6 @@ urlpatterns = [
     path('test/', test_endpoint, name='test_endpoint'),
     path('staff/onboard/', views.staff_onboard, name='staff_onboard'),
     path('admin/reports/', admin_reports, name='admin_reports'),
+    path('metrics/series/', views.metrics_series, name='metrics_series'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
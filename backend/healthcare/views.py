@@ -1,55 +1,124 @@
+import csv
+import math
+from datetime import datetime, timedelta
+
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.renderers import JSONRenderer
+from django.http import StreamingHttpResponse
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
 from .models import (
     Patient, Visit, LabTest, Prescription, Medication, Appointment, MedicalRecord,
-    MedicalHistory, Allergy, PatientMedication, StaffProfile, Shift, PayrollEntry, PerformanceReview
+    MedicalHistory, Allergy, PatientMedication, StaffProfile, Shift, PayrollEntry, PerformanceReview,
+    IdentifierSequence
 )
 from .serializers import (
     PatientSerializer, PatientCreateSerializer, VisitSerializer, VisitCreateSerializer,
     LabTestSerializer, PrescriptionSerializer, MedicationSerializer,
-    AppointmentSerializer, MedicalRecordSerializer, QueuePatientSerializer,
+    AppointmentSerializer, MedicalRecordSerializer,
     MedicalHistorySerializer, AllergySerializer, PatientMedicationSerializer,
     StaffProfileSerializer, StaffCreateSerializer, ShiftSerializer, PayrollEntrySerializer, PerformanceReviewSerializer
 )
+from .queue import (
+    active_queue, queue_changes, decode_cursor, next_cursor, visit_history, encode_history_cursor,
+    parse_stages, ROLE_QUEUE_STAGES, ROLE_QUEUE_FIELDS, CLAIMABLE_STAGES, claim_next_visit
+)
+from .worklist import open_lab_tests, worklist_rows, worklist_changes
+from .events import queue_events, publish_queue_event, stream_queue_events, QUEUE_LISTENER_RETRY
+from .renderers import EventStreamRenderer
+from .caching import QUEUE_COUNTER, DASHBOARD_COUNTER, snapshot_response, bump_counter_on_commit
+from .search import PatientSearchFilter
+from .duplicates import find_duplicate_candidates
+from .cards import lookup_card
+from .stats import cached_stats, visit_dashboard_stats, recent_staff
+from .metrics import SERIES, METRICS_INTERVALS, METRICS_MAX_BUCKETS, METRICS_DEFAULT_DAYS, metric_series
+from .importers import PatientImporter, IMPORT_FORMATS, guess_format, read_rows
+from .throughput import record_stage_events, stage_throughput, add_wait_estimates
+from .transitions import (
+    TransitionError, TRANSITION_FIELDS, apply_transition, new_lab_tests, save_prescription
+)
+from .projections import queue_rows, iter_queue_rows, stream_rows, patient_rows
 from authentication.permissions import IsStaffMember, IsDoctor, IsLaboratory
 
 User = get_user_model()
 
+ALL_PATIENTS_PAGE_SIZE = 100
+ALL_PATIENTS_MAX_PAGE_SIZE = 1000
+ALL_PATIENTS_STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+BULK_MOVE_MAX_ITEMS = 500
+THROUGHPUT_MAX_HOURS = 24 * 31
+
 
 class PatientViewSet(viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
     permission_classes = [permissions.IsAuthenticated]  # Allow authenticated users, filter in get_queryset
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # PatientSearchFilter orders by relevance, so it runs after OrderingFilter
+    filter_backends = [DjangoFilterBackend, OrderingFilter, PatientSearchFilter]
     filterset_fields = ['gender', 'priority']
-    search_fields = ['user__first_name', 'user__last_name', 'patient_id', 'phone']
     ordering_fields = ['created_at', 'user__first_name']
     ordering = ['-created_at']
 
     def get_queryset(self):
         """Filter queryset based on user role"""
         user = self.request.user
+        patients = PatientSerializer.prepare(Patient.objects.all(), self.request)
         if user.is_staff_member:
             # Staff can see all patients
-            return Patient.objects.all()
+            return patients
         elif user.is_patient:
             # Patients can only see themselves
-            return Patient.objects.filter(user=user)
+            return patients.filter(user=user)
         return Patient.objects.none()
 
     def get_serializer_class(self):
         if self.action == 'create':
             return PatientCreateSerializer
         return PatientSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid() and 'duplicate_candidates' in serializer.errors:
+            # ValidationError turns every candidate field into a string; send the candidates as found
+            return Response(
+                {'duplicate_candidates': serializer.duplicate_candidates},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(serializer.data)
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        ?fast=true builds the same rows from one values() query instead of
+        the serializer, for callers that load the whole list. Paged requests
+        are small enough for the serializer and ignore it.
+        """
+        if request.query_params.get('fast', '').lower() not in ('1', 'true', 'yes'):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        kept = PatientSerializer.requested_fields(request, PatientSerializer.Meta.fields)
+        return Response(patient_rows(queryset, [field for field in PatientSerializer.Meta.fields if field in kept]))
     
     def update(self, request, *args, **kwargs):
         """Custom update to handle nested user updates"""
@@ -80,6 +149,96 @@ class PatientViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], url_path=r'by-card/(?P<card>[^/]+)')
+    def by_card(self, request, card=None):
+        """Compact identity and active visit of the patient holding a (current or reissued) card"""
+        if not request.user.is_staff_member:
+            return Response(
+                {'error': 'Only staff members can look up patients by card'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        summary = lookup_card(card)
+        if summary is None:
+            return Response({'error': 'No patient holds this card number'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(summary)
+
+    @action(detail=False, methods=['get'])
+    def duplicates(self, request):
+        """
+        Existing patients that look like the one about to be registered.
+        Query: first_name + last_name (or name), and optionally phone and age.
+        """
+        if not request.user.is_staff_member:
+            return Response(
+                {'error': 'Only staff members can check for duplicate patients'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        first_name = request.query_params.get('first_name', '')
+        last_name = request.query_params.get('last_name', '')
+        if not (first_name and last_name) and 'name' in request.query_params:
+            name_parts = request.query_params['name'].strip().split(' ', 1)
+            first_name, last_name = name_parts[0], name_parts[1] if len(name_parts) > 1 else ''
+        if not (first_name or last_name):
+            return Response(
+                {'error': 'first_name and last_name (or name) are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        age = request.query_params.get('age')
+        try:
+            age = int(age) if age else None
+        except ValueError:
+            return Response({'error': 'age must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'duplicate_candidates': find_duplicate_candidates(
+                first_name, last_name, request.query_params.get('phone'), age
+            )
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk_import(self, request):
+        """
+        Import many patients at once, from an uploaded CSV/JSON/NDJSON `file`
+        or a JSON body {"patients": [...]}. Rows use PatientCreateSerializer's
+        fields; ?dry_run=true validates without saving. Returns a per-row
+        error report.
+        """
+        if not request.user.is_staff_member:
+            return Response(
+                {'error': 'Only staff members can import patients'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if 'file' in request.FILES:
+            upload = request.FILES['file']
+            import_format = request.query_params.get('format_type') or guess_format(upload.name)
+            if import_format not in IMPORT_FORMATS:
+                return Response(
+                    {'error': f"format_type must be one of: {', '.join(IMPORT_FORMATS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rows = read_rows(upload, import_format)
+        elif isinstance(request.data.get('patients'), list):
+            rows = request.data['patients']
+        else:
+            return Response(
+                {'error': 'Upload a file or send a "patients" list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        importer = PatientImporter(dry_run=request.query_params.get('dry_run') == 'true')
+        try:
+            report = importer.run(rows)
+        except (ValueError, csv.Error) as e:
+            # Malformed file: report what was imported before the bad line
+            report = importer.report()
+            report['error'] = f'Could not read file: {e}'
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)
+
     @action(detail=True, methods=['get'])
     def medical_record(self, request, pk=None):
         patient = self.get_object()
@@ -108,14 +267,15 @@ class VisitViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter queryset based on user role"""
         user = self.request.user
+        visits = VisitSerializer.prepare(Visit.objects.all(), self.request)
         if user.is_staff_member:
             # Staff can see all visits
-            return Visit.objects.all()
+            return visits
         elif user.is_patient:
             # Patients can only see their own visits
             try:
                 patient = Patient.objects.get(user=user)
-                return Visit.objects.filter(patient=patient)
+                return visits.filter(patient=patient)
             except Patient.DoesNotExist:
                 return Visit.objects.none()
         return Visit.objects.none()
@@ -128,210 +288,319 @@ class VisitViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def move_to_stage(self, request, pk=None):
         visit = self.get_object()
-        new_stage = request.data.get('stage')
         user = request.user
 
-        if new_stage not in dict(Visit.STAGE_CHOICES):
+        try:
+            result = apply_transition(visit, user, request.data.get('stage'), request.data)
+        except TransitionError as e:
+            return Response({'error': e.message}, status=e.status_code)
+
+        with transaction.atomic():
+            visit.save()
+            if result.requested_tests:
+                LabTest.objects.bulk_create(new_lab_tests(visit, result.requested_tests, user))
+            if result.medications is not None:
+                save_prescription(visit, user, result.medications)
+            if result.event:
+                record_stage_events([result.event])
+
+        publish_queue_event('stage_changed', visit)
+        serializer = self.get_serializer(visit)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post'])
+    def bulk_move(self, request):
+        """
+        Move many visits in one transaction.
+
+        Body: {"items": [{"visit_id": 1, "stage": "discharged", "payload": {...}}, ...]}
+        where payload holds the same medical data move_to_stage accepts. Either
+        every item is applied or, if any fails its role rules, none is; the
+        response lists a result per item in request order.
+        """
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
             return Response(
-                {'error': 'Invalid stage'},
+                {'error': 'items must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > BULK_MOVE_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {BULK_MOVE_MAX_ITEMS} items can be moved at once'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # All authenticated staff can move patients through stages (queue coordination)
-        # But only specific roles can add medical data during transitions
+        user = request.user
+        with transaction.atomic():
+            visit_ids = [item.get('visit_id') for item in items if isinstance(item, dict)]
+            # Lock only the visit rows; the serializer's outer joins cannot be locked
+            visits = self.get_queryset().select_related(None).prefetch_related(None).select_for_update().in_bulk(
+                [visit_id for visit_id in visit_ids if isinstance(visit_id, int)]
+            )
 
-        visit.stage = new_stage
+            results = []
+            moved = []
+            lab_tests = []
+            prescriptions = []
+            events = []
+            failed = False
+            now = timezone.now()
+            for item in items:
+                item = item if isinstance(item, dict) else {}
+                visit = visits.get(item.get('visit_id'))
+                if visit is None:
+                    results.append({'visitId': item.get('visit_id'), 'error': 'Visit not found', 'status': 404})
+                    failed = True
+                    continue
+                payload = item.get('payload') or {}
+                try:
+                    result = apply_transition(visit, user, item.get('stage'), payload)
+                except TransitionError as e:
+                    results.append({'visitId': visit.id, 'error': e.message, 'status': e.status_code})
+                    failed = True
+                    continue
+
+                visit.updated_at = now  # bulk_update() skips auto_now
+                moved.append(visit)
+                lab_tests.extend(new_lab_tests(visit, result.requested_tests, user))
+                if result.medications is not None:
+                    prescriptions.append((visit, result.medications))
+                if result.event:
+                    events.append(result.event)
+                results.append({'visitId': visit.id, 'stage': visit.stage, 'status': 200})
+
+            if failed:
+                return Response({'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+            # bulk_update() does not send post_save, so invalidate the queue and notify listeners here
+            Visit.objects.bulk_update(moved, TRANSITION_FIELDS)
+            LabTest.objects.bulk_create(lab_tests)
+            for visit, medications in prescriptions:
+                save_prescription(visit, user, medications)
+            record_stage_events(events)
+            bump_counter_on_commit(QUEUE_COUNTER)
+            bump_counter_on_commit(DASHBOARD_COUNTER)
+            for visit in moved:
+                publish_queue_event('stage_changed', visit)
+
+        return Response({'results': results})
 
-        # Handle Triage data - can be added when completing triage (moving FROM triage stage)
-        if 'vitalSigns' in request.data or 'triageNotes' in request.data:
-            allowed_roles = ['triage', 'nurse', 'doctor', 'staff', 'admin']
-            if user.role not in allowed_roles:
-                return Response(
-                    {'error': f'Only {", ".join(allowed_roles)} staff can add vital signs and triage notes. Your role: {user.role}'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            # User has permission to add medical data
-            if 'vitalSigns' in request.data:
-                import json
-                vital_signs_data = request.data['vitalSigns']
-                # If it's a string, parse it as JSON; otherwise use it directly
-                if isinstance(vital_signs_data, str):
-                    try:
-                        visit.vital_signs = json.loads(vital_signs_data)
-                    except json.JSONDecodeError:
-                        # If parsing fails, store as-is for backward compatibility
-                        visit.vital_signs = vital_signs_data
-                else:
-                    visit.vital_signs = vital_signs_data
-            if 'triageNotes' in request.data:
-                visit.triage_notes = request.data['triageNotes']
-            visit.triage_completed_by = user
-            visit.triage_completed_at = timezone.now()
-
-        # Handle Questioning phase - ONLY doctors can add consultation findings
-        if new_stage == 'questioning':
-            # Check if user is trying to add medical data
-            if 'questioningFindings' in request.data:
-                if not (user.is_doctor or user.is_admin):
-                    return Response(
-                        {'error': 'Only doctors can add consultation findings'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                # User has permission to add medical data
-                visit.questioning_findings = request.data['questioningFindings']
-                visit.questioning_completed_at = timezone.now()
-                visit.attending_doctor = user
-
-        # Handle Laboratory phase - ONLY doctors can REQUEST lab tests
-        if new_stage == 'laboratory_test':
-            # Save questioning findings if provided
-            if 'questioningFindings' in request.data:
-                if not (user.is_doctor or user.is_admin):
-                    return Response(
-                        {'error': 'Only doctors can add consultation findings'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                visit.questioning_findings = request.data['questioningFindings']
-                visit.questioning_completed_at = timezone.now()
-                visit.attending_doctor = user
-            
-            if 'requestedLabTests' in request.data:
-                if not (user.is_doctor or user.is_admin):
-                    return Response(
-                        {'error': 'Only doctors can request lab tests'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                requested_tests = request.data['requestedLabTests']
-                for test_name in requested_tests:
-                    LabTest.objects.create(
-                        visit=visit,
-                        test_name=test_name,
-                        test_type=test_name,
-                        requested_by=user
-                    )
-        
-        # Handle Results by Doctor phase - ONLY doctors can add lab findings
-        if new_stage == 'results_by_doctor':
-            # Save questioning findings if provided (for cases where lab was skipped)
-            if 'questioningFindings' in request.data:
-                if not (user.is_doctor or user.is_admin):
-                    return Response(
-                        {'error': 'Only doctors can add consultation findings'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                visit.questioning_findings = request.data['questioningFindings']
-                visit.questioning_completed_at = timezone.now()
-                visit.attending_doctor = user
-            
-            # Check if user is trying to add medical data
-            if 'labFindings' in request.data:
-                if not (user.is_doctor or user.is_admin):
-                    return Response(
-                        {'error': 'Only doctors can add lab findings and interpretations'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                # User has permission to add medical data
-                visit.lab_findings = request.data['labFindings']
-                visit.lab_completed_at = timezone.now()
-
-            # Note: Lab tests are marked as completed by laboratory staff in LabTestViewSet
-            # Doctors only review and interpret results here
-
-        # Handle Discharge phase - ONLY doctors can add diagnosis/treatment/prescriptions
-        if new_stage == 'discharged':
-            visit.discharge_time = timezone.now()
-
-            # Check if user is trying to add medical data (diagnosis, treatment, prescriptions)
-            if 'diagnosis' in request.data or 'treatment_plan' in request.data or 'finalFindings' in request.data or 'prescription' in request.data:
-                if not (user.is_doctor or user.is_admin):
-                    return Response(
-                        {'error': 'Only doctors can add diagnosis, treatment plans, and prescriptions'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                # User has permission to add medical data
-                if 'diagnosis' in request.data:
-                    visit.diagnosis = request.data['diagnosis']
-                if 'treatment_plan' in request.data:
-                    visit.treatment_plan = request.data['treatment_plan']
-                if 'finalFindings' in request.data:
-                    visit.final_findings = request.data['finalFindings']
-
-            # Handle prescription - ONLY doctors
-            if 'prescription' in request.data:
-                prescription_text = request.data['prescription']
-                medications = []
-                for line in prescription_text.split('\n'):
-                    if line.strip():
-                        parts = [part.strip() for part in line.split(',')]
-                        if len(parts) >= 4:
-                            medications.append({
-                                'name': parts[0],
-                                'dose': parts[1],
-                                'frequency': parts[2],
-                                'duration': parts[3]
-                            })
-
-                prescription, created = Prescription.objects.get_or_create(
-                    visit=visit,
-                    defaults={
-                        'prescribed_by': user,
-                        'medications': medications
-                    }
-                )
-                if not created:
-                    prescription.medications = medications
-                    prescription.save()
-        
-        visit.save()
-        serializer = self.get_serializer(visit)
-        return Response(serializer.data)
-    
     @action(detail=False, methods=['get'])
     def queue(self, request):
-        """Get current patient queue for the clinic management system"""
-        active_visits = Visit.objects.filter(stage__in=[
-            'waiting_room', 'triage', 'questioning', 'laboratory_test', 'results_by_doctor'
-        ]).select_related(
-            'patient__user', 
-            'attending_doctor',
-            'triage_completed_by'
-        ).prefetch_related(
-            'lab_tests',
-            'prescription'
-        ).order_by('check_in_time')
-        
-        serializer = QueuePatientSerializer(active_visits, many=True)
-        return Response(serializer.data)
+        """
+        Get current patient queue for the clinic management system.
+
+        ?stage=<stage>[,<stage>...] limits the queue to some stages.
+        Pass ?since=<cursor> to receive only the visits that joined, changed or
+        left the queue (deleted ones included) since a previous response; a
+        cursor older than a day gets a 400 and the client reloads the full
+        queue. Every response carries the next cursor in the X-Queue-Cursor
+        header. Full responses also carry an ETag; sending it back as
+        If-None-Match gives a 304 while nothing changed.
+
+        Full responses give each entry its queuePosition within its stage and
+        an estimatedWaitMinutes until it moves on (None until the stage has
+        timing data); both are computed when the snapshot is built. Delta
+        (?since=) rows carry neither: one visit changing moves the positions of
+        others that are not in the delta, so clients showing them poll the full
+        queue with If-None-Match instead.
+        """
+        return self._queue_response(request, Visit.ACTIVE_STAGES)
+
+    @action(detail=False, methods=['get'], url_path='queue/mine')
+    def queue_mine(self, request):
+        """The queue as the current user's role works it: its own stages and columns only"""
+        if not request.user.is_staff_member:
+            return Response(
+                {'error': 'Only staff members have a work queue'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        role = request.user.role
+        return self._queue_response(
+            request,
+            ROLE_QUEUE_STAGES.get(role, Visit.ACTIVE_STAGES),
+            ROLE_QUEUE_FIELDS.get(role),
+            variant=role
+        )
+
+    def _queue_response(self, request, stages, fields=None, variant='all'):
+        cursor = next_cursor()
+
+        try:
+            if 'stage' in request.query_params:
+                stages = parse_stages(request.query_params['stage'])
+            since = None
+            if 'since' in request.query_params:
+                since = decode_cursor(request.query_params['since'])
+                changed, removed = queue_changes(since, stages)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if 'since' in request.query_params:
+            response = Response({
+                'cursor': cursor,
+                'changed': queue_rows(changed, fields),
+                'removed': removed,
+            })
+        else:
+            response = snapshot_response(
+                request, QUEUE_COUNTER, f"queue:{variant}:{','.join(stages)}",
+                lambda: add_wait_estimates(queue_rows(active_queue(stages), fields))
+            )
+
+        response['X-Queue-Cursor'] = cursor
+        return response
+    
+    @action(detail=False, methods=['post'])
+    def claim_next(self, request):
+        """
+        Claim the next patient: the most urgent, longest-waiting visit in
+        ?stage=<stage>[,<stage>...] (questioning and results_by_doctor by
+        default) that no doctor is attending yet. Returns 204 when there is none.
+        """
+        user = request.user
+        if not (user.is_doctor or user.is_admin):
+            return Response(
+                {'error': 'Only doctors can claim patients'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        stages = CLAIMABLE_STAGES
+        if 'stage' in request.query_params:
+            try:
+                stages = parse_stages(request.query_params['stage'])
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        visit = claim_next_visit(user, stages)
+        if visit is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        publish_queue_event('claimed', visit)
+        return Response(queue_rows(Visit.objects.filter(pk=visit.pk))[0])
+
+    @action(detail=False, methods=['get'])
+    def throughput(self, request):
+        """Per-stage arrivals, departures and average time in stage over the last ?hours= hours (default 24)"""
+        if not request.user.is_staff_member:
+            return Response(
+                {'error': 'Only staff members can view throughput'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            hours = int(request.query_params.get('hours', 24))
+        except ValueError:
+            return Response({'error': 'hours must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= hours <= THROUGHPUT_MAX_HOURS:
+            return Response(
+                {'error': f'hours must be between 1 and {THROUGHPUT_MAX_HOURS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(stage_throughput(hours))
+
+    @action(detail=False, methods=['get'])
+    def events(self, request):
+        """
+        Long-poll for queue events after ?after=<seq>.
+
+        Blocks up to ?timeout= seconds (default 25) until an event arrives.
+        A `reset` response means the position is unknown to this server and
+        the client should reload the queue before polling again. A 503 means
+        too many clients are waiting already; retry after Retry-After seconds.
+        """
+        try:
+            after = int(request.query_params.get('after', queue_events.last_seq))
+            timeout = float(request.query_params.get('timeout', 25))
+        except ValueError:
+            return Response({'error': 'after and timeout must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not math.isfinite(timeout) or timeout < 0:
+            return Response(
+                {'error': 'timeout must be a non-negative number of seconds'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with queue_events.listener() as listening:
+            if not listening:
+                return Response(
+                    {'error': 'Too many clients are waiting for queue events'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(QUEUE_LISTENER_RETRY)}
+                )
+            events = queue_events.wait(after, min(timeout, 55))
+        return Response({
+            'events': events or [],
+            'last': queue_events.last_seq,
+            'reset': events is None,
+        })
+
+    @action(detail=False, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream(self, request):
+        """Server-Sent Events stream of queue events (stage changes, completed tests, dispensing)"""
+        after = request.query_params.get('after') or request.headers.get('Last-Event-ID')
+        try:
+            after = int(after) if after else queue_events.last_seq
+        except ValueError:
+            return Response({'error': 'after must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(stream_queue_events(after), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
     
     @action(detail=False, methods=['get'])
     def all_patients(self, request):
-        """Get all patients including discharged ones for admin dashboard"""
-        all_visits = Visit.objects.all().select_related(
-            'patient__user', 
-            'attending_doctor',
-            'triage_completed_by'
-        ).prefetch_related(
-            'lab_tests',
-            'prescription'
-        ).order_by('-check_in_time')
-        
-        serializer = QueuePatientSerializer(all_visits, many=True)
-        return Response(serializer.data)
+        """
+        Get all patients including discharged ones for admin dashboard.
+
+        ?limit=<n> returns one page ({results, next}) ordered newest first;
+        pass the returned `next` back as ?cursor= for the following page.
+        ?stream=ndjson or ?stream=json streams every visit in chunks instead
+        of building the whole list in memory.
+        """
+        limit = request.query_params.get('limit')
+        cursor = request.query_params.get('cursor')
+        stream_format = request.query_params.get('stream')
+
+        if stream_format:
+            if stream_format not in ALL_PATIENTS_STREAM_FORMATS:
+                return Response({'error': 'stream must be ndjson or json'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                visits = visit_history(cursor)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return StreamingHttpResponse(
+                stream_rows(iter_queue_rows(visits), stream_format),
+                content_type=ALL_PATIENTS_STREAM_FORMATS[stream_format]
+            )
+
+        if limit or cursor:
+            try:
+                limit = int(limit or ALL_PATIENTS_PAGE_SIZE)
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                return Response({'error': 'limit must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+            limit = min(limit, ALL_PATIENTS_MAX_PAGE_SIZE)
+            try:
+                visits = visit_history(cursor)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            rows = queue_rows(visits[:limit + 1])
+            return Response({
+                'results': rows[:limit],
+                'next': encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None,
+            })
+
+        def build():
+            return queue_rows(visit_history())
+
+        return snapshot_response(request, QUEUE_COUNTER, 'all_patients', build)
     
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
         """Get dashboard statistics"""
-        from django.db.models import Count
-        
-        stats = {
-            'total_patients': Patient.objects.count(),
-            'active_visits': Visit.objects.filter(stage__in=['waiting_room', 'questioning', 'laboratory_test', 'results_by_doctor']).count(),
-            'completed_visits_today': Visit.objects.filter(stage='discharged', discharge_time__date=timezone.now().date()).count(),
-            'pending_lab_tests': LabTest.objects.filter(status='requested').count(),
-            'visits_by_stage': dict(Visit.objects.values('stage').annotate(count=Count('stage')).values_list('stage', 'count')),
-            'recent_visits': QueuePatientSerializer(Visit.objects.order_by('-check_in_time')[:5], many=True).data
-        }
-        return Response(stats)
+        stats = cached_stats('visits', visit_dashboard_stats)
+        return Response({**stats, 'recent_visits': queue_rows(Visit.objects.order_by('-check_in_time')[:5])})
 
 
 class LabTestViewSet(viewsets.ModelViewSet):
@@ -343,6 +612,39 @@ class LabTestViewSet(viewsets.ModelViewSet):
     search_fields = ['test_name', 'visit__patient__user__first_name', 'visit__patient__user__last_name']
     ordering_fields = ['requested_at', 'completed_at']
     ordering = ['-requested_at']
+
+    def get_queryset(self):
+        return LabTestSerializer.prepare(LabTest.objects.all(), self.request)
+
+    @action(detail=False, methods=['get'])
+    def worklist(self, request):
+        """
+        Open lab tests for the lab bench: urgent patients first, then the
+        oldest requests, in one query.
+
+        Every response carries a cursor in the X-Worklist-Cursor header; pass
+        it back as ?since=<cursor> to receive {cursor, changed, removed}: the
+        open tests that changed since then and the ids of those that closed.
+        """
+        if not request.user.is_staff_member:
+            return Response(
+                {'error': 'Only staff members can view the lab worklist'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        cursor = next_cursor()
+
+        if 'since' in request.query_params:
+            try:
+                since = decode_cursor(request.query_params['since'])
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            changed, removed = worklist_changes(since)
+            response = Response({'cursor': cursor, 'changed': worklist_rows(changed), 'removed': removed})
+        else:
+            response = Response(worklist_rows(open_lab_tests()))
+
+        response['X-Worklist-Cursor'] = cursor
+        return response
     
     @action(detail=True, methods=['post'])
     def complete_test(self, request, pk=None):
@@ -360,6 +662,7 @@ class LabTestViewSet(viewsets.ModelViewSet):
         test.completed_at = timezone.now()
         test.performed_by = request.user
         test.save()
+        publish_queue_event('lab_test_completed', test.visit)
 
         serializer = self.get_serializer(test)
         return Response(serializer.data)
@@ -389,6 +692,7 @@ class PrescriptionViewSet(viewsets.ModelViewSet):
         prescription.dispensed_at = timezone.now()
         prescription.dispensed_by = request.data.get('dispensed_by', request.user.get_full_name())
         prescription.save()
+        publish_queue_event('prescription_dispensed', prescription.visit)
 
         serializer = self.get_serializer(prescription)
         return Response(serializer.data)
@@ -414,6 +718,9 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     search_fields = ['patient__user__first_name', 'patient__user__last_name', 'reason']
     ordering_fields = ['appointment_date', 'created_at']
     ordering = ['appointment_date']
+
+    def get_queryset(self):
+        return AppointmentSerializer.prepare(Appointment.objects.all(), self.request)
     
     def perform_create(self, serializer):
         serializer.save(booked_by=self.request.user)
@@ -557,7 +864,7 @@ class StaffProfileViewSet(viewsets.ModelViewSet):
             'total_staff': StaffProfile.objects.count(),
             'active_staff': StaffProfile.objects.filter(employment_status='active').count(),
             'departments': dict(StaffProfile.objects.values('department').annotate(count=Count('department')).values_list('department', 'count')),
-            'recent_hires': StaffProfileSerializer(StaffProfile.objects.filter(hire_date__gte=datetime.now().date() - timedelta(days=30))[:5], many=True).data,
+            'recent_hires': recent_staff(hired_since=datetime.now().date() - timedelta(days=30)),
             'staff_by_role': dict(StaffProfile.objects.values('user__role').annotate(count=Count('user__role')).values_list('user__role', 'count'))
         }
         return Response(stats)
@@ -648,6 +955,71 @@ class PerformanceReviewViewSet(viewsets.ModelViewSet):
     ordering = ['-review_period_end']
 
 
+def _parse_metrics_time(value, end_of_day=False):
+    """
+    An aware datetime from an ISO date or datetime; a date as `end` means the
+    end of that day. Dates are tried first, since parse_datetime() also
+    accepts them (as midnight). Out-of-range values raise ValueError.
+    """
+    try:
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, datetime.min.time())
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError(value)
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    except OverflowError:
+        raise ValueError(value)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def metrics_series(request):
+    """
+    Volume series bucketed by ?interval=hour|day over ?start=&end= (ISO dates
+    or datetimes), as columnar arrays. ?series= is a comma-separated list of
+    SERIES names (default visits).
+    """
+    if not request.user.is_staff_member:
+        return Response({'error': 'Only staff members can view metrics'}, status=status.HTTP_403_FORBIDDEN)
+
+    interval = request.query_params.get('interval', 'day')
+    if interval not in METRICS_INTERVALS:
+        return Response(
+            {'error': f"interval must be one of: {', '.join(METRICS_INTERVALS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    names = [name for name in request.query_params.get('series', 'visits').split(',') if name]
+    unknown = [name for name in names if name not in SERIES]
+    if unknown or not names:
+        return Response(
+            {'error': f"series must be a comma-separated list of: {', '.join(SERIES)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        end = _parse_metrics_time(request.query_params['end'], end_of_day=True) if 'end' in request.query_params else timezone.now()
+        start = (
+            _parse_metrics_time(request.query_params['start']) if 'start' in request.query_params
+            else end - timedelta(days=METRICS_DEFAULT_DAYS[interval])
+        )
+    except (ValueError, OverflowError):
+        return Response(
+            {'error': 'start and end must be ISO dates or datetimes'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    bucket_hours = 24 if interval == 'day' else 1
+    if start >= end or (end - start) / timedelta(hours=bucket_hours) > METRICS_MAX_BUCKETS:
+        return Response(
+            {'error': f'start must be before end, with at most {METRICS_MAX_BUCKETS} buckets between them'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response(metric_series(names, interval, start, end))
+
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def staff_onboard(request):
@@ -673,24 +1045,20 @@ def staff_onboard(request):
             'specialization': request.data.get('specialization', '')
         }
         
-        user = User.objects.create(**user_data)
+        with transaction.atomic():
+            user = User.objects.create(**user_data)
         
-        # Generate employee ID
-        last_staff = StaffProfile.objects.order_by('-id').first()
-        if last_staff:
-            last_id = int(last_staff.employee_id.split('-')[1])
-            employee_id = f"EMP-{str(last_id + 1).zfill(3)}"
-        else:
-            employee_id = "EMP-001"
+            # Generate employee ID
+            employee_id = IdentifierSequence.next_identifier('employee')
         
-        # Create staff profile
-        staff_profile = StaffProfile.objects.create(
-            user=user,
-            employee_id=employee_id,
-            hire_date=request.data.get('hire_date', timezone.now().date()),
-            hourly_rate=request.data.get('hourly_rate', '25.00'),
-            department=request.data['department']
-        )
+            # Create staff profile
+            staff_profile = StaffProfile.objects.create(
+                user=user,
+                employee_id=employee_id,
+                hire_date=request.data.get('hire_date', timezone.now().date()),
+                hourly_rate=request.data.get('hourly_rate', '25.00'),
+                department=request.data['department']
+            )
         
         return Response({
             'success': True,
@@ -0,0 +1,80 @@
+"""
+The lab worklist: open lab tests, urgent patients first and then the
+longest-waiting requests, read through the (status, requested_at) index and
+built from one values() query however many tests are open.
+
+Delta polling works like the queue's: a cursor from a previous response
+returns the open tests changed since then (the test, its visit or its
+patient) and the ids of the tests that have been completed or cancelled.
+"""
+from django.db.models import Q
+
+from .models import LabTest
+from .queue import QUEUE_CURSOR_GRACE, urgent_first
+
+OPEN_LAB_STATUSES = ['requested', 'in_progress']
+
+WORKLIST_VALUES = [
+    'id', 'visit_id', 'test_name', 'test_type', 'status', 'requested_at', 'updated_at',
+    'visit__stage', 'visit__patient__patient_id', 'visit__patient__priority', 'visit__patient__age',
+    'visit__patient__gender', 'visit__patient__user__first_name', 'visit__patient__user__last_name',
+    'requested_by_id', 'requested_by__first_name', 'requested_by__last_name',
+]
+
+
+def open_lab_tests():
+    """Open lab tests in worklist order"""
+    return (
+        LabTest.objects.filter(status__in=OPEN_LAB_STATUSES)
+        .order_by(urgent_first('visit__patient'), 'requested_at', 'id')
+    )
+
+
+def worklist_rows(tests):
+    """Worklist rows for a LabTest queryset, in its order"""
+    rows = []
+    for test in tests.values(*WORKLIST_VALUES):
+        requested_by = None
+        if test['requested_by_id']:
+            requested_by = f"{test['requested_by__first_name']} {test['requested_by__last_name']}".strip()
+        rows.append({
+            'id': test['id'],
+            'visit': test['visit_id'],
+            'test_name': test['test_name'],
+            'test_type': test['test_type'],
+            'status': test['status'],
+            'requested_at': test['requested_at'],
+            'updated_at': test['updated_at'],
+            'requested_by_name': requested_by,
+            'stage': test['visit__stage'],
+            'patient_id': test['visit__patient__patient_id'],
+            'patient_name': (
+                f"{test['visit__patient__user__first_name']} {test['visit__patient__user__last_name']}".strip()
+            ),
+            'priority': test['visit__patient__priority'],
+            'age': test['visit__patient__age'],
+            'gender': test['visit__patient__gender'],
+        })
+    return rows
+
+
+def worklist_changes(since):
+    """
+    Open tests touched since `since` and the ids of tests closed since then.
+    Deleted tests are not reported; they leave with the next full load.
+    """
+    if since is None:
+        return open_lab_tests(), []
+
+    since = since - QUEUE_CURSOR_GRACE
+    changed = open_lab_tests().filter(
+        Q(updated_at__gte=since) |
+        Q(visit__updated_at__gte=since) |
+        Q(visit__patient__updated_at__gte=since)
+    )
+    closed = list(
+        LabTest.objects.filter(updated_at__gte=since)
+        .exclude(status__in=OPEN_LAB_STATUSES)
+        .values_list('id', flat=True)
+    )
+    return changed, closed
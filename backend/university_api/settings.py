@@ -93,6 +93,11 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
+CORS_EXPOSE_HEADERS = [
+    'etag',
+    'x-queue-cursor',
+    'x-worklist-cursor',
+]
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -137,10 +142,26 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # JSONRenderer's output, encoded with orjson when it is installed
+        'healthcare.renderers.FastJSONRenderer',
+        # Chosen with Accept: application/msgpack
+        'healthcare.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'healthcare.parsers.MessagePackParser',
     ],
+    # Only applies when a request passes ?cursor= or ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'healthcare.pagination.OptionalCursorPagination',
 }
 
+# Queue listeners (SSE streams and long-polls) each hold a gunicorn thread while
+# they wait; keep this well below --threads in the Dockerfile so ordinary
+# requests always find a free one
+QUEUE_MAX_LISTENERS = int(os.environ.get('QUEUE_MAX_LISTENERS', 8))
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -97,6 +97,40 @@ class ApiClient {
 
 const apiClient = new ApiClient(API_BASE_URL);
 
+// Cursor pagination (opt-in: list endpoints return plain arrays unless a page is asked for)
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+  total?: number;
+  total_is_estimate?: boolean;
+}
+
+export interface PageOptions {
+  cursor?: string | null;
+  pageSize?: number;
+  includeTotal?: boolean;
+  // Sparse fieldsets (patients, visits, lab tests and appointments)
+  fields?: string[];
+  omit?: string[];
+  params?: Record<string, string>;
+}
+
+// The cursor of a `next`/`previous` link, to pass back as PageOptions.cursor
+export const cursorFrom = (link: string | null) => (link ? new URL(link).searchParams.get('cursor') : null);
+
+const pagedList = <T = any>(path: string) => (options: PageOptions = {}) =>
+  apiClient.get<CursorPage<T>>(
+    `${path}?${new URLSearchParams({
+      ...options.params,
+      page_size: String(options.pageSize ?? 50),
+      ...(options.cursor ? { cursor: options.cursor } : {}),
+      ...(options.includeTotal ? { include_total: 'true' } : {}),
+      ...(options.fields ? { fields: options.fields.join(',') } : {}),
+      ...(options.omit ? { omit: options.omit.join(',') } : {}),
+    })}`
+  );
+
 // Test endpoint
 export const testApi = {
   test: () => apiClient.get<any>('/healthcare/test/'),
@@ -107,36 +141,65 @@ export const healthcareApi = {
   // Patients
   patients: {
     list: () => apiClient.get<any[]>('/healthcare/patients/'),
+    listPage: pagedList('/healthcare/patients/'),
     create: (data: any) => apiClient.post<any>('/healthcare/patients/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/patients/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/patients/${id}/`, data),
     delete: (id: string) => apiClient.delete(`/healthcare/patients/${id}/`),
+    getByCard: (card: string) => apiClient.get<any>(`/healthcare/patients/by-card/${encodeURIComponent(card)}/`),
+    findDuplicates: (params: { first_name: string; last_name: string; phone?: string; age?: number }) =>
+      apiClient.get<{ duplicate_candidates: any[] }>(
+        `/healthcare/patients/duplicates/?${new URLSearchParams(
+          Object.entries(params).filter(([, value]) => value !== undefined && value !== '').map(([key, value]) => [key, String(value)])
+        )}`
+      ),
   },
 
   // Visits (Queue Management)
   visits: {
     list: () => apiClient.get<any[]>('/healthcare/visits/'),
+    listPage: pagedList('/healthcare/visits/'),
     create: (data: any) => apiClient.post<any>('/healthcare/visits/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/visits/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/visits/${id}/`, data),
     moveToStage: (id: string, data: any) => apiClient.post<any>(`/healthcare/visits/${id}/move_to_stage/`, data),
     getQueue: () => apiClient.get<any[]>('/healthcare/visits/queue/'),
+    getQueueForStages: (stages: string[]) =>
+      apiClient.get<any[]>(`/healthcare/visits/queue/?stage=${stages.map(encodeURIComponent).join(',')}`),
+    bulkMove: (items: { visit_id: number; stage: string; payload?: any }[]) =>
+      apiClient.post<{ results: any[] }>('/healthcare/visits/bulk_move/', { items }),
+    claimNext: (stages?: string[]) =>
+      apiClient.post<any>(`/healthcare/visits/claim_next/${stages ? `?stage=${stages.map(encodeURIComponent).join(',')}` : ''}`),
+    getMyQueue: () => apiClient.get<any[]>('/healthcare/visits/queue/mine/'),
+    getQueueChanges: (since: string) => apiClient.get<any>(`/healthcare/visits/queue/?since=${encodeURIComponent(since)}`),
+    waitForQueueEvents: (after: number) => apiClient.get<any>(`/healthcare/visits/events/?after=${after}`),
     getAllPatients: () => apiClient.get<any[]>('/healthcare/visits/all_patients/'),
+    getAllPatientsPage: (cursor?: string, limit = 100) =>
+      apiClient.get<{ results: any[]; next: string | null }>(
+        `/healthcare/visits/all_patients/?limit=${limit}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`
+      ),
     getDashboardStats: () => apiClient.get<any>('/healthcare/visits/dashboard_stats/'),
   },
 
   // Lab Tests
   labTests: {
     list: () => apiClient.get<any[]>('/healthcare/lab-tests/'),
+    listPage: pagedList('/healthcare/lab-tests/'),
     create: (data: any) => apiClient.post<any>('/healthcare/lab-tests/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/lab-tests/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/lab-tests/${id}/`, data),
     complete: (id: string, data: any) => apiClient.post<any>(`/healthcare/lab-tests/${id}/complete_test/`, data),
+    getWorklist: () => apiClient.get<any[]>('/healthcare/lab-tests/worklist/'),
+    getWorklistChanges: (since: string) =>
+      apiClient.get<{ cursor: string; changed: any[]; removed: number[] }>(
+        `/healthcare/lab-tests/worklist/?since=${encodeURIComponent(since)}`
+      ),
   },
 
   // Prescriptions
   prescriptions: {
     list: () => apiClient.get<any[]>('/healthcare/prescriptions/'),
+    listPage: pagedList('/healthcare/prescriptions/'),
     create: (data: any) => apiClient.post<any>('/healthcare/prescriptions/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/prescriptions/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/prescriptions/${id}/`, data),
@@ -146,6 +209,7 @@ export const healthcareApi = {
   // Medications
   medications: {
     list: () => apiClient.get<any[]>('/healthcare/medications/'),
+    listPage: pagedList('/healthcare/medications/'),
     create: (data: any) => apiClient.post<any>('/healthcare/medications/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/medications/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/medications/${id}/`, data),
@@ -155,6 +219,7 @@ export const healthcareApi = {
   // Appointments
   appointments: {
     list: () => apiClient.get<any[]>('/healthcare/appointments/'),
+    listPage: pagedList('/healthcare/appointments/'),
     create: (data: any) => apiClient.post<any>('/healthcare/appointments/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/appointments/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/appointments/${id}/`, data),
@@ -165,6 +230,7 @@ export const healthcareApi = {
   // Medical Records
   medicalRecords: {
     list: () => apiClient.get<any[]>('/healthcare/medical-records/'),
+    listPage: pagedList('/healthcare/medical-records/'),
     create: (data: any) => apiClient.post<any>('/healthcare/medical-records/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/medical-records/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/medical-records/${id}/`, data),
@@ -173,6 +239,7 @@ export const healthcareApi = {
   // EHR - Medical History
   medicalHistory: {
     list: () => apiClient.get<any[]>('/healthcare/medical-history/'),
+    listPage: pagedList('/healthcare/medical-history/'),
     create: (data: any) => apiClient.post<any>('/healthcare/medical-history/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/medical-history/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/medical-history/${id}/`, data),
@@ -182,6 +249,7 @@ export const healthcareApi = {
   // EHR - Allergies
   allergies: {
     list: () => apiClient.get<any[]>('/healthcare/allergies/'),
+    listPage: pagedList('/healthcare/allergies/'),
     create: (data: any) => apiClient.post<any>('/healthcare/allergies/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/allergies/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/allergies/${id}/`, data),
@@ -191,6 +259,7 @@ export const healthcareApi = {
   // EHR - Patient Medications
   patientMedications: {
     list: () => apiClient.get<any[]>('/healthcare/patient-medications/'),
+    listPage: pagedList('/healthcare/patient-medications/'),
     create: (data: any) => apiClient.post<any>('/healthcare/patient-medications/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/patient-medications/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/patient-medications/${id}/`, data),
@@ -200,6 +269,7 @@ export const healthcareApi = {
   // Staff Management
   staff: {
     list: () => apiClient.get<any[]>('/healthcare/staff/'),
+    listPage: pagedList('/healthcare/staff/'),
     create: (data: any) => apiClient.post<any>('/healthcare/staff/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/staff/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/staff/${id}/`, data),
@@ -209,6 +279,7 @@ export const healthcareApi = {
   // Shifts
   shifts: {
     list: () => apiClient.get<any[]>('/healthcare/shifts/'),
+    listPage: pagedList('/healthcare/shifts/'),
     create: (data: any) => apiClient.post<any>('/healthcare/shifts/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/shifts/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/shifts/${id}/`, data),
@@ -219,6 +290,7 @@ export const healthcareApi = {
   // Payroll
   payroll: {
     list: () => apiClient.get<any[]>('/healthcare/payroll/'),
+    listPage: pagedList('/healthcare/payroll/'),
     create: (data: any) => apiClient.post<any>('/healthcare/payroll/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/payroll/${id}/`),
     generatePayroll: (data: any) => apiClient.post<any[]>('/healthcare/payroll/generate_payroll/', data),
@@ -227,11 +299,25 @@ export const healthcareApi = {
   // Performance Reviews
   performanceReviews: {
     list: () => apiClient.get<any[]>('/healthcare/performance-reviews/'),
+    listPage: pagedList('/healthcare/performance-reviews/'),
     create: (data: any) => apiClient.post<any>('/healthcare/performance-reviews/', data),
     get: (id: string) => apiClient.get<any>(`/healthcare/performance-reviews/${id}/`),
     update: (id: string, data: any) => apiClient.patch<any>(`/healthcare/performance-reviews/${id}/`, data),
     delete: (id: string) => apiClient.delete(`/healthcare/performance-reviews/${id}/`),
   },
+
+  // Metrics
+  metrics: {
+    getSeries: (params: { series?: string[]; interval?: 'hour' | 'day'; start?: string; end?: string }) =>
+      apiClient.get<{ interval: string; start: string; end: string; buckets: string[]; series: Record<string, (number | null)[]> }>(
+        `/healthcare/metrics/series/?${new URLSearchParams({
+          ...(params.series ? { series: params.series.join(',') } : {}),
+          ...(params.interval ? { interval: params.interval } : {}),
+          ...(params.start ? { start: params.start } : {}),
+          ...(params.end ? { end: params.end } : {}),
+        })}`
+      ),
+  },
 };
 
 // Authentication API